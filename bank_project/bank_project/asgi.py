@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bank_project.settings')
+# Login y registro sin bloquear el event loop (ver core_bank/hashing.py)
+os.environ.setdefault('ASYNC_AUTH_VIEWS', 'True')
 
 application = get_asgi_application()
@@ -39,7 +39,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core_bank.metrics.MetricsMiddleware', # Primero: mide la petición completa (ver core_bank/metrics.py)
     'django.middleware.security.SecurityMiddleware',
+    'core_bank.routers.ReplicaPinningMiddleware', # Antes de la sesión: su guardado también cuenta como escritura
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware', # Protección CSRF
@@ -61,20 +63,80 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'chatbot.context_processors.chatbot',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'bank_project.wsgi.application'
+ASGI_APPLICATION = 'bank_project.asgi.application'
+
+# Login y registro async (los activa bank_project/asgi.py): el hash de la contraseña corre en un
+# pool de PASSWORD_HASHING_WORKERS hilos con a lo sumo PASSWORD_HASHING_MAX_QUEUE esperando; más
+# allá se responde 503 para que el resto de las páginas no se quede sin workers (ver core_bank/hashing.py)
+ASYNC_AUTH_VIEWS = os.getenv("ASYNC_AUTH_VIEWS", "False").lower() == "true"
+PASSWORD_HASHING_WORKERS = int(os.getenv("PASSWORD_HASHING_WORKERS") or os.cpu_count() or 1)
+PASSWORD_HASHING_MAX_QUEUE = int(os.getenv("PASSWORD_HASHING_MAX_QUEUE", "32"))
+
+# SQLite en modo producción: WAL para que los lectores no esperen al escritor, hasta 5 s
+# de espera por el lock antes de fallar, y BEGIN IMMEDIATE para que cada transacción de
+# escritura tome el lock al empezar y no a mitad de camino (donde ya no se puede esperar).
+SQLITE_PRODUCTION_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA busy_timeout=5000;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA mmap_size=134217728;' # 128 MiB
+        'PRAGMA cache_size=-20000;' # ~20 MiB por conexión
+    ),
+    'transaction_mode': 'IMMEDIATE',
+}
+SQLITE_PRODUCTION_MODE = os.getenv("SQLITE_PRODUCTION_MODE", "True").lower() == "true"
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_PRODUCTION_OPTIONS if SQLITE_PRODUCTION_MODE else {},
     }
 }
 
+# Réplicas de solo lectura (ver core_bank/routers.py): DATABASE_REPLICAS=/ruta/replica1.sqlite3,/ruta/replica2.sqlite3
+# Las vistas de solo lectura (dashboard, historial, exportación, saldo) leen de ellas; una
+# sesión que acaba de escribir lee de la primaria durante REPLICA_PIN_SECONDS.
+READ_REPLICAS = []
+for number, replica_path in enumerate(filter(None, os.getenv("DATABASE_REPLICAS", "").split(',')), 1):
+    DATABASES[f'replica{number}'] = {**DATABASES['default'], 'NAME': replica_path.strip(), 'TEST': {'MIRROR': 'default'}}
+    READ_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['core_bank.routers.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", "5"))
+# Los tests del router usan una base 'replica1' que agrega este runner (ver core_bank/testing.py)
+TEST_RUNNER = 'core_bank.testing.TestRunner'
+
+# Las operaciones del ledger se serializan dentro del proceso y se reintentan si la base
+# está bloqueada por otro proceso (ver core_bank/writes.py)
+SQLITE_SERIALIZE_WRITES = SQLITE_PRODUCTION_MODE
+SQLITE_WRITE_RETRIES = int(os.getenv("SQLITE_WRITE_RETRIES", "3"))
+SQLITE_WRITE_RETRY_BACKOFF = float(os.getenv("SQLITE_WRITE_RETRY_BACKOFF", "0.05")) # segundos, se duplica en cada intento
+
+# Transferencias asíncronas: el POST solo encola y ``manage.py process_transfer_queue`` las aplica
+# de a TRANSFER_QUEUE_BATCH_SIZE por commit (ver ledger.settle_queued_transfers)
+TRANSFER_QUEUE_ENABLED = os.getenv("TRANSFER_QUEUE_ENABLED", "False").lower() == "true"
+TRANSFER_QUEUE_BATCH_SIZE = int(os.getenv("TRANSFER_QUEUE_BATCH_SIZE", "200"))
+TRANSFER_QUEUE_POLL_INTERVAL = float(os.getenv("TRANSFER_QUEUE_POLL_INTERVAL", "0.2")) # segundos sin trabajo entre consultas
+
+# Liquidación a empresas de servicios (core_bank/settlements.py): solo se liquidan pagos con al menos
+# este atraso, para no saltarse uno cuya transacción todavía no hizo commit
+SETTLEMENT_SAFETY_LAG = int(os.getenv("SETTLEMENT_SAFETY_LAG", "60")) # segundos
+
+# Avisos en vivo al dashboard por server-sent events (core_bank/events.py, solo bajo ASGI).
+# Con varios procesos, EVENTS_BROKER=core_bank.events.RedisBroker y EVENTS_BROKER_URL apuntando a Redis.
+EVENTS_BROKER = os.getenv("EVENTS_BROKER", "core_bank.events.InProcessBroker")
+EVENTS_BROKER_URL = os.getenv("EVENTS_BROKER_URL", "redis://localhost:6379/0")
+EVENTS_QUEUE_SIZE = 100 # eventos pendientes por pestaña antes de descartar los más viejos
+EVENTS_KEEPALIVE = 15 # segundos entre comentarios de keep-alive para que proxies no corten la conexión
+
 # Configuración de autenticación de contraseñas
 PASSWORD_HASHERS = [
     'django.contrib.auth.hashers.PBKDF2PasswordHasher', # Por defecto y seguro
@@ -131,3 +193,74 @@ CRISPY_TEMPLATE_PACK = "tailwind"
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True # La sesión expira al cerrar el navegador
 SESSION_COOKIE_AGE = 1200 # 20 minutos de inactividad, puedes ajustar esto (en segundos)
 SESSION_SAVE_EVERY_REQUEST = True # Guarda la sesión en cada solicitud (para actualizar el tiempo de expiración)
+# Mantiene la expiración deslizante sin un UPDATE por petición: solo guarda si cambian los
+# datos o si la expiración guardada quedó atrás más del umbral (ver core_bank/sessions.py)
+SESSION_ENGINE = 'core_bank.sessions'
+SESSION_WRITE_THRESHOLD = int(os.getenv("SESSION_WRITE_THRESHOLD", "60")) # segundos
+
+# Caché de las filas ya renderizadas del dashboard y el historial (ver core_bank/fragments.py).
+# La clave lleva la versión del ledger del usuario, así que no hace falta invalidar nada:
+# las entradas viejas salen por TTL o por el límite de tamaño del backend.
+FRAGMENT_CACHE_BACKEND = os.getenv("FRAGMENT_CACHE_BACKEND", "locmem") # locmem | file | redis
+FRAGMENT_CACHE_TTL = int(os.getenv("FRAGMENT_CACHE_TTL", "600")) # segundos; 0 desactiva la caché
+FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv("FRAGMENT_CACHE_MAX_ENTRIES", "5000"))
+FRAGMENT_CACHE_BACKENDS = {
+    # Por proceso; al llenarse descarta las menos usadas (LRU)
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'OPTIONS': {'MAX_ENTRIES': FRAGMENT_CACHE_MAX_ENTRIES},
+    },
+    # Compartida entre los procesos de una máquina; al llenarse borra 1/CULL_FREQUENCY de los archivos
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv("FRAGMENT_CACHE_DIR", str(BASE_DIR / '.fragment_cache')),
+        'OPTIONS': {'MAX_ENTRIES': FRAGMENT_CACHE_MAX_ENTRIES, 'CULL_FREQUENCY': 4},
+    },
+    # Compartida entre máquinas (pip install redis); el tope de memoria lo pone Redis con
+    # maxmemory y maxmemory-policy allkeys-lru
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv("FRAGMENT_CACHE_REDIS_URL", "redis://localhost:6379/1"),
+    },
+}
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    # VERSION: subirla al cambiar las plantillas de filas, para no servir HTML viejo de la caché en archivos o Redis
+    'fragments': {**FRAGMENT_CACHE_BACKENDS[FRAGMENT_CACHE_BACKEND], 'TIMEOUT': FRAGMENT_CACHE_TTL, 'KEY_PREFIX': 'frag', 'VERSION': 1},
+}
+
+# Catálogo de servicios en memoria (ver core_bank/catalog.py)
+SERVICE_CATALOG_TTL = int(os.getenv("SERVICE_CATALOG_TTL", "300")) # Caducidad para los cambios hechos desde otro proceso
+
+# API de DNI (Decolecta / RENIEC)
+DECOLECTA_API_URL = os.getenv("DECOLECTA_API_URL", "https://api.decolecta.com/v1/reniec/dni")
+DECOLECTA_API_TOKEN = os.getenv("DECOLECTA_API_TOKEN")
+DECOLECTA_CONNECT_TIMEOUT = float(os.getenv("DECOLECTA_CONNECT_TIMEOUT", "2")) # segundos
+DECOLECTA_READ_TIMEOUT = float(os.getenv("DECOLECTA_READ_TIMEOUT", "5")) # segundos
+DNI_CACHE_TTL = int(os.getenv("DNI_CACHE_TTL", "86400")) # Los datos de RENIEC casi no cambian
+DNI_NEGATIVE_CACHE_TTL = int(os.getenv("DNI_NEGATIVE_CACHE_TTL", "300")) # DNIs no encontrados
+DNI_CACHE_MAX_ENTRIES = int(os.getenv("DNI_CACHE_MAX_ENTRIES", "10000"))
+# Resiliencia (ver core_bank/resilience.py)
+DECOLECTA_MAX_CONCURRENT = int(os.getenv("DECOLECTA_MAX_CONCURRENT", "4")) # Hilos esperando a Decolecta a la vez; el resto falla enseguida
+DECOLECTA_BREAKER_THRESHOLD = int(os.getenv("DECOLECTA_BREAKER_THRESHOLD", "5")) # Fallos seguidos que abren el circuito; 0 lo desactiva
+DECOLECTA_BREAKER_RESET = float(os.getenv("DECOLECTA_BREAKER_RESET", "30")) # segundos con el circuito abierto antes de una llamada de prueba
+
+# Chatbot (Cohere)
+COHERE_API_KEY = os.getenv("COHERE_API_KEY")
+COHERE_BASE_URL = os.getenv("COHERE_BASE_URL") # Vacío = API pública de Cohere; en tests apunta al servidor falso
+COHERE_TIMEOUT = float(os.getenv("COHERE_TIMEOUT", "30")) # segundos sin recibir datos de Cohere antes de cortar
+COHERE_DEADLINE = float(os.getenv("COHERE_DEADLINE", "10")) # segundos para una respuesta completa, con o sin streaming
+COHERE_MAX_CONCURRENT = int(os.getenv("COHERE_MAX_CONCURRENT", "4")) # Hilos (vista síncrona) esperando a Cohere a la vez
+COHERE_BREAKER_THRESHOLD = int(os.getenv("COHERE_BREAKER_THRESHOLD", "5")) # Fallos seguidos que abren el circuito; 0 lo desactiva
+COHERE_BREAKER_RESET = float(os.getenv("COHERE_BREAKER_RESET", "30")) # segundos con el circuito abierto antes de una llamada de prueba
+CHATBOT_MAX_CONCURRENT_STREAMS = int(os.getenv("CHATBOT_MAX_CONCURRENT_STREAMS", "20")) # Llamadas simultáneas al LLM por proceso
+CHATBOT_QUEUE_TIMEOUT = float(os.getenv("CHATBOT_QUEUE_TIMEOUT", "5")) # Espera máxima por un cupo antes de rechazar
+CHATBOT_CACHE_TTL = int(os.getenv("CHATBOT_CACHE_TTL", "3600")) # Caché de respuestas del LLM; 0 la desactiva
+CHATBOT_CACHE_MAX_ENTRIES = int(os.getenv("CHATBOT_CACHE_MAX_ENTRIES", "1000"))
+
+# Métricas de rendimiento en /metrics, formato Prometheus (ver core_bank/metrics.py)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") # Bearer que debe mandar Prometheus; sin token, /metrics solo responde con DEBUG
+METRICS_PROFILE_SAMPLE_RATE = float(os.getenv("METRICS_PROFILE_SAMPLE_RATE", "0")) # Fracción de peticiones bajo cProfile; 0 lo desactiva
+METRICS_PROFILE_SLOW_SECONDS = float(os.getenv("METRICS_PROFILE_SLOW_SECONDS", "1")) # Solo se guardan los perfiles de peticiones más lentas
+METRICS_PROFILE_DIR = os.getenv("METRICS_PROFILE_DIR", str(BASE_DIR / 'profiles'))
@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.shortcuts import redirect
 
+from core_bank.views import metrics_view
+
 urlpatterns = [
     # Admin
     path('admin/', admin.site.urls),
@@ -12,6 +14,9 @@ urlpatterns = [
     # Chatbot (opcional)
     path('chatbot/', include(('chatbot.urls', 'chatbot'), namespace='chatbot')),
 
+    # Métricas para Prometheus
+    path('metrics', metrics_view, name='metrics'),
+
     # Redirige la raíz al login
     path('', lambda request: redirect('core_bank:login'), name='root'),
 ]
@@ -0,0 +1,96 @@
+# chatbot/bank_intents.py
+"""
+Intenciones que el chatbot responde desde la base de datos, sin llamar al LLM.
+"""
+from django.utils import timezone
+
+from core_bank import catalog, rollups
+from core_bank.models import Transaction
+from .intents import IntentRouter, normalize
+
+router = IntentRouter()
+
+# Palabras que no sirven para reconocer un servicio por su nombre
+_SERVICE_STOPWORDS = {'de', 'del', 'la', 'el', 'los', 'las', 'y', 'o'}
+
+
+def _find_service(message):
+    """El servicio del catálogo con más palabras en común con el mensaje, o None."""
+    words = set(normalize(message).split())
+    best, best_score = None, 0
+    for service in catalog.get_services():
+        keywords = set(normalize(service.name).split()) - _SERVICE_STOPWORDS
+        score = len(keywords & words)
+        if score > best_score:
+            best, best_score = service, score
+    return best
+
+
+# Frases de varias palabras y propias de una consulta sobre la cuenta: una frase genérica
+# ("gastos de", "mi dinero") se llevaría preguntas frecuentes que debe contestar el LLM
+@router.intent('service_spending', [
+    "cuanto gaste", "cuanto he gastado", "cuanto llevo gastado", "cuanto pague", "cuanto he pagado",
+    "mis gastos en", "mis gastos de servicios", "total pagado", "total de pagos",
+], login_required=True)
+def service_spending(request, message):
+    # Totales precalculados (SpendingRollup): O(1) sin importar el tamaño del historial
+    month = rollups.month_of()
+    service = _find_service(message)
+    total = rollups.total_between(request.user, 'pago_servicio', month, month, service=service)
+
+    if service is not None:
+        return f"Este mes pagaste S/ {total:.2f} en {service.name}."
+    return f"Este mes pagaste S/ {total:.2f} en servicios."
+
+
+@router.intent('transfer_totals', [
+    "cuanto transferi", "cuanto he transferido", "cuanto envie", "cuanto he enviado",
+    "total transferido", "total de transferencias", "total enviado",
+], login_required=True)
+def transfer_totals(request, message):
+    last_month = rollups.month_of()
+    if {'año', 'ano'} & set(normalize(message).split()):  # Sin la ñ también
+        first_month, period = last_month.replace(month=1), "Este año"
+    else:
+        first_month, period = last_month, "Este mes"
+    total = rollups.total_between(request.user, 'transferencia', first_month, last_month)
+    return f"{period} transferiste S/ {total:.2f}."
+
+
+@router.intent('last_transfers', [
+    "ultimas transferencias", "ultima transferencia", "mis transferencias", "transferencias recientes",
+    "ultimos movimientos", "movimientos recientes", "a quien transferi", "a quien le transferi",
+], login_required=True)
+def last_transfers(request, message):
+    transfers = (
+        Transaction.objects.filter(sender=request.user, transaction_type='transferencia')
+        .select_related('receiver').only('amount', 'timestamp', 'receiver', 'receiver__first_name', 'receiver__username')
+        .order_by('-timestamp')[:3]
+    )
+    if not transfers:
+        return "Todavía no has realizado transferencias."
+    lines = [
+        f"S/ {t.amount:.2f} a {t.receiver.first_name or t.receiver.username if t.receiver else 'N/A'} "
+        f"el {timezone.localtime(t.timestamp):%d/%m %H:%M}"
+        for t in transfers
+    ]
+    return "Tus últimas transferencias: " + "; ".join(lines) + "."
+
+
+@router.intent('balance', [
+    "cuanto dinero tengo", "cual es mi saldo", "saldo de mi cuenta", "consultar saldo",
+    "ver mi saldo", "mi saldo", "saldo disponible", "cuanto tengo en mi cuenta", "cuanto dinero me queda",
+], login_required=True)
+def balance(request, message):
+    return f"Tu saldo actual es de S/ {request.user.balance}. ¿Hay algo más en lo que pueda ayudarte?"
+
+
+@router.intent('how_to_pay_service', [
+    "como pago", "como pagar", "como puedo pagar", "pagar un servicio", "pagar servicios", "pago de servicios",
+    "pagar la luz", "pagar el agua", "pagar mis servicios",
+])
+def how_to_pay_service(request, message):
+    return (
+        "Para pagar un servicio entra a 'Pagar Servicios' desde tu dashboard, elige el servicio, "
+        "ingresa el monto y, si quieres, el número de recibo. El pago se descuenta de tu saldo al instante."
+    )
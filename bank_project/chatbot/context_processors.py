@@ -0,0 +1,12 @@
+# chatbot/context_processors.py
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+
+def chatbot(request):
+    """
+    ``chatbot_streaming``: si el widget pide la respuesta por server-sent
+    events (/chatbot/stream/). Bajo WSGI cada stream ocuparía un worker
+    mientras el LLM escribe, así que ahí usa /chatbot/interact/.
+    """
+    return {'chatbot_streaming': settings.ASYNC_AUTH_VIEWS or isinstance(request, ASGIRequest)}
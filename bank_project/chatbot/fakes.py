@@ -0,0 +1,47 @@
+# chatbot/fakes.py
+"""Servidor local que imita ``POST /v1/chat`` de Cohere, con y sin streaming."""
+import json
+
+from core_bank.fakes import FakeServer, _JsonHandler
+
+
+class _CohereHandler(_JsonHandler):
+    def do_POST(self):
+        if self.inject_faults():
+            return
+        if self.path.rstrip('/') != '/v1/chat':
+            return self.send_json(404, {'message': 'Ruta no encontrada'})
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        self.fake.requests.append(payload)
+        reply = self.fake.reply
+
+        if not payload.get('stream'):
+            return self.send_json(200, {'text': reply, 'generation_id': 'fake', 'finish_reason': 'COMPLETE'})
+
+        # Streaming de Cohere v1: un objeto JSON por línea
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/stream+json')
+        self.end_headers()
+        events = [{'event_type': 'stream-start', 'generation_id': 'fake', 'is_finished': False}]
+        events += [{'event_type': 'text-generation', 'text': token, 'is_finished': False} for token in self.fake.tokens()]
+        events.append({
+            'event_type': 'stream-end', 'is_finished': True, 'finish_reason': 'COMPLETE',
+            'response': {'text': reply, 'generation_id': 'fake'},
+        })
+        for event in events:
+            self.wfile.write(json.dumps(event).encode() + b'\n')
+            self.wfile.flush()
+
+
+class FakeCohereServer(FakeServer):
+    handler_class = _CohereHandler
+
+    def __init__(self, reply='Hola, soy un asistente de prueba.', latency=0.0, error_status=None):
+        super().__init__(latency=latency, error_status=error_status)
+        self.reply = reply
+        self.requests = []
+
+    def tokens(self):
+        words = self.reply.split(' ')
+        return [word + (' ' if i < len(words) - 1 else '') for i, word in enumerate(words)]
@@ -0,0 +1,137 @@
+# chatbot/intents.py
+"""
+Motor de intenciones del chatbot.
+
+Todas las frases de todas las intenciones se compilan en un único autómata
+Aho-Corasick, así un mensaje se recorre una sola vez sin importar cuántas
+frases haya registradas. Mensajes y frases se normalizan igual: minúsculas,
+sin tildes y sin signos de puntuación.
+"""
+import re
+import unicodedata
+from collections import deque, namedtuple
+
+_NON_WORD = re.compile(r'[^a-z0-9ñ]+')
+
+Match = namedtuple('Match', 'intent start end phrase')
+Intent = namedtuple('Intent', 'name phrases handler login_required priority')
+
+LOGIN_REQUIRED_MESSAGE = 'Para consultar esa información necesitas iniciar sesión. Por favor, inicia sesión para acceder a tu información personal.'
+
+
+def normalize(text):
+    """'¿Cuál es mi SALDO?' -> 'cual es mi saldo'. Conserva la ñ."""
+    text = text.lower().replace('ñ', '\0')
+    text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return _NON_WORD.sub(' ', text.replace('\0', 'ñ')).strip()
+
+
+class PhraseAutomaton:
+    """Autómata Aho-Corasick sobre caracteres que solo reporta coincidencias de palabras completas."""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+    def add(self, phrase, value):
+        node = 0
+        for char in phrase:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append((len(phrase), phrase, value))
+
+    def build(self):
+        # Recorrido en anchura para calcular los enlaces de fallo
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+        return self
+
+    def search(self, text):
+        """Genera ``(inicio, fin, frase, valor)`` para cada frase encontrada en ``text`` normalizado."""
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        last = len(text) - 1
+        for i, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if not output[node] or (i < last and text[i + 1] != ' '):
+                continue
+            for length, phrase, value in output[node]:
+                start = i - length + 1
+                if start == 0 or text[start - 1] == ' ':
+                    yield start, i + 1, phrase, value
+
+
+class IntentRouter:
+    """
+    Registro de intenciones. ``handler(request, message)`` devuelve el texto de
+    la respuesta, o ``(texto, status)``. Cuando varias intenciones coinciden
+    gana la de mayor prioridad (la registrada primero, por defecto).
+    """
+
+    def __init__(self):
+        self._intents = {}
+        self._automaton = None
+
+    def register(self, name, phrases, handler, login_required=False, priority=None):
+        if priority is None:
+            priority = -len(self._intents)
+        self._intents[name] = Intent(name, tuple(phrases), handler, login_required, priority)
+        self._automaton = None
+
+    def intent(self, name, phrases, login_required=False, priority=None):
+        """Versión decorador de register()."""
+        def decorator(handler):
+            self.register(name, phrases, handler, login_required, priority)
+            return handler
+        return decorator
+
+    def _compiled(self):
+        if self._automaton is None:
+            automaton = PhraseAutomaton()
+            for intent in self._intents.values():
+                for phrase in intent.phrases:
+                    automaton.add(normalize(phrase), intent.name)
+            self._automaton = automaton.build()
+        return self._automaton
+
+    def matches(self, message):
+        """Todas las coincidencias de todas las intenciones, en una sola pasada."""
+        return [Match(intent, start, end, phrase) for start, end, phrase, intent in self._compiled().search(normalize(message))]
+
+    def match(self, message):
+        """La intención ganadora para el mensaje, o None."""
+        names = {m.intent for m in self.matches(message)}
+        if not names:
+            return None
+        return max((self._intents[name] for name in names), key=lambda intent: intent.priority)
+
+    def answer(self, intent, request, message):
+        """Ejecuta el handler de ``intent`` (accede a la base de datos) y devuelve ``(texto, status)``."""
+        if intent.login_required and not request.user.is_authenticated:
+            return LOGIN_REQUIRED_MESSAGE, 200
+        result = intent.handler(request, message)
+        return result if isinstance(result, tuple) else (result, 200)
+
+    def route(self, request, message):
+        """Atajo de match() + answer(); None si ninguna intención coincide."""
+        intent = self.match(message)
+        if intent is None:
+            return None
+        return self.answer(intent, request, message)
@@ -0,0 +1,53 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from chatbot.intents import IntentRouter, normalize
+
+WORDS = (
+    "saldo cuenta tarjeta credito debito prestamo transferencia pago servicio luz agua gas internet telefono "
+    "cuanto como donde cuando quiero necesito ver consultar mi mis ultimo ultima mes año total gaste pague "
+    "bloquear activar limite interes cuota deposito retiro banco cajero clave token app movil"
+).split()
+
+
+class Command(BaseCommand):
+    help = "Mide mensajes/seg del autómata de intenciones frente al escaneo lineal de palabras clave."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intents', type=int, default=50)
+        parser.add_argument('--phrases', type=int, default=10, help="Frases por intención.")
+        parser.add_argument('--messages', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        router = IntentRouter()
+        all_phrases = []
+        for n in range(options['intents']):
+            phrases = [' '.join(rng.sample(WORDS, rng.randint(2, 4))) for _ in range(options['phrases'])]
+            router.register(f'intent_{n}', phrases, handler=lambda request, message: '')
+            all_phrases.extend((normalize(p), f'intent_{n}') for p in phrases)
+        messages = [
+            '¿' + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 14))).capitalize() + '?'
+            for _ in range(options['messages'])
+        ]
+        router.matches('compilar')  # La compilación no se cuenta
+
+        started = time.perf_counter()
+        automaton_hits = sum(1 for message in messages if router.match(message))
+        automaton_time = time.perf_counter() - started
+
+        # Lo que hacía la vista original: `in` por cada frase, sobre el texto normalizado
+        started = time.perf_counter()
+        linear_hits = 0
+        for message in messages:
+            text = f' {normalize(message)} '
+            if any(f' {phrase} ' in text for phrase, _ in all_phrases):
+                linear_hits += 1
+        linear_time = time.perf_counter() - started
+
+        self.stdout.write(f"{len(all_phrases)} frases, {len(messages)} mensajes")
+        self.stdout.write(f"  autómata: {len(messages) / automaton_time:,.0f} mensajes/seg ({automaton_hits} con intención)")
+        self.stdout.write(f"  lineal:   {len(messages) / linear_time:,.0f} mensajes/seg ({linear_hits} con intención)")
@@ -0,0 +1,53 @@
+# chatbot/response_cache.py
+"""
+Caché de respuestas del LLM.
+
+La clave es el mensaje normalizado junto con el preámbulo, el modelo y
+max_tokens, de modo que cambiar cualquiera de ellos invalida las respuestas
+anteriores. Solo se cachean respuestas de Cohere: las intenciones
+personalizadas (saldo, transferencias...) se resuelven antes y nunca pasan por aquí.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from core_bank.ttlcache import TTLCache
+from .intents import normalize
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = TTLCache(max_entries=settings.CHATBOT_CACHE_MAX_ENTRIES, default_ttl=settings.CHATBOT_CACHE_TTL)
+    return _cache
+
+
+def cache_key(message, preamble, model, max_tokens):
+    raw = '\x1f'.join((normalize(message), preamble, model, str(max_tokens)))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def get_cached(key):
+    if settings.CHATBOT_CACHE_TTL <= 0:
+        return None
+    return get_cache().get(key)
+
+
+def store(key, text):
+    if settings.CHATBOT_CACHE_TTL > 0 and text:
+        get_cache().set(key, text)
+
+
+def stats():
+    return get_cache().stats()
+
+
+@receiver(setting_changed)
+def _reset_cache(setting, **kwargs):
+    global _cache
+    if setting.startswith('CHATBOT_CACHE_'):
+        _cache = None
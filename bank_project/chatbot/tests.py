@@ -1,3 +1,232 @@
-from django.test import TestCase
+import json
+import time
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from core_bank import ledger
+from core_bank.models import CustomUser, Service
+from . import bank_intents, response_cache, views
+from .fakes import FakeCohereServer
+from .intents import IntentRouter, normalize
+
+
+def parse_sse(body):
+    """Convierte un cuerpo text/event-stream en una lista de (evento, datos)."""
+    events = []
+    for block in body.decode().strip().split('\n\n'):
+        event, data = 'message', None
+        for line in block.split('\n'):
+            if line.startswith('event: '):
+                event = line[len('event: '):]
+            elif line.startswith('data: '):
+                data = json.loads(line[len('data: '):])
+        events.append((event, data))
+    return events
+
+
+class FakeCohereMixin:
+    reply = 'Puedes solicitar una tarjeta desde la app.'
+
+    def setUp(self):
+        super().setUp()
+        self.fake = FakeCohereServer(reply=self.reply).start()
+        self.addCleanup(self.fake.stop)
+        settings_override = self.settings(COHERE_API_KEY='clave-de-prueba', COHERE_BASE_URL=self.fake.base_url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        response_cache.get_cache().clear()
+
+
+class GetResponseTests(FakeCohereMixin, TestCase):
+    def test_llm_answer(self):
+        response = self.client.get(reverse('chatbot:get_response'), {'message': '¿Cómo pido una tarjeta?'})
+
+        self.assertEqual(response.json(), {'response': self.reply})
+        self.assertEqual(self.fake.requests[0]['max_tokens'], 60)
+
+    def test_balance_is_answered_from_the_database(self):
+        user = CustomUser.objects.create_user(username='alice', dni='11111111', password='clave-segura-123')
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('chatbot:get_response'), {'message': 'Quiero consultar saldo'})
+
+        self.assertIn('S/ 10000.00', response.json()['response'])
+        self.assertEqual(self.fake.calls, 0)
+
+    def test_database_intents_never_reach_the_llm(self):
+        user = CustomUser.objects.create_user(username='alice', dni='11111111', password='clave-segura-123')
+        bob = CustomUser.objects.create_user(username='bob', dni='22222222', password='clave-segura-123', first_name='Bob')
+        luz = Service.objects.get(name='Luz (Luz del Sur)')
+        ledger.transfer(user.id, bob.id, Decimal('30.00'))
+        ledger.pay_service(user.id, luz, Decimal('120.50'))
+        ledger.pay_service(user.id, Service.objects.get(name='Agua (SEDAPAL)'), Decimal('40.00'))
+        self.client.force_login(user)
+
+        answers = {
+            message: self.client.get(reverse('chatbot:get_response'), {'message': message}).json()['response']
+            for message in ('¿Cuánto gasté en LUZ este mes?', 'muéstrame mis últimas transferencias', '¿Cómo pago el agua?',
+                            '¿Cuánto he transferido este año?', 'cuanto he transferido este ano')
+        }
+
+        self.assertEqual(answers['¿Cuánto gasté en LUZ este mes?'], 'Este mes pagaste S/ 120.50 en Luz (Luz del Sur).')
+        self.assertIn('S/ 30.00 a Bob', answers['muéstrame mis últimas transferencias'])
+        self.assertIn('Pagar Servicios', answers['¿Cómo pago el agua?'])
+        self.assertEqual(answers['¿Cuánto he transferido este año?'], 'Este año transferiste S/ 30.00.')
+        self.assertEqual(answers['cuanto he transferido este ano'], 'Este año transferiste S/ 30.00.')
+        self.assertEqual(self.fake.calls, 0)
+
+
+class ResponseCacheTests(FakeCohereMixin, TestCase):
+    def ask(self, message):
+        return self.client.get(reverse('chatbot:get_response'), {'message': message}).json()['response']
+
+    def test_repeated_questions_are_served_from_cache(self):
+        for message in ('¿Cómo pido una tarjeta?', 'como pido una TARJETA', '¿cómo pido una tarjeta?'):
+            self.assertEqual(self.ask(message), self.reply)
+
+        self.assertEqual(self.fake.calls, 1)
+        self.assertEqual(response_cache.stats()['hits'], 2)
+
+    def test_personalized_answers_are_not_cached(self):
+        user = CustomUser.objects.create_user(username='alice', dni='11111111', password='clave-segura-123')
+        self.client.force_login(user)
+        self.ask('ver mi saldo')
+
+        self.assertEqual(response_cache.stats()['entries'], 0)
+
+    def test_cache_can_be_disabled(self):
+        with self.settings(CHATBOT_CACHE_TTL=0):
+            self.ask('hola')
+            self.ask('hola')
+        self.assertEqual(self.fake.calls, 2)
+
+
+class StreamResponseTests(FakeCohereMixin, TestCase):
+    async def stream(self, message):
+        response = await self.async_client.get(reverse('chatbot:stream_response'), {'message': message})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return parse_sse(b''.join([chunk async for chunk in response.streaming_content]))
+
+    async def test_streams_tokens_then_end(self):
+        events = await self.stream('¿Cómo pido una tarjeta?')
+
+        self.assertEqual(events[-1][0], 'end')
+        tokens = [data['text'] for event, data in events if event == 'message']
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual(''.join(tokens), self.reply)
+
+    async def test_streamed_answer_is_cached(self):
+        await self.stream('¿Cómo pido una tarjeta?')
+        events = await self.stream('como pido una tarjeta')
+
+        self.assertEqual(events, [('message', {'text': self.reply}), ('end', {})])
+        self.assertEqual(self.fake.calls, 1)
+
+    async def test_balance_requires_login(self):
+        events = await self.stream('ver mi saldo')
+
+        self.assertIn('iniciar sesión', events[0][1]['text'])
+        self.assertEqual(self.fake.calls, 0)
+
+    async def test_busy_when_all_slots_are_taken(self):
+        with self.settings(CHATBOT_MAX_CONCURRENT_STREAMS=0, CHATBOT_QUEUE_TIMEOUT=0.01):
+            events = await self.stream('hola')
+
+        self.assertEqual(events, [('error', {'text': 'El asistente está atendiendo muchas consultas. Por favor, inténtalo en unos segundos.'})])
+
+
+class CohereResilienceTests(FakeCohereMixin, TestCase):
+    """Plazo y circuit breaker frente a un Cohere lento o caído."""
+    def ask(self, message):
+        return self.client.get(reverse('chatbot:get_response'), {'message': message})
+
+    async def stream(self, message):
+        response = await self.async_client.get(reverse('chatbot:stream_response'), {'message': message})
+        return parse_sse(b''.join([chunk async for chunk in response.streaming_content]))
+
+    def test_slow_answer_is_cut_at_the_deadline(self):
+        self.fake.latency = 1.0
+        started = time.perf_counter()
+        with self.settings(COHERE_DEADLINE=0.1):
+            response = self.ask('¿Cómo pido una tarjeta?')
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(response.json(), {'response': views.ERROR_MESSAGE})
+
+    def test_open_circuit_skips_cohere(self):
+        self.fake.error_status = 503
+        with self.settings(COHERE_BREAKER_THRESHOLD=2):
+            for message in ('pregunta uno', 'pregunta dos', 'pregunta tres'):
+                self.assertEqual(self.ask(message).json(), {'response': views.ERROR_MESSAGE})
+        self.assertEqual(self.fake.calls, 2)
+
+    async def test_slow_stream_is_cut_at_the_deadline(self):
+        self.fake.latency = 1.0
+        started = time.perf_counter()
+        with self.settings(COHERE_DEADLINE=0.1):
+            events = await self.stream('¿Cómo pido una tarjeta?')
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(events, [('error', {'text': views.ERROR_MESSAGE})])
+
+    async def test_stream_fails_fast_while_the_circuit_is_open(self):
+        self.fake.error_status = 503
+        with self.settings(COHERE_BREAKER_THRESHOLD=1):
+            await self.stream('pregunta uno')
+            events = await self.stream('pregunta dos')
+        self.assertEqual(events, [('error', {'text': views.ERROR_MESSAGE})])
+        self.assertEqual(self.fake.calls, 1)
+
+
+class IntentRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = IntentRouter()
+        self.router.register('balance', ['mi saldo', 'cuanto dinero tengo'], lambda request, message: 'saldo')
+        self.router.register('transfers', ['ultimas transferencias', 'transferencias'], lambda request, message: 'transferencias')
+
+    def test_normalize(self):
+        self.assertEqual(normalize('¿Cuál es MI saldo?  Año, señor...'), 'cual es mi saldo año señor')
+
+    def test_all_intents_are_found_in_one_pass(self):
+        matches = self.router.matches('¿Cuánto dinero tengo y cuáles fueron mis ÚLTIMAS transferencias?')
+
+        self.assertEqual(
+            [(m.intent, m.phrase) for m in matches],
+            [('balance', 'cuanto dinero tengo'), ('transfers', 'ultimas transferencias'), ('transfers', 'transferencias')],
+        )
+        self.assertEqual(self.router.match('mis últimas transferencias y mi saldo').name, 'balance')
+
+    def test_only_whole_words_match(self):
+        self.assertEqual(self.router.matches('mi saldoxx'), [])
+        self.assertEqual(self.router.matches('transferenciasss'), [])
+        self.assertIsNone(self.router.match('quiero una tarjeta'))
+
+    def test_general_questions_fall_through_to_the_llm(self):
+        for message in ('¿Cuánto tengo que pagar de comisión?', '¿Mi dinero está asegurado?',
+                        '¿Hay gastos de mantenimiento?', '¿Cobran algún gasto en el extranjero?'):
+            with self.subTest(message=message):
+                self.assertIsNone(bank_intents.router.match(message))
+
+    def test_account_questions_are_still_recognized(self):
+        for message, intent in [('¿Cuánto tengo en mi cuenta?', 'balance'), ('muéstrame mi saldo', 'balance'),
+                                ('¿Cuánto gasté en agua?', 'service_spending'), ('mis gastos en luz', 'service_spending')]:
+            with self.subTest(message=message):
+                self.assertEqual(bank_intents.router.match(message).name, intent)
+
+
+class ChatbotWidgetTests(TestCase):
+    """El widget usa el stream solo bajo ASGI; con WSGI, la petición simple."""
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='alice', dni='11111111', password='clave-segura-123')
+
+    def test_wsgi_uses_the_plain_endpoint(self):
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('core_bank:dashboard')), 'const streaming = false')
+
+        with self.settings(ASYNC_AUTH_VIEWS=True):
+            self.assertContains(self.client.get(reverse('core_bank:dashboard')), 'const streaming = true')
+
+    async def test_asgi_streams(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('core_bank:dashboard'))
+        self.assertContains(response, 'const streaming = true')
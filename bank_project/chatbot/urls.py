@@ -3,5 +3,6 @@ from . import views
 
 urlpatterns = [
     path('interact/', views.get_response, name='get_response'),
+    path('stream/', views.stream_response, name='stream_response'), # Versión SSE, requiere ASGI
     # No es necesario una vista directa para chatbot_view si se incluye en otro template
 ]
\ No newline at end of file
@@ -1,46 +1,26 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from asgiref.sync import sync_to_async
+from cohere.core.api_error import ApiError as CohereError
+import asyncio
 import cohere
+import httpx
+import json
 import os
+import weakref
 from dotenv import load_dotenv
-from core_bank import views as core_bank_views # Importar vistas de core_bank
-from django.contrib.auth.models import AnonymousUser # Para verificar si el usuario está autenticado
+from core_bank import metrics, resilience
+from .bank_intents import router
+from . import response_cache
 
 load_dotenv()
-co = cohere.Client(os.getenv("COHERE_API_KEY"))
 
-def chatbot_view(request):
-    return render(request, 'chatbot/chatbot.html')
-
-def get_response(request):
-    user_message = request.GET.get('message', '').lower() # Convertir a minúsculas para coincidencia de palabras clave
-
-    # Palabras clave para detectar si el usuario pregunta por su saldo
-    balance_keywords = ["cuanto dinero tengo", "cuál es mi saldo", "mi dinero", "saldo de mi cuenta", "consultar saldo", "ver mi saldo"]
-    
-    # Verificar si alguna palabra clave de saldo está en el mensaje del usuario
-    is_asking_for_balance = any(keyword in user_message for keyword in balance_keywords)
-
-    if is_asking_for_balance:
-        # Verificar si el usuario está autenticado
-        if request.user.is_authenticated:
-            # Llamar directamente a la función de vista de core_bank para obtener el saldo
-            # Pasamos el objeto request actual para que la vista tenga el usuario
-            balance_response_json = core_bank_views.get_user_balance_api(request)
-            balance_data = balance_response_json.json() # Parsear el contenido de JsonResponse
-
-            if 'balance' in balance_data:
-                balance = balance_data['balance']
-                return JsonResponse({'response': f"Tu saldo actual es de S/ {balance}. ¿Hay algo más en lo que pueda ayudarte?"})
-            else:
-                # Si la API interna no pudo obtener el saldo
-                return JsonResponse({'response': 'Lo siento, no pude obtener tu saldo en este momento. Por favor, inténtalo de nuevo.'}, status=500)
-        else:
-            # Si el usuario no está autenticado y pregunta por el saldo
-            return JsonResponse({'response': 'Para consultar tu saldo, necesitas iniciar sesión. Por favor, inicia sesión para acceder a tu información personal.'})
-
-    # Si no se pregunta por el saldo, proceder con Cohere como de costumbre
-    contexto = """
+MODEL = "command-r-plus" # O el modelo de Cohere que prefieras
+MAX_TOKENS = 60
+PREAMBLE = """
 Eres un asesor bancario profesional.
 Responde de manera amable y clara.
 Tus respuestas deben ser breves: máximo 2-3 frases.
@@ -48,20 +28,180 @@ Solo da información sobre cuentas, préstamos, tarjetas y transferencias.
 No inventes información sobre clientes.
 Evita explicaciones largas o redundantes.
 """
+ERROR_MESSAGE = 'Lo siento, no puedo procesar tu solicitud en este momento. Por favor, inténtalo más tarde.'
+UNEXPECTED_ERROR_MESSAGE = 'Ha ocurrido un error inesperado. Por favor, inténtalo de nuevo.'
+BUSY_MESSAGE = 'El asistente está atendiendo muchas consultas. Por favor, inténtalo en unos segundos.'
+# Cohere falló, no respondió a tiempo o su circuito está abierto (ver core_bank/resilience.py)
+PROVIDER_ERRORS = (CohereError, httpx.TransportError, TimeoutError, resilience.CircuitOpen)
+
+_client = None
+# Un cliente asíncrono y un semáforo por event loop: httpx y asyncio no se
+# pueden compartir entre loops distintos (por ejemplo, entre tests).
+_loop_state = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """Cliente síncrono de Cohere, creado la primera vez que se usa."""
+    global _client
+    if _client is None:
+        _client = cohere.Client(settings.COHERE_API_KEY, base_url=settings.COHERE_BASE_URL, timeout=settings.COHERE_TIMEOUT)
+    return _client
+
+
+def _get_loop_state():
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None:
+        state = _loop_state[loop] = {
+            'client': cohere.AsyncClient(settings.COHERE_API_KEY, base_url=settings.COHERE_BASE_URL, timeout=settings.COHERE_TIMEOUT),
+            'semaphore': asyncio.Semaphore(settings.CHATBOT_MAX_CONCURRENT_STREAMS),
+        }
+    return state
+
+
+@receiver(setting_changed)
+def _reset_clients(setting, **kwargs):
+    global _client
+    if setting.startswith(('COHERE_', 'CHATBOT_')):
+        _client = None
+        _loop_state.clear()
+
+
+def chatbot_view(request):
+    return render(request, 'chatbot/chatbot.html')
+
+
+def get_response(request):
+    user_message = request.GET.get('message', '').lower() # Convertir a minúsculas para coincidencia de palabras clave
+
+    # Saldo, últimas transferencias, gastos, etc. se responden desde la base de
+    # datos (ver bank_intents.py) y nunca llegan al LLM.
+    answer = router.route(request, user_message)
+    if answer is not None:
+        text, status = answer
+        return JsonResponse({'response': text}, status=status)
 
+    # Las preguntas frecuentes se sirven desde la caché sin llamar a Cohere
+    key = response_cache.cache_key(user_message, PREAMBLE, MODEL, MAX_TOKENS)
+    cached = response_cache.get_cached(key)
+    if cached is not None:
+        return JsonResponse({'response': cached})
+
+    # Si ninguna intención coincide, proceder con Cohere como de costumbre
     try:
-        respuesta = co.chat(
-            model="command-r-plus", # O el modelo de Cohere que prefieras
-            message=user_message,
-            preamble=contexto,
-            max_tokens=60
-        )
+        # Circuit breaker y bulkhead: si Cohere está caída o lenta, se responde enseguida sin ocupar el worker
+        with resilience.get_provider('cohere').call(), metrics.outbound('cohere'):
+            respuesta = get_client().chat(
+                model=MODEL,
+                message=user_message,
+                preamble=PREAMBLE,
+                max_tokens=MAX_TOKENS,
+                request_options={'timeout_in_seconds': settings.COHERE_DEADLINE},
+            )
+        response_cache.store(key, respuesta.text)
         return JsonResponse({'response': respuesta.text})
-    except cohere.CohereError as e:
+    except resilience.BulkheadFull:
+        return JsonResponse({'response': BUSY_MESSAGE}, status=503)
+    except PROVIDER_ERRORS as e:
         if not os.getenv("DEBUG", "True").lower() == "true":
             print(f"Error de Cohere API: {e}")
-        return JsonResponse({'response': 'Lo siento, no puedo procesar tu solicitud en este momento. Por favor, inténtalo más tarde.'}, status=500)
+        return JsonResponse({'response': ERROR_MESSAGE}, status=500)
     except Exception as e:
         if not os.getenv("DEBUG", "True").lower() == "true":
             print(f"Error inesperado en el chatbot: {e}")
-        return JsonResponse({'response': 'Ha ocurrido un error inesperado. Por favor, inténtalo de nuevo.'}, status=500)
+        return JsonResponse({'response': UNEXPECTED_ERROR_MESSAGE}, status=500)
+
+
+def _sse(data, event=None):
+    """Formatea un evento server-sent events."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _sse_single_answer(text):
+    yield _sse({'text': text})
+    yield _sse({}, event='end')
+
+
+async def _until(stream, deadline):
+    """
+    Reenvía los eventos de ``stream`` y lanza TimeoutError si no terminó
+    antes de ``deadline`` (hora del event loop). El plazo solo corre mientras
+    se espera a Cohere, nunca durante un ``yield``: así la cancelación no cae
+    en el código que consume el generador.
+    """
+    iterator = aiter(stream)
+    while True:
+        async with asyncio.timeout_at(deadline):
+            try:
+                event = await anext(iterator)
+            except StopAsyncIteration:
+                return
+        yield event
+
+
+async def _sse_llm_answer(user_message, cache_key):
+    state = _get_loop_state()
+    semaphore = state['semaphore']
+    try:
+        # Como máximo CHATBOT_MAX_CONCURRENT_STREAMS llamadas al LLM a la vez;
+        # las demás esperan un tiempo acotado y luego se rechazan.
+        await asyncio.wait_for(semaphore.acquire(), timeout=settings.CHATBOT_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        yield _sse({'text': BUSY_MESSAGE}, event='error')
+        return
+
+    try:
+        tokens = []
+        deadline = asyncio.get_running_loop().time() + settings.COHERE_DEADLINE
+        # Un cliente que se va a mitad del stream queda como 'cancelled', no como error de Cohere.
+        # Sin bulkhead de hilos: el semáforo de arriba ya limita los streams y esperar no ocupa un hilo.
+        with resilience.get_provider('cohere').call(bulkhead=False), metrics.outbound('cohere'):
+            stream = state['client'].chat_stream(
+                model=MODEL,
+                message=user_message,
+                preamble=PREAMBLE,
+                max_tokens=MAX_TOKENS,
+            )
+            async for event in _until(stream, deadline):
+                if event.event_type == 'text-generation':
+                    tokens.append(event.text)
+                    yield _sse({'text': event.text})
+        # Solo se cachea una respuesta completa, nunca un stream cortado
+        response_cache.store(cache_key, ''.join(tokens))
+        yield _sse({}, event='end')
+    except PROVIDER_ERRORS as e:
+        if not os.getenv("DEBUG", "True").lower() == "true":
+            print(f"Error de Cohere API: {e}")
+        yield _sse({'text': ERROR_MESSAGE}, event='error')
+    except Exception as e:
+        if not os.getenv("DEBUG", "True").lower() == "true":
+            print(f"Error inesperado en el chatbot: {e}")
+        yield _sse({'text': UNEXPECTED_ERROR_MESSAGE}, event='error')
+    finally:
+        semaphore.release()
+
+
+async def stream_response(request):
+    """
+    Versión asíncrona de get_response para el punto de entrada ASGI: envía la
+    respuesta del LLM token a token como server-sent events, sin ocupar un
+    hilo mientras se espera a Cohere.
+    """
+    user_message = request.GET.get('message', '').lower()
+
+    # El autómata de intenciones no toca la base de datos; solo el handler de
+    # la intención encontrada (síncrono) se ejecuta en un hilo.
+    intent = router.match(user_message)
+    if intent is not None:
+        text, _ = await sync_to_async(router.answer)(intent, request, user_message)
+        events = _sse_single_answer(text)
+    else:
+        key = response_cache.cache_key(user_message, PREAMBLE, MODEL, MAX_TOKENS)
+        cached = response_cache.get_cached(key)
+        events = _sse_single_answer(cached) if cached is not None else _sse_llm_answer(user_message, key)
+
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Evita que un proxy (nginx) acumule el stream
+    return response
@@ -1,6 +1,18 @@
+from datetime import timedelta
+
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, Transaction, Service, ServicePayment
+from django.db.models import Max, Min, QuerySet
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
+
+from . import ledger
+from .models import CustomUser, Transaction, Service, ServicePayment, QueuedTransfer, SettlementRun, SettlementBatch
+from .pagination import EstimatedCountPaginator
+from .statements import csv_chunks, STATEMENT_CHUNK_SIZE
 
 # Permite que 'balance' y 'dni' sean editables en el admin de usuario
 class CustomUserAdmin(UserAdmin):
@@ -14,8 +26,172 @@ class CustomUserAdmin(UserAdmin):
     search_fields = ('username', 'email', 'dni', 'first_name', 'last_name')
     ordering = ('username',)
 
-admin.site.register(CustomUser, CustomUserAdmin)
-admin.site.register(Transaction)
-admin.site.register(Service)
-admin.site.register(ServicePayment)
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        if obj is not None:
+            # El saldo mostrado viaja oculto con el formulario: así changed_data compara contra lo que
+            # vio el admin y no contra el saldo actual, que el ledger pudo mover mientras tanto
+            form.base_fields['balance'].show_hidden_initial = True
+        return form
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # El saldo y la versión del formulario pueden estar viejos: el ledger los mueve mientras
+        # el formulario está abierto, así que no entran en el UPDATE de la fila completa
+        obj.save(update_fields=[
+            field.name for field in obj._meta.concrete_fields
+            if not field.primary_key and field.name not in ('balance', 'ledger_version')
+        ])
+        if 'balance' in form.changed_data:
+            # Un ajuste manual fija el saldo e invalida los ETag del cliente, como cualquier movimiento
+            CustomUser.objects.filter(pk=obj.pk).update(balance=obj.balance, ledger_version=ledger.NEXT_VERSION)
+        obj.refresh_from_db(fields=['balance', 'ledger_version'])
+
+
+def csv_export_action(name, header, fields):
+    """
+    Acción que descarga las filas elegidas (o todo el filtro, con "seleccionar
+    todo") como CSV generado mientras se envía, sin cargarlas en memoria.
+    El primer campo de ``fields`` debe ser la fecha.
+    """
+    @admin.action(description="Exportar a CSV")
+    def export(modeladmin, request, queryset):
+        rows = (
+            queryset.order_by('-timestamp', '-id').values_list(*fields, named=True)
+            .iterator(chunk_size=STATEMENT_CHUNK_SIZE)
+        )
+        response = StreamingHttpResponse(csv_chunks(rows, header=header), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{name}_{timezone.localdate():%Y%m%d}.csv"'
+        return response
+    return export
+
+
+class DateRangeQuerySet(QuerySet):
+    """
+    Para la jerarquía de fechas del admin. Django arma los enlaces con un
+    SELECT DISTINCT de la fecha truncada, que recorre toda la tabla; aquí se
+    listan los años, meses o días entre el primer y el último registro, que
+    salen del índice con MIN y MAX. A cambio puede aparecer algún mes o día
+    sin movimientos.
+    """
+    def aggregate(self, *args, **kwargs):
+        # MIN y MAX en la misma sentencia hacen que SQLite recorra todo el índice;
+        # por separado cada uno es una sola búsqueda en él
+        if not args and len(kwargs) > 1 and all(isinstance(agg, (Min, Max)) for agg in kwargs.values()):
+            return {name: super(DateRangeQuerySet, self).aggregate(**{name: agg})[name] for name, agg in kwargs.items()}
+        return super().aggregate(*args, **kwargs)
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds['first'] is None:
+            return []
+        first, last = timezone.localtime(bounds['first']), timezone.localtime(bounds['last'])
+        if kind == 'year':
+            return [first.replace(year=year, month=1, day=1) for year in range(first.year, last.year + 1)]
+        if kind == 'month':
+            months = range(first.year * 12 + first.month - 1, last.year * 12 + last.month)
+            return [first.replace(year=n // 12, month=n % 12 + 1, day=1) for n in months]
+        return [first + timedelta(days=n) for n in range((last.date() - first.date()).days + 1)]
+
+
+class LargeTableChangeList(ChangeList):
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        return DateRangeQuerySet(model=queryset.model, query=queryset.query, using=queryset.db)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Listados de tablas con millones de filas: sin COUNT(*) de la tabla
+    entera, la página sale de un índice que empieza por la fecha (o por el
+    filtro y la fecha), la jerarquía de fechas solo pide MIN y MAX y los
+    usuarios se eligen por id en vez de con un desplegable de todas las
+    cuentas.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    date_hierarchy = 'timestamp'
+    ordering = ('-timestamp', '-id')
+
+    def get_changelist(self, request, **kwargs):
+        return LargeTableChangeList
+
+
+@admin.register(Transaction)
+class TransactionAdmin(LargeTableAdmin):
+    list_display = ('timestamp', 'transaction_type', 'sender', 'receiver', 'amount', 'description')
+    list_select_related = ('sender', 'receiver')
+    list_filter = ('transaction_type',)
+    # Búsqueda exacta (no iexact, que en SQLite es un LIKE) por el remitente: entra por el índice
+    # único de username y luego por (sender, timestamp); un OR con el destinatario recorrería la tabla
+    search_fields = ('sender__username__exact',)
+    raw_id_fields = ('sender', 'receiver')
+    actions = [csv_export_action(
+        'transacciones',
+        ('Fecha', 'Tipo', 'Remitente', 'Destinatario', 'Monto', 'Descripción'),
+        ('timestamp', 'transaction_type', 'sender__username', 'receiver__username', 'amount', 'description'),
+    )]
 
+
+@admin.register(ServicePayment)
+class ServicePaymentAdmin(LargeTableAdmin):
+    list_display = ('timestamp', 'service', 'user', 'amount', 'invoice_number')
+    list_select_related = ('service', 'user')
+    list_filter = ('service',)
+    search_fields = ('user__username__exact',)
+    raw_id_fields = ('user',)
+    actions = [csv_export_action(
+        'pagos_de_servicios',
+        ('Fecha', 'Servicio', 'Usuario', 'Monto', 'Factura'),
+        ('timestamp', 'service__name', 'user__username', 'amount', 'invoice_number'),
+    )]
+
+
+@admin.register(Service)
+class ServiceAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
+
+
+@admin.register(QueuedTransfer)
+class QueuedTransferAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_display = ('reference', 'created_at', 'status', 'sender', 'receiver', 'amount', 'error')
+    list_select_related = ('sender', 'receiver')
+    list_filter = ('status',)  # Índice (status, id)
+    search_fields = ('reference__exact',)
+    raw_id_fields = ('sender', 'receiver')
+    ordering = ('-id',)
+
+
+class SettlementBatchInline(admin.TabularInline):
+    model = SettlementBatch
+    fields = ('service', 'total', 'count', 'file_link')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    @admin.display(description="Archivo")
+    def file_link(self, batch):
+        return format_html('<a href="{}">CSV</a>', reverse('core_bank:settlement_file', args=[batch.pk]))
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('service')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SettlementRun)
+class SettlementRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created_at', 'through_timestamp', 'count', 'total')
+    readonly_fields = [field.name for field in SettlementRun._meta.fields]
+    inlines = [SettlementBatchInline]
+
+    def has_add_permission(self, request):
+        return False  # Las corridas las crea settle_billers
+
+
+admin.site.register(CustomUser, CustomUserAdmin)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CoreBankConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core_bank'
+
+    def ready(self):
+        from . import catalog  # noqa: F401 -- registra las señales que invalidan el catálogo
+        from . import metrics  # noqa: F401 -- instala el conteo de consultas en cada conexión nueva
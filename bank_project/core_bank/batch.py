@@ -0,0 +1,116 @@
+# core_bank/batch.py
+"""
+Transferencias por lote (planillas / pagos masivos).
+
+Recibe las líneas en CSV o JSON, resuelve todos los destinatarios con una o
+dos consultas ``IN`` (DNI primero y luego usuario, igual que transfer_view) y
+aplica las líneas válidas con ``ledger.batch_transfer`` en un solo bloque
+atómico. Devuelve un reporte por línea.
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from . import ledger
+from .models import CustomUser
+
+MAX_BATCH_LINES = 5000
+MAX_AMOUNT = Decimal('99999999.99')  # max_digits=10, decimal_places=2
+
+
+class BatchFormatError(ValueError):
+    """El cuerpo de la petición no es un CSV o JSON de lote válido."""
+
+
+def parse_csv(text):
+    """
+    Columnas: destinatario (DNI o usuario), monto y descripción opcional.
+    Se admite una fila de encabezado.
+    """
+    lines = []
+    for row in csv.reader(io.StringIO(text)):
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if not lines and row[0].strip().lower() in ('recipient', 'destinatario', 'dni', 'usuario'):
+            continue
+        lines.append({
+            'recipient': row[0].strip(),
+            'amount': row[1].strip() if len(row) > 1 else '',
+            'description': row[2].strip() if len(row) > 2 else '',
+        })
+    return lines
+
+
+def parse_json(text):
+    """Una lista de objetos, o ``{"transfers": [...]}``, con recipient, amount y description."""
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise BatchFormatError(f"JSON inválido: {e}") from e
+    if isinstance(data, dict):
+        data = data.get('transfers')
+    if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+        raise BatchFormatError("Se esperaba una lista de transferencias.")
+    return [
+        {
+            'recipient': str(item.get('recipient', '')).strip(),
+            'amount': str(item.get('amount', '')).strip(),
+            'description': str(item.get('description') or '').strip(),
+        }
+        for item in data
+    ]
+
+
+def _clean_amount(raw):
+    try:
+        amount = Decimal(raw)
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or amount <= 0 or amount > MAX_AMOUNT or amount != amount.quantize(Decimal('0.01')):
+        return None
+    return amount.quantize(Decimal('0.01'))
+
+
+def resolve_recipients(identifiers):
+    """Mapea cada identificador (DNI o usuario) a su id de cuenta con a lo sumo dos consultas."""
+    resolved = {}
+    dnis = {i for i in identifiers if i.isdigit() and len(i) == 8}
+    if dnis:
+        resolved.update(CustomUser.objects.filter(dni__in=dnis).values_list('dni', 'id'))
+    usernames = set(identifiers) - set(resolved)
+    if usernames:
+        resolved.update(CustomUser.objects.filter(username__in=usernames).values_list('username', 'id'))
+    return resolved
+
+
+def run_batch(sender, lines):
+    """
+    Valida y aplica un lote. Devuelve ``(reporte, total_aplicado)``; las líneas
+    inválidas se reportan y se omiten. Lanza ledger.InsufficientFunds si el total
+    de las líneas válidas supera el saldo del remitente (no se aplica ninguna).
+    """
+    if len(lines) > MAX_BATCH_LINES:
+        raise BatchFormatError(f"El lote no puede tener más de {MAX_BATCH_LINES} líneas.")
+
+    resolved = resolve_recipients({line['recipient'] for line in lines if line['recipient']})
+    report, transfers = [], []
+    for number, line in enumerate(lines, start=1):
+        result = {'line': number, 'recipient': line['recipient'], 'amount': line['amount']}
+        report.append(result)
+        amount = _clean_amount(line['amount'])
+        recipient_id = resolved.get(line['recipient'])
+        if amount is None:
+            result.update(status='error', error="Monto inválido.")
+        elif recipient_id is None:
+            result.update(status='error', error="Destinatario no encontrado.")
+        elif recipient_id == sender.id:
+            result.update(status='error', error="No puedes transferirte a ti mismo.")
+        elif len(line['description']) > 255:
+            result.update(status='error', error="La descripción no puede superar 255 caracteres.")
+        else:
+            result.update(status='ok', amount=str(amount))
+            transfers.append((recipient_id, amount, line['description'] or None))
+
+    ledger.batch_transfer(sender.id, transfers)
+    return report, sum((amount for _, amount, _ in transfers), Decimal('0.00'))
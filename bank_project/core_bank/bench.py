@@ -0,0 +1,187 @@
+# core_bank/bench.py
+"""
+Utilidades compartidas por los comandos de benchmark (``manage.py bench_*``).
+
+Los benchmarks corren sobre una base de datos temporal creada con el mismo
+mecanismo que usan los tests, así nunca tocan los datos de ``db.sqlite3``.
+``seed_bank()`` también la usa ``manage.py seed_bank`` para poblar una base real.
+"""
+import os
+import random
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction as db_transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import rollups
+from .models import CustomUser, Transaction, Service, ServicePayment
+
+
+@contextmanager
+def isolated_database(alias='default'):
+    """Crea una base de datos de prueba temporal y la destruye al salir."""
+    connection = connections[alias]
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    previous_test_name = test_settings.get('NAME')
+    tmp_dir = None
+    if connection.vendor == 'sqlite':
+        # Un archivo real (y no la base en memoria de los tests) para que los
+        # hilos del benchmark compartan la misma base de datos.
+        tmp_dir = tempfile.mkdtemp(prefix='bank_bench_')
+        test_settings['NAME'] = os.path.join(tmp_dir, 'bench.sqlite3')
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = previous_test_name
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def create_accounts(count, prefix='bench', balance=Decimal('10000.00'), password=None, start=0, balances=None):
+    """
+    Crea ``count`` cuentas con bulk_create (sin pasar por CustomUser.save())
+    y devuelve sus ids en orden. ``password`` se hashea una sola vez para
+    todas (por defecto, contraseña inutilizable); ``start`` desplaza los
+    números de usuario y DNI; ``balances`` da un saldo distinto por cuenta.
+    """
+    password = make_password(password)  # Con None queda inutilizable y no se hashea nada
+    CustomUser.objects.bulk_create([
+        CustomUser(
+            username=f"{prefix}{start + i}",
+            dni=f"{start + i:08d}",
+            first_name=f"Cliente {start + i}",
+            last_name="Benchmark",
+            password=password,
+            balance=balances[i] if balances is not None else balance,
+        )
+        for i in range(count)
+    ], batch_size=500)
+    return list(
+        CustomUser.objects.filter(dni__gte=f"{start:08d}", dni__lt=f"{start + count:08d}")
+        .order_by('id').values_list('id', flat=True)
+    )
+
+
+def bulk_create_at(model, objects, timestamps):
+    """
+    bulk_create con fechas pasadas. auto_now_add pisa ``timestamp`` al
+    insertar, así que las fechas se corrigen después con un UPDATE por id de
+    las filas recién creadas (sin tocar la definición del campo, que
+    comparten todos los hilos del proceso). Un executemany con la sentencia
+    preparada: bulk_update armaría un CASE por lote y es varias veces más lento.
+    """
+    created = model.objects.bulk_create(objects)
+    connection = connections[model.objects.db]
+    field, quote = model._meta.get_field('timestamp'), connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {quote(model._meta.db_table)} SET {quote(field.column)} = %s WHERE {quote(model._meta.pk.column)} = %s",
+            [(field.get_db_prep_value(timestamp, connection), obj.pk) for obj, timestamp in zip(created, timestamps)],
+        )
+
+
+def seed_bank(users, transactions=0, payments=0, password=None, prefix='cliente', days=90, seed=0,
+              opening_balance=Decimal('10000.00'), batch_size=5000):
+    """
+    Crea ``users`` clientes con ``transactions`` transferencias entre ellos y
+    ``payments`` pagos de servicios repartidos en los últimos ``days`` días,
+    todo con bulk_create. Los movimientos se generan en orden cronológico y
+    cada uno lo hace un cliente con saldo suficiente en ese momento, así
+    ninguna cuenta queda en negativo en ningún punto del historial y los
+    saldos finales cuadran con él. Los SpendingRollup se reconstruyen al
+    final. Devuelve los ids de los clientes.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    services = list(Service.objects.order_by('id').values_list('id', flat=True))
+    if payments and not services:
+        raise ValueError("No hay servicios en el catálogo (¿faltan las migraciones?).")
+
+    def amount():
+        return Decimal(rng.randint(100, 5000)) / 100  # Entre 1.00 y 50.00
+
+    balances = [opening_balance] * users
+
+    def payer(value):
+        # Un cliente al azar que pueda pagar ``value``; si no aparece pronto, el de más saldo
+        for _ in range(10):
+            user = rng.randrange(users)
+            if balances[user] >= value:
+                return user
+        user = max(range(users), key=balances.__getitem__)
+        if balances[user] < value:
+            raise ValueError("El saldo inicial no alcanza para tantos movimientos.")
+        return user
+
+    kinds = ['transferencia'] * (transactions if users > 1 else 0) + ['pago_servicio'] * payments
+    rng.shuffle(kinds)
+    moments = sorted(now - timedelta(seconds=rng.randrange(days * 86400)) for _ in kinds)
+    planned_transfers, planned_payments = [], []
+    for kind, timestamp in zip(kinds, moments):
+        value = amount()
+        user = payer(value)
+        balances[user] -= value
+        if kind == 'transferencia':
+            receiver = rng.randrange(users - 1)
+            receiver += receiver >= user
+            balances[receiver] += value
+            planned_transfers.append((user, receiver, value, timestamp))
+        else:
+            planned_payments.append((user, rng.choice(services), value, timestamp))
+
+    # Números de usuario/DNI a continuación de los que ya existan
+    last_dni = CustomUser.objects.aggregate(last=Max('dni'))['last']
+    start = int(last_dni) + 1 if last_dni and last_dni.isdigit() else 0
+    ids = create_accounts(users, prefix=prefix, password=password, start=start, balances=balances)
+
+    with db_transaction.atomic():
+        for offset in range(0, len(planned_transfers), batch_size):
+            chunk = planned_transfers[offset:offset + batch_size]
+            bulk_create_at(Transaction, [
+                Transaction(sender_id=ids[sender], receiver_id=ids[receiver], amount=value,
+                            transaction_type='transferencia', description='Carga de prueba')
+                for sender, receiver, value, _ in chunk
+            ], [timestamp for *_, timestamp in chunk])
+        for offset in range(0, len(planned_payments), batch_size):
+            chunk = planned_payments[offset:offset + batch_size]
+            timestamps = [timestamp for *_, timestamp in chunk]
+            bulk_create_at(ServicePayment, [
+                ServicePayment(user_id=ids[user], service_id=service_id, amount=value, invoice_number=f"F-{offset + n}")
+                for n, (user, service_id, value, _) in enumerate(chunk)
+            ], timestamps)
+            # Igual que ledger.pay_service: cada pago tiene también su Transaction
+            bulk_create_at(Transaction, [
+                Transaction(sender_id=ids[user], amount=value, transaction_type='pago_servicio',
+                            description='Pago de servicio (carga de prueba)')
+                for user, _, value, _ in chunk
+            ], timestamps)
+    rollups.rebuild()  # Completo: son datos derivados y así no hay un IN con miles de ids
+    return ids
+
+
+def percentile(values, pct):
+    """Percentil ``pct`` (0-100) por el método del rango más cercano."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Stopwatch:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
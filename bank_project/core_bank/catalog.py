@@ -0,0 +1,73 @@
+# core_bank/catalog.py
+"""
+Catálogo de servicios en memoria del proceso.
+
+El catálogo casi nunca cambia y se lee en cada visita a "Pagar Servicios"
+(para pintar el select y para validar el pago), así que se carga una vez y se
+sirve sin consultas. Cada save/delete de Service incrementa la versión y la
+siguiente lectura lo recarga. Los demás procesos no reciben esa señal: para
+ellos el catálogo caduca a los SERVICE_CATALOG_TTL segundos.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction as db_transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Service
+
+_lock = threading.Lock()
+_version = 0
+_snapshot = None  # (versión, cargado_en, servicios, servicios_por_id)
+
+
+def invalidate():
+    global _version
+    with _lock:
+        _version += 1
+
+
+def _load():
+    global _snapshot
+    version = _version
+    services = tuple(Service.objects.order_by('id'))
+    # Si hubo una invalidación durante la consulta, la foto queda con la versión
+    # vieja y se vuelve a cargar en la próxima lectura.
+    snapshot = (version, time.monotonic(), services, {service.pk: service for service in services})
+    with _lock:
+        _snapshot = snapshot
+    return snapshot
+
+
+def _current():
+    snapshot = _snapshot
+    if snapshot is None or snapshot[0] != _version or time.monotonic() - snapshot[1] > settings.SERVICE_CATALOG_TTL:
+        snapshot = _load()
+    return snapshot
+
+
+def get_services():
+    """Todos los servicios, en orden de id. Las instancias son compartidas: no modificarlas."""
+    return _current()[2]
+
+
+def get_service(pk):
+    """El servicio con ese id, o None si no está en el catálogo."""
+    return _current()[3].get(pk)
+
+
+@receiver([post_save, post_delete], sender=Service)
+def _service_changed(**kwargs):
+    invalidate()
+    # Otra petición podría recargar antes del commit y quedarse con el catálogo
+    # anterior: se invalida otra vez cuando el cambio ya es visible.
+    db_transaction.on_commit(invalidate)
+
+
+@receiver(setting_changed)
+def _reset_catalog(setting, **kwargs):
+    if setting == 'SERVICE_CATALOG_TTL':
+        invalidate()
@@ -0,0 +1,190 @@
+# core_bank/dni_lookup.py
+"""
+Consulta de DNI contra la API RENIEC de Decolecta.
+
+- Un ``requests.Session`` con pool de conexiones y timeouts estrictos.
+- Caché TTL con desalojo LRU, incluyendo caché negativa para los DNI no encontrados.
+- Single-flight: peticiones concurrentes por el mismo DNI comparten una sola
+  llamada a la API.
+- Bulkhead y circuit breaker (ver resilience.py): si Decolecta está lenta o
+  caída, las consultas de más fallan enseguida con DniServiceUnavailable en
+  vez de dejar a todos los workers esperando.
+"""
+import threading
+
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+
+from . import metrics, resilience
+from .ttlcache import TTLCache
+
+NOT_FOUND_MESSAGE = 'No se encontró información para el DNI o la respuesta fue inválida.'
+
+
+class DniLookupError(Exception):
+    """Falla al consultar la API (red, timeout, autenticación, respuesta inválida)."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class DniNotFound(DniLookupError):
+    """La API respondió, pero no hay datos para ese DNI."""
+
+
+class DniServiceUnavailable(DniLookupError):
+    """No se llamó a la API: circuito abierto o demasiadas consultas en curso."""
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class DniLookupService:
+    def __init__(self, url, token, connect_timeout=2.0, read_timeout=5.0,
+                 cache_ttl=24 * 3600, negative_cache_ttl=300, cache_max_entries=10000,
+                 pool_size=10, session=None, provider=None):
+        self.url = url
+        self.token = token
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache_ttl = cache_ttl
+        self.negative_cache_ttl = negative_cache_ttl
+        self.cache = TTLCache(max_entries=cache_max_entries, default_ttl=cache_ttl)
+        self.upstream_calls = 0
+        self.provider = provider or resilience.Provider('decolecta')
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+
+    def lookup(self, dni):
+        """
+        Devuelve ``{'nombres', 'apellidoPaterno', 'apellidoMaterno'}`` o lanza
+        DniNotFound / DniLookupError.
+        """
+        cached = self.cache.get(dni)
+        if cached is not None:
+            return self._unwrap(cached)
+
+        with self._lock:
+            call = self._inflight.get(dni)
+            leader = call is None
+            if leader:
+                call = self._inflight[dni] = _InFlight()
+
+        if not leader:
+            # Otra petición ya está consultando este DNI: se espera su resultado
+            if not call.done.wait(sum(self.timeout) + 1):
+                raise DniLookupError("Tiempo de espera agotado al consultar el DNI.")
+            if call.error is not None:
+                raise call.error
+            return self._unwrap(call.result)
+
+        try:
+            call.result = self._fetch(dni)
+            found, _ = call.result
+            self.cache.set(dni, call.result, self.cache_ttl if found else self.negative_cache_ttl)
+            return self._unwrap(call.result)
+        except DniLookupError as e:
+            call.error = e
+            raise
+        except Exception as e:
+            # Un error inesperado también tiene que llegar a quienes esperan, no un resultado vacío
+            call.error = DniLookupError("Error inesperado al consultar el DNI.")
+            call.error.__cause__ = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(dni, None)
+            call.done.set()
+
+    @staticmethod
+    def _unwrap(result):
+        found, payload = result
+        if not found:
+            raise DniNotFound(payload, status_code=404)
+        return payload
+
+    def _fetch(self, dni):
+        try:
+            with self.provider.call():
+                return self._request(dni)
+        except resilience.ProviderUnavailable as e:
+            raise DniServiceUnavailable(str(e)) from e
+
+    def _request(self, dni):
+        with self._lock:
+            self.upstream_calls += 1
+        headers = {
+            'Authorization': f'Bearer {self.token}',
+            'Content-Type': 'application/json',
+        }
+        with metrics.outbound('decolecta'):  # Un 404/422 es una respuesta válida; cuenta como error lo que lanza
+            try:
+                response = self.session.get(self.url, headers=headers, params={'numero': dni}, timeout=self.timeout)
+                if response.status_code in (404, 422):
+                    return False, self._error_message(response)
+                response.raise_for_status()
+                data = response.json()
+            except requests.exceptions.RequestException as e:
+                status_code = e.response.status_code if getattr(e, 'response', None) is not None else None
+                raise DniLookupError(str(e), status_code=status_code) from e
+            except ValueError as e:
+                raise DniLookupError(f"Respuesta inválida de la API de DNI: {e}") from e
+
+        if not data.get('first_name'):
+            return False, data.get('message', NOT_FOUND_MESSAGE)
+        return True, {
+            'nombres': data.get('first_name'),
+            'apellidoPaterno': data.get('first_last_name'),
+            'apellidoMaterno': data.get('second_last_name'),
+        }
+
+    @staticmethod
+    def _error_message(response):
+        try:
+            return response.json().get('message', NOT_FOUND_MESSAGE)
+        except ValueError:
+            return NOT_FOUND_MESSAGE
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    """Instancia compartida por el proceso, configurada desde settings."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = DniLookupService(
+                    url=settings.DECOLECTA_API_URL,
+                    token=settings.DECOLECTA_API_TOKEN,
+                    connect_timeout=settings.DECOLECTA_CONNECT_TIMEOUT,
+                    read_timeout=settings.DECOLECTA_READ_TIMEOUT,
+                    cache_ttl=settings.DNI_CACHE_TTL,
+                    negative_cache_ttl=settings.DNI_NEGATIVE_CACHE_TTL,
+                    cache_max_entries=settings.DNI_CACHE_MAX_ENTRIES,
+                    provider=resilience.get_provider('decolecta'),
+                )
+    return _service
+
+
+@receiver(setting_changed)
+def _reset_service(setting, **kwargs):
+    global _service
+    if setting.startswith(('DECOLECTA_', 'DNI_')):
+        _service = None
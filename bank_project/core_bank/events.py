@@ -0,0 +1,202 @@
+# core_bank/events.py
+"""
+Avisos en tiempo real de movimientos de cuenta (server-sent events).
+
+El ledger publica, después del commit, un evento por cada movimiento a las
+cuentas involucradas. La vista ``activity_stream`` (solo bajo ASGI) se
+suscribe a la cuenta del usuario y reenvía los eventos a sus pestañas
+abiertas, junto con el saldo actualizado.
+
+El broker es intercambiable con EVENTS_BROKER:
+
+- ``InProcessBroker`` (por defecto): colas en memoria; alcanza cuando un
+  solo proceso ASGI atiende todas las conexiones.
+- ``RedisBroker``: pub/sub de Redis (EVENTS_BROKER_URL) para varios
+  procesos o un worker aparte (p. ej. process_transfer_queue). Usa el
+  paquete ``redis`` de requirements.txt.
+
+Un broker expone ``publish(user_id, event)`` (sync, se llama desde
+cualquier hilo) y ``subscribe(user_id)``, que devuelve un context manager
+async con ``await subscription.get()``.
+"""
+import asyncio
+import functools
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import transaction as db_transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class _QueueSubscription:
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = None
+        self.queue = None
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        self.broker._add(self)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.broker._remove(self)
+
+    def deliver(self, event):
+        # Se llama desde el hilo que publica: la cola solo se toca desde su event loop
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()  # Una pestaña que no lee pierde lo más viejo, no frena al resto
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        return _QueueSubscription(self, user_id)
+
+    def _add(self, subscription):
+        with self._lock:
+            self._subscriptions[subscription.user_id].add(subscription)
+
+    def _remove(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def subscribers(self, user_id):
+        with self._lock:
+            return len(self._subscriptions.get(user_id, ()))
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.deliver(event)
+            except RuntimeError:  # Su event loop ya se cerró
+                self._remove(subscription)
+
+
+def _import_redis():
+    try:
+        import redis
+        import redis.asyncio
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            "EVENTS_BROKER=core_bank.events.RedisBroker necesita el paquete redis (pip install -r requirements.txt)."
+        ) from e
+    return redis
+
+
+class _RedisSubscription:
+    def __init__(self, connect, channel):
+        self.connect = connect
+        self.channel = channel
+
+    async def __aenter__(self):
+        self.client = self.connect()
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await self.pubsub.subscribe(self.channel)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+    async def get(self):
+        while True:
+            message = await self.pubsub.get_message(timeout=None)
+            if message is not None:
+                return json.loads(message['data'])
+
+
+class RedisBroker:
+    """
+    ``client`` publica; ``async_client()`` crea el cliente async de cada
+    suscripción. Por defecto ambos se conectan a EVENTS_BROKER_URL.
+    """
+    def __init__(self, client=None, async_client=None):
+        self.url = settings.EVENTS_BROKER_URL
+        if client is None or async_client is None:
+            redis = _import_redis()
+            if client is None:
+                client = redis.Redis.from_url(self.url)
+            if async_client is None:
+                async_client = functools.partial(redis.asyncio.Redis.from_url, self.url)
+        self.client = client
+        self.async_client = async_client
+
+    def channel(self, user_id):
+        return f"bank:activity:{user_id}"
+
+    def subscribe(self, user_id):
+        return _RedisSubscription(self.async_client, self.channel(user_id))
+
+    def publish(self, user_id, event):
+        self.client.publish(self.channel(user_id), json.dumps(event))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.EVENTS_BROKER)()
+        return _broker
+
+
+def publish_on_commit(user_id, event):
+    """
+    Publica ``event`` a la cuenta ``user_id`` cuando la transacción en curso
+    haga commit (si se revierte, no se avisa nada). Un broker caído no debe
+    hacer fallar un movimiento que ya se guardó: el error solo se registra.
+    """
+    def send():
+        get_broker().publish(user_id, event)
+    db_transaction.on_commit(send, robust=True)
+
+
+def movement_event(direction, kind, amount, timestamp, counterparty_id=None, service_id=None, description=None):
+    """
+    Evento de un movimiento: ``direction`` es 'in' (entra dinero) u 'out'
+    (sale). Lleva ids y no nombres para que el ledger no haga consultas de
+    más; la vista los resuelve al enviarlo.
+    """
+    return {
+        'direction': direction,
+        'kind': kind,
+        'amount': str(amount),
+        'timestamp': timestamp.isoformat(),
+        'counterparty_id': counterparty_id,
+        'service_id': service_id,
+        'description': description,
+    }
+
+
+@receiver(setting_changed)
+def _reset_broker(setting, **kwargs):
+    global _broker
+    if setting.startswith('EVENTS_'):
+        _broker = None
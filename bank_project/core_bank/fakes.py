@@ -0,0 +1,126 @@
+# core_bank/fakes.py
+"""
+Servidores HTTP locales que imitan a los proveedores externos, para tests y
+benchmarks sin red ni tokens reales. ``latency`` y ``error_status`` simulan
+un proveedor lento o caído.
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # El cliente cortó por timeout antes de la respuesta: es lo que se está probando
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeServer:
+    """Servidor en un hilo aparte, en un puerto libre de 127.0.0.1. Se usa como context manager."""
+
+    handler_class = None
+
+    def __init__(self, latency=0.0, error_status=None):
+        self.latency = latency
+        self.error_status = error_status  # p. ej. 503: todas las llamadas fallan con ese código
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_call(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def start(self):
+        handler = type('Handler', (self.handler_class,), {'fake': self})
+        self._httpd = _QuietHTTPServer(('127.0.0.1', 0), handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    fake = None
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def inject_faults(self):
+        """Cuenta la llamada, aplica la latencia y, si hay ``error_status``, responde con él. True si ya respondió."""
+        self.fake.record_call()
+        if self.fake.error_status is None:
+            return False
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))  # Un cuerpo sin leer haría que el cierre llegue como RST
+        self.send_json(self.fake.error_status, {'message': 'Error simulado del proveedor'})
+        return True
+
+    def log_message(self, format, *args):
+        pass  # Silencioso durante los tests
+
+
+class _DecolectaHandler(_JsonHandler):
+    def do_GET(self):
+        if self.inject_faults():
+            return
+        url = urlparse(self.path)
+        if url.path != '/v1/reniec/dni':
+            return self.send_json(404, {'message': 'Ruta no encontrada'})
+        if self.headers.get('Authorization') != f'Bearer {self.fake.token}':
+            return self.send_json(401, {'message': 'Token inválido'})
+
+        dni = parse_qs(url.query).get('numero', [''])[0]
+        person = self.fake.people.get(dni)
+        if person is None:
+            return self.send_json(404, {'message': 'No se encontraron resultados para el DNI'})
+        first_name, first_last_name, second_last_name = person
+        self.send_json(200, {
+            'document_number': dni,
+            'first_name': first_name,
+            'first_last_name': first_last_name,
+            'second_last_name': second_last_name,
+        })
+
+
+class FakeDecolectaServer(FakeServer):
+    """Imita ``GET /v1/reniec/dni?numero=...`` de Decolecta."""
+
+    handler_class = _DecolectaHandler
+
+    def __init__(self, people=None, token='token-de-prueba', latency=0.0, error_status=None):
+        super().__init__(latency=latency, error_status=error_status)
+        self.people = people or {}
+        self.token = token
+
+    @property
+    def url(self):
+        return f"{self.base_url}/v1/reniec/dni"
@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
-from .models import CustomUser, Service
+from . import catalog
+from .models import CustomUser
 from decimal import Decimal
 
 class CustomUserCreationForm(UserCreationForm):
@@ -44,6 +45,12 @@ class UserLoginForm(AuthenticationForm):
     password = forms.CharField(widget=forms.PasswordInput(attrs={'placeholder': 'Contraseña', 'class': 'input input-bordered w-full'}))
 
 
+class AsyncUserLoginForm(UserLoginForm):
+    # Solo valida los campos: la contraseña la comprueba la vista async en el pool de hashing
+    def clean(self):
+        return self.cleaned_data
+
+
 class TransferForm(forms.Form):
     recipient_identifier = forms.CharField(
         max_length=100,
@@ -71,9 +78,35 @@ class TransferForm(forms.Form):
             raise forms.ValidationError("El monto debe ser mayor que cero.")
         return amount
 
+class ServiceChoiceField(forms.ChoiceField):
+    """
+    Como un ModelChoiceField de Service, pero pinta y valida contra el
+    catálogo en memoria (catalog.py) en vez de consultar la base de datos.
+    """
+
+    def __init__(self, empty_label="---------", **kwargs):
+        def choices():
+            return [('', empty_label)] + [(service.pk, service.name) for service in catalog.get_services()]
+        super().__init__(choices=choices, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            service = catalog.get_service(int(value))
+        except (TypeError, ValueError):
+            service = None
+        if service is None:
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value})
+        return service
+
+    def validate(self, value):
+        # to_python() ya comprobó que el servicio existe
+        forms.Field.validate(self, value)
+
+
 class ServicePaymentForm(forms.Form):
-    service = forms.ModelChoiceField(
-        queryset=Service.objects.all(),
+    service = ServiceChoiceField(
         label="Selecciona el Servicio",
         empty_label="-- Seleccionar --",
         widget=forms.Select(attrs={'class': 'select select-bordered w-full'})
@@ -0,0 +1,77 @@
+# core_bank/fragments.py
+"""
+Caché de las filas ya renderizadas del dashboard y del historial.
+
+Las filas de un usuario solo cambian cuando se mueve su dinero, y eso sube
+su ``ledger_version`` (ver ledger.py). La clave lleva usuario, versión y
+página, de modo que nunca hay que invalidar: un movimiento cambia la clave
+y las entradas viejas salen solas por TTL o por el límite de tamaño del
+backend. En un acierto no se ejecuta ni la consulta ni el render.
+
+El backend es la caché ``fragments`` de CACHES (FRAGMENT_CACHE_BACKEND:
+memoria local, archivos o Redis). ``stats()`` da aciertos, fallos y el
+tiempo gastado en construir los fragmentos de este proceso.
+"""
+import hashlib
+import threading
+import time
+from collections import namedtuple
+
+from django.core.cache import caches
+
+CACHE_ALIAS = 'fragments'
+
+# ``html`` son las filas; ``count`` y ``next_cursor`` lo que la página necesita además de ellas
+Fragment = namedtuple('Fragment', 'html count next_cursor')
+
+_stats = {'hits': 0, 'misses': 0, 'render_seconds': 0.0}
+_stats_lock = threading.Lock()
+
+
+def fragment_key(user, kind, cursor=None):
+    # date_joined distingue a un usuario nuevo que reusa el pk de uno borrado (base restaurada, tests)
+    page = hashlib.sha1(cursor.encode()).hexdigest()[:16] if cursor else 'first'
+    return f"{kind}:{user.pk}:{user.date_joined.timestamp():.6f}:{user.ledger_version}:{page}"
+
+
+def get_or_render(user, kind, cursor, build):
+    """
+    Devuelve el Fragment de ``kind``/``cursor`` para ``user``, o lo construye
+    con ``build()`` y lo guarda. Si ``build`` lanza (p. ej. InvalidCursor),
+    no se guarda nada.
+    """
+    cache = caches[CACHE_ALIAS]
+    key = fragment_key(user, kind, cursor)
+    fragment = cache.get(key)
+    if fragment is not None:
+        with _stats_lock:
+            _stats['hits'] += 1
+        return fragment
+
+    started = time.perf_counter()
+    fragment = build()
+    elapsed = time.perf_counter() - started
+    cache.set(key, fragment)
+    with _stats_lock:
+        _stats['misses'] += 1
+        _stats['render_seconds'] += elapsed
+    return fragment
+
+
+def stats():
+    """Aciertos, fallos, tasa de aciertos y tiempo de construcción (consulta + render) de este proceso."""
+    with _stats_lock:
+        hits, misses, render_seconds = _stats['hits'], _stats['misses'], _stats['render_seconds']
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / lookups if lookups else 0.0,
+        'render_seconds': render_seconds,
+        'avg_render_ms': render_seconds / misses * 1000 if misses else 0.0,
+    }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.update(hits=0, misses=0, render_seconds=0.0)
@@ -0,0 +1,134 @@
+# core_bank/hashing.py
+"""
+Pool acotado para hashear contraseñas desde las vistas async.
+
+PBKDF2 tarda cientos de milisegundos por contraseña. Si se hace en el hilo
+de la petición (o en el único hilo de sync_to_async), una ráfaga de logins
+a la apertura del mercado deja esperando a todas las demás páginas. Aquí
+el hash corre en un ThreadPoolExecutor propio (hashlib suelta el GIL
+mientras calcula PBKDF2, así que los hilos sí trabajan en paralelo) y:
+
+- Hay a lo sumo PASSWORD_HASHING_WORKERS hashes a la vez y
+  PASSWORD_HASHING_MAX_QUEUE esperando turno.
+- Si la cola está llena, ``run()`` lanza HashingOverloaded al instante y
+  la vista responde 503 en vez de encolar trabajo que llegaría tarde.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model, load_backend, user_login_failed
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.core.exceptions import PermissionDenied
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.views.decorators.debug import sensitive_variables
+
+
+class HashingOverloaded(Exception):
+    """Hay demasiadas contraseñas esperando para hashearse."""
+
+
+_executor = None
+_in_flight = 0  # En ejecución + esperando en la cola del executor
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix='hashing')
+        return _executor
+
+
+def in_flight():
+    return _in_flight
+
+
+def _release(future):
+    global _in_flight
+    with _lock:
+        _in_flight -= 1
+
+
+async def run(func, *args):
+    """Ejecuta ``func(*args)`` en el pool de hashing o lanza HashingOverloaded si está saturado."""
+    global _in_flight
+    executor = _get_executor()
+    with _lock:
+        if _in_flight >= settings.PASSWORD_HASHING_WORKERS + settings.PASSWORD_HASHING_MAX_QUEUE:
+            raise HashingOverloaded()
+        _in_flight += 1
+    try:
+        future = executor.submit(func, *args)
+    except BaseException:
+        _release(None)  # No llegó a encolarse: nadie más va a devolver el cupo
+        raise
+    # El cupo se libera cuando termina el hash, aunque el cliente ya se haya ido
+    future.add_done_callback(_release)
+    return await asyncio.wrap_future(future)
+
+
+def _check(password, encoded):
+    # Devuelve también si el hash hay que actualizarlo (cambiaron las iteraciones o el algoritmo)
+    if not check_password(password, encoded):
+        return False, False
+    return True, identify_hasher(encoded).must_update(encoded)
+
+
+async def _amodel_authenticate(backend, username, password):
+    # ModelBackend.authenticate, con las consultas por el ORM async y la contraseña por el pool
+    user_model = get_user_model()
+    if username is None or password is None:
+        return None
+    user = await user_model._default_manager.filter(**{user_model.USERNAME_FIELD: username}).afirst()
+    if user is None:
+        # Igual que ModelBackend: hashear de todos modos para no revelar qué usuarios existen
+        await run(user_model().set_password, password)
+        return None
+    valid, must_update = await run(_check, password, user.password)
+    if not valid or not backend.user_can_authenticate(user):
+        return None
+    if must_update:
+        user.password = await run(make_password, password)
+        await user.asave(update_fields=['password'])
+    return user
+
+
+@sensitive_variables('password')
+async def aauthenticate(request, username, password):
+    """
+    Como django.contrib.auth.aauthenticate: prueba los AUTHENTICATION_BACKENDS
+    en orden y, si ninguno acepta, envía user_login_failed. Los ModelBackend
+    (y sus subclases) hashean en el pool; el resto usa su propio aauthenticate.
+    Devuelve el usuario o None.
+    """
+    for backend_path in settings.AUTHENTICATION_BACKENDS:
+        backend = load_backend(backend_path)
+        try:
+            if isinstance(backend, ModelBackend):
+                user = await _amodel_authenticate(backend, username, password)
+            else:
+                user = await backend.aauthenticate(request, username=username, password=password)
+        except PermissionDenied:
+            break  # El backend corta aquí: este usuario no puede entrar
+        if user is not None:
+            user.backend = backend_path
+            return user
+    await user_login_failed.asend(
+        sender=__name__, credentials={'username': username, 'password': '********************'}, request=request,
+    )
+    return None
+
+
+@receiver(setting_changed)
+def _reset_executor(setting, **kwargs):
+    global _executor
+    if setting.startswith('PASSWORD_HASHING_'):
+        with _lock:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = None
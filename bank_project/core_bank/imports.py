@@ -0,0 +1,161 @@
+# core_bank/imports.py
+"""
+Alta masiva de clientes desde CSV (convenios con otras instituciones).
+
+CustomUser.save() inserta fila por fila y PBKDF2 tarda cientos de
+milisegundos por contraseña en un solo núcleo. Aquí:
+
+- El CSV se lee en streaming, de a ``batch_size`` filas.
+- Cada fila pasa por los validadores de los campos del modelo (usuario,
+  nombres, correo) y las reglas de AUTH_PASSWORD_VALIDATORS, como en el
+  registro; DNI y usuario se validan además contra conjuntos precargados
+  una sola vez (los que ya existen más los que van apareciendo en el archivo).
+- Las contraseñas se hashean en un ProcessPoolExecutor con un proceso por
+  núcleo; mientras se hashea un lote se inserta el anterior.
+- Cada lote entra con bulk_create y el saldo inicial puesto a mano, porque
+  bulk_create no llama a CustomUser.save().
+"""
+import csv
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import CustomUser, OPENING_BALANCE
+from .writes import serialized_write
+
+COLUMNS = ('username', 'dni', 'first_name', 'last_name', 'email', 'password')
+# Se validan con los validadores del campo del modelo (largo, caracteres, formato del correo)
+VALIDATED_FIELDS = ('username', 'first_name', 'last_name', 'email')
+
+Rejected = namedtuple('Rejected', 'line username reason')
+ImportResult = namedtuple('ImportResult', 'created rejected seconds hash_wait_seconds')
+
+
+def _init_worker():
+    # Con 'spawn' (macOS, Windows) el proceso hijo arranca sin Django configurado
+    django.setup()
+
+
+def _hash_all(passwords):
+    return [make_password(password or None) for password in passwords]
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def read_rows(fh):
+    """Recorre el CSV devolviendo (número de línea, fila) con los campos ya recortados."""
+    reader = csv.DictReader(fh)
+    missing = {'username', 'dni'} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"Al CSV le faltan columnas: {', '.join(sorted(missing))}")
+    for row in reader:
+        yield reader.line_num, {column: (row.get(column) or '').strip() for column in COLUMNS}
+
+
+def _field_problem(row):
+    """El primer error de los validadores del modelo y de contraseña, o None."""
+    try:
+        for name in VALIDATED_FIELDS:
+            CustomUser._meta.get_field(name).clean(row[name], None)
+        if row['password']:
+            user = CustomUser(**{name: row[name] for name in VALIDATED_FIELDS})
+            validate_password(row['password'], user)
+    except ValidationError as e:
+        return e.messages[0]
+    return None
+
+
+def _validate(line, row, dnis, usernames):
+    dni, username = row['dni'], row['username']
+    if not username:
+        return Rejected(line, username, "Falta el nombre de usuario.")
+    if len(dni) != 8 or not dni.isdigit():
+        return Rejected(line, username, "El DNI debe tener 8 dígitos.")
+    problem = _field_problem(row)
+    if problem:
+        return Rejected(line, username, problem)
+    if dni in dnis:
+        return Rejected(line, username, "Este DNI ya está registrado.")
+    if username.lower() in usernames:
+        return Rejected(line, username, "Este nombre de usuario ya existe.")
+    dnis.add(dni)
+    usernames.add(username.lower())
+    return None
+
+
+def _valid_batches(rows, batch_size, rejected):
+    """Agrupa en lotes las filas válidas; las inválidas van a ``rejected``."""
+    dnis = set(CustomUser.objects.values_list('dni', flat=True).iterator(chunk_size=10_000))
+    usernames = {name.lower() for name in CustomUser.objects.values_list('username', flat=True).iterator(chunk_size=10_000)}
+    batch = []
+    for line, row in rows:
+        problem = _validate(line, row, dnis, usernames)
+        if problem:
+            rejected.append(problem)
+            continue
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@serialized_write
+def _insert(rows, hashes):
+    with transaction.atomic():
+        CustomUser.objects.bulk_create([
+            CustomUser(
+                username=row['username'], dni=row['dni'], email=row['email'],
+                first_name=row['first_name'], last_name=row['last_name'],
+                password=password, balance=OPENING_BALANCE,
+            )
+            for row, password in zip(rows, hashes)
+        ])
+
+
+def import_users(fh, batch_size=1000, workers=None):
+    """
+    Importa los clientes del CSV ``fh`` (columnas: username, dni,
+    first_name, last_name, email, password; solo username y dni son
+    obligatorias). Sin contraseña la cuenta queda con una inutilizable y el
+    cliente tendrá que restablecerla. Devuelve un ImportResult.
+    """
+    workers = workers or os.cpu_count() or 1
+    rejected = []
+    created = 0
+    hash_wait = 0.0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        def submit(batch):
+            # Un trozo por proceso: menos viajes entre procesos que de a una contraseña
+            size = -(-len(batch) // workers)
+            return [pool.submit(_hash_all, chunk) for chunk in _chunks([row['password'] for row in batch], size)]
+
+        def collect(futures):
+            nonlocal hash_wait
+            waiting = time.perf_counter()
+            hashes = [password for future in futures for password in future.result()]
+            hash_wait += time.perf_counter() - waiting
+            return hashes
+
+        pending = None
+        for batch in _valid_batches(read_rows(fh), batch_size, rejected):
+            futures = submit(batch)
+            if pending:
+                _insert(pending[0], collect(pending[1]))
+                created += len(pending[0])
+            pending = (batch, futures)
+        if pending:
+            _insert(pending[0], collect(pending[1]))
+            created += len(pending[0])
+    return ImportResult(created, rejected, time.perf_counter() - started, hash_wait)
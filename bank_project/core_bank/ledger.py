@@ -0,0 +1,268 @@
+# core_bank/ledger.py
+"""
+Motor de saldos del banco.
+
+Todos los movimientos de dinero se hacen con UPDATE condicionales de una sola
+sentencia (``balance = balance - X WHERE balance >= X``), de modo que la base
+de datos es quien decide si hay saldo suficiente y no se pierden
+actualizaciones cuando varios workers mueven dinero de la misma cuenta a la vez.
+
+Cada una de esas sentencias también incrementa ``ledger_version`` de la
+cuenta, así la versión cambia en la misma transacción que el saldo y sirve
+de ETag para el saldo y el historial (ver views.py).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from . import events, rollups
+from .writes import serialized_write
+from .models import CustomUser, Transaction, ServicePayment, QueuedTransfer
+
+# Se suma en cada UPDATE que toca un saldo
+NEXT_VERSION = F('ledger_version') + 1
+
+# Número máximo de cuentas acreditadas por sentencia UPDATE ... CASE en los lotes
+CREDIT_CHUNK_SIZE = 500
+
+
+class LedgerError(Exception):
+    """Error base de las operaciones del ledger."""
+
+
+class InsufficientFunds(LedgerError):
+    """La cuenta no tiene saldo suficiente para el débito."""
+
+
+class AccountNotFound(LedgerError):
+    """La cuenta a acreditar no existe."""
+
+
+def debit(user_id, amount):
+    # El WHERE balance >= amount hace la validación de saldo en la misma sentencia
+    updated = CustomUser.objects.filter(pk=user_id, balance__gte=amount).update(
+        balance=F('balance') - amount, ledger_version=NEXT_VERSION,
+    )
+    if not updated:
+        raise InsufficientFunds("Saldo insuficiente.")
+
+
+def credit(user_id, amount):
+    updated = CustomUser.objects.filter(pk=user_id).update(balance=F('balance') + amount, ledger_version=NEXT_VERSION)
+    if not updated:
+        raise AccountNotFound("La cuenta de destino no existe.")
+
+
+def _publish_transfer(tx):
+    # Ambas cuentas reciben el aviso después del commit (ver events.py)
+    events.publish_on_commit(tx.sender_id, events.movement_event(
+        'out', 'transferencia', tx.amount, tx.timestamp, counterparty_id=tx.receiver_id, description=tx.description,
+    ))
+    events.publish_on_commit(tx.receiver_id, events.movement_event(
+        'in', 'transferencia', tx.amount, tx.timestamp, counterparty_id=tx.sender_id, description=tx.description,
+    ))
+
+
+@serialized_write
+def transfer(sender_id, recipient_id, amount, description=None):
+    """
+    Transfiere ``amount`` de ``sender_id`` a ``recipient_id`` y registra la
+    Transaction. Lanza InsufficientFunds si el remitente no tiene saldo.
+    """
+    if sender_id == recipient_id:
+        raise LedgerError("No puedes transferirte a ti mismo.")
+
+    with db_transaction.atomic():
+        # Orden determinista de bloqueo: siempre se actualiza primero la fila con
+        # el id menor, así dos transferencias cruzadas (A->B y B->A) nunca se
+        # esperan mutuamente. Si el débito falla, el atomic revierte el crédito.
+        if sender_id < recipient_id:
+            debit(sender_id, amount)
+            credit(recipient_id, amount)
+        else:
+            credit(recipient_id, amount)
+            debit(sender_id, amount)
+
+        tx = Transaction.objects.create(
+            sender_id=sender_id,
+            receiver_id=recipient_id,
+            amount=amount,
+            transaction_type='transferencia',
+            description=description,
+        )
+        rollups.record(sender_id, 'transferencia', amount, moment=tx.timestamp)
+        _publish_transfer(tx)
+        return tx
+
+
+@serialized_write
+def pay_service(user_id, service, amount, invoice_number=None):
+    """Debita el pago de un servicio y registra el ServicePayment y su Transaction."""
+    with db_transaction.atomic():
+        debit(user_id, amount)
+
+        payment = ServicePayment.objects.create(
+            user_id=user_id,
+            service=service,
+            amount=amount,
+            invoice_number=invoice_number,
+        )
+        Transaction.objects.create(
+            sender_id=user_id,
+            receiver=None,
+            amount=amount,
+            transaction_type='pago_servicio',
+            description=f"Pago de {service.name} (Factura: {invoice_number or 'N/A'})",
+        )
+        rollups.record(user_id, 'pago_servicio', amount, service_id=service.id, moment=payment.timestamp)
+        events.publish_on_commit(user_id, events.movement_event(
+            'out', 'pago_servicio', amount, payment.timestamp, service_id=service.id, description=invoice_number,
+        ))
+        return payment
+
+
+def _credit_many(credits):
+    """Suma a varias cuentas (un importe negativo debita) con un UPDATE ... CASE por bloque de cuentas."""
+    account_ids = sorted(credits)
+    for start in range(0, len(account_ids), CREDIT_CHUNK_SIZE):
+        chunk = account_ids[start:start + CREDIT_CHUNK_SIZE]
+        increment = Case(
+            *[When(pk=account_id, then=Value(credits[account_id])) for account_id in chunk],
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+        updated = CustomUser.objects.filter(pk__in=chunk).update(
+            balance=F('balance') + increment, ledger_version=NEXT_VERSION,
+        )
+        if updated != len(chunk):
+            raise AccountNotFound("Alguna de las cuentas de destino no existe.")
+
+
+@serialized_write
+def batch_transfer(sender_id, transfers):
+    """
+    Aplica un lote de transferencias ``(recipient_id, amount, description)``
+    desde ``sender_id`` en un único bloque atómico: un débito por el total,
+    los créditos agrupados por cuenta y todas las Transaction con bulk_create.
+    Si el total supera el saldo no se aplica ninguna (InsufficientFunds).
+    """
+    if not transfers:
+        return []
+    if any(recipient_id == sender_id for recipient_id, _, _ in transfers):
+        raise LedgerError("No puedes transferirte a ti mismo.")
+
+    credits = defaultdict(lambda: Decimal('0.00'))
+    for recipient_id, amount, _ in transfers:
+        credits[recipient_id] += amount
+    total = sum(credits.values(), Decimal('0.00'))
+
+    with db_transaction.atomic():
+        # Mismo orden de bloqueo que transfer(): ids menores primero
+        _credit_many({pk: amount for pk, amount in credits.items() if pk < sender_id})
+        debit(sender_id, total)
+        _credit_many({pk: amount for pk, amount in credits.items() if pk > sender_id})
+
+        created = Transaction.objects.bulk_create([
+            Transaction(
+                sender_id=sender_id,
+                receiver_id=recipient_id,
+                amount=amount,
+                transaction_type='transferencia',
+                description=description,
+            )
+            for recipient_id, amount, description in transfers
+        ])
+        rollups.record(sender_id, 'transferencia', total, count=len(created), moment=created[0].timestamp)
+        for tx in created:
+            _publish_transfer(tx)
+        return created
+
+
+def enqueue_transfer(sender_id, recipient_id, amount, description=None):
+    """
+    Modo asíncrono: deja la transferencia en la cola (un solo INSERT) y
+    devuelve el QueuedTransfer. El saldo se valida al procesarla.
+    """
+    if sender_id == recipient_id:
+        raise LedgerError("No puedes transferirte a ti mismo.")
+    return QueuedTransfer.objects.create(sender_id=sender_id, receiver_id=recipient_id, amount=amount, description=description)
+
+
+@serialized_write
+def settle_queued_transfers(limit=200):
+    """
+    Aplica hasta ``limit`` transferencias pendientes, por orden de llegada,
+    en una sola transacción (group commit): un commit para todo el lote en
+    vez de uno por transferencia.
+
+    A diferencia de transfer(), el saldo no lo valida un UPDATE condicional
+    por movimiento: se bloquean las cuentas del lote, cada transferencia se
+    valida en orden contra los saldos en memoria (una sin saldo se rechaza
+    sin afectar a las demás) y al final se aplica el neto por cuenta con un
+    UPDATE ... CASE. Así el lote cuesta un puñado de consultas, no tres por
+    transferencia. Devuelve la lista de QueuedTransfer procesados.
+    """
+    with db_transaction.atomic():
+        # skip_locked: con varios workers (en bases que lo soportan) cada uno toma filas distintas.
+        # En SQLite no aplica; ahí el lock de escritura ya deja a un solo worker a la vez.
+        items = list(
+            QueuedTransfer.objects.select_for_update(skip_locked=True)
+            .filter(status=QueuedTransfer.PENDING).order_by('id')[:limit]
+        )
+        if not items:
+            return []
+
+        account_ids = {item.sender_id for item in items} | {item.receiver_id for item in items}
+        # Bloqueo por id ascendente, el mismo orden que usan transfer() y batch_transfer()
+        balances = dict(
+            CustomUser.objects.select_for_update().filter(pk__in=account_ids).order_by('pk').values_list('pk', 'balance')
+        )
+
+        now = timezone.now()
+        deltas = defaultdict(lambda: Decimal('0.00'))
+        sent = defaultdict(lambda: [Decimal('0.00'), 0])
+        applied = []
+        for item in items:
+            item.settled_at = now
+            if item.sender_id not in balances:
+                item.status, item.error = QueuedTransfer.REJECTED, "La cuenta de origen no existe."
+                continue
+            if item.receiver_id not in balances:
+                item.status, item.error = QueuedTransfer.REJECTED, "La cuenta de destino no existe."
+                continue
+            if balances[item.sender_id] < item.amount:
+                item.status, item.error = QueuedTransfer.REJECTED, "Saldo insuficiente para realizar esta transferencia."
+                continue
+            balances[item.sender_id] -= item.amount
+            balances[item.receiver_id] += item.amount
+            deltas[item.sender_id] -= item.amount
+            deltas[item.receiver_id] += item.amount
+            sent[item.sender_id][0] += item.amount
+            sent[item.sender_id][1] += 1
+            item.status = QueuedTransfer.COMPLETED
+            applied.append(item)
+
+        # También las cuentas con neto cero: tienen movimientos nuevos y su ledger_version debe subir
+        _credit_many(deltas)
+        created = Transaction.objects.bulk_create([
+            Transaction(
+                sender_id=item.sender_id,
+                receiver_id=item.receiver_id,
+                amount=item.amount,
+                transaction_type='transferencia',
+                description=item.description,
+            )
+            for item in applied
+        ])
+        for tx in created:
+            _publish_transfer(tx)
+        rollups.record_many('transferencia', sent, moment=now)
+        # Un UPDATE por resultado (bulk_update armaría un CASE por fila y campo)
+        outcomes = defaultdict(list)
+        for item in items:
+            outcomes[item.status, item.error].append(item.pk)
+        for (status, error), pks in outcomes.items():
+            QueuedTransfer.objects.filter(pk__in=pks).update(status=status, error=error, settled_at=now)
+        return items
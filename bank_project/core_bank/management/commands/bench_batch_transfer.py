@@ -0,0 +1,44 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core_bank.batch import run_batch
+from core_bank.bench import isolated_database, create_accounts, Stopwatch
+from core_bank.models import CustomUser, Transaction
+
+
+class Command(BaseCommand):
+    help = "Mide el tiempo de una transferencia por lote (planilla) a N destinatarios."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payees', type=int, default=1000)
+        parser.add_argument('--amount', type=Decimal, default=Decimal('12.34'))
+
+    def handle(self, *args, **options):
+        payees = options['payees']
+        with isolated_database():
+            account_ids = create_accounts(payees + 1, balance=Decimal('1000000.00'))
+            sender = CustomUser.objects.get(pk=account_ids[0])
+            recipients = CustomUser.objects.filter(pk__in=account_ids[1:]).values_list('dni', 'username')
+            # Mitad por DNI y mitad por usuario, para ejercitar las dos consultas IN
+            lines = [
+                {'recipient': dni if n % 2 else username, 'amount': str(options['amount']), 'description': f'Planilla {n}'}
+                for n, (dni, username) in enumerate(recipients)
+            ]
+
+            with CaptureQueriesContext(connection) as ctx, Stopwatch() as clock:
+                report, total = run_batch(sender, lines)
+
+            applied = sum(1 for result in report if result['status'] == 'ok')
+            sender.refresh_from_db()
+            expected = Decimal('1000000.00') - options['amount'] * payees
+            self.stdout.write(
+                f"{applied}/{payees} transferencias (S/{total}) en {clock.elapsed * 1000:.1f} ms "
+                f"con {len(ctx.captured_queries)} consultas"
+            )
+            if sender.balance != expected or Transaction.objects.count() != payees:
+                self.stderr.write(self.style.ERROR(f"Resultado inconsistente: saldo {sender.balance}, esperado {expected}"))
+            else:
+                self.stdout.write(self.style.SUCCESS("Saldos y transacciones correctos"))
@@ -0,0 +1,75 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+
+from core_bank.bench import percentile, Stopwatch
+from core_bank.dni_lookup import DniLookupService, DniLookupError, DniServiceUnavailable
+from core_bank.fakes import FakeDecolectaServer
+from core_bank.resilience import Provider
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la consulta de DNI original (requests.get por petición) con DniLookupService "
+        "contra un servidor Decolecta falso: llamadas a la API y latencia p50/p99."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--dnis', type=int, default=200, help="DNIs distintos consultados.")
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--latency', type=float, default=0.03, help="Latencia simulada de la API (s).")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        dnis = [f"{40000000 + i:08d}" for i in range(options['dnis'])]
+        # Unos pocos DNIs se repiten mucho (el usuario corrigiendo el formulario), el 10% no existe
+        weights = [1 / (rank + 1) for rank in range(len(dnis))]
+        workload = rng.choices(dnis, weights=weights, k=options['requests'])
+        people = {dni: ('NOMBRE', 'PATERNO', 'MATERNO') for dni in dnis[: int(len(dnis) * 0.9)]}
+
+        for label in ('original', 'servicio'):
+            with FakeDecolectaServer(people=people, latency=options['latency']) as fake:
+                lookup = self._naive(fake) if label == 'original' else self._service(fake, options['threads'])
+                latencies = []
+                rejected = []
+
+                def timed(dni):
+                    started = time.perf_counter()
+                    try:
+                        lookup(dni)
+                    except DniServiceUnavailable:
+                        rejected.append(dni)  # No llegó a la API: no es una latencia
+                        return
+                    except DniLookupError:
+                        pass
+                    latencies.append(time.perf_counter() - started)
+
+                with Stopwatch() as clock, ThreadPoolExecutor(options['threads']) as pool:
+                    list(pool.map(timed, workload))
+
+                self.stdout.write(
+                    f"{label:>9}: {fake.calls} llamadas a la API para {len(workload)} consultas, "
+                    f"p50 {percentile(latencies, 50) * 1000:.1f} ms, p99 {percentile(latencies, 99) * 1000:.1f} ms, "
+                    f"{len(workload) / clock.elapsed:.0f} consultas/seg, {len(rejected)} rechazadas por el bulkhead o el circuito"
+                )
+
+    @staticmethod
+    def _naive(fake):
+        # Réplica del comportamiento anterior: sin sesión, sin caché y sin timeout
+        def lookup(dni):
+            response = requests.get(fake.url, headers={'Authorization': f'Bearer {fake.token}'}, params={'numero': dni})
+            if response.status_code == 404:
+                raise DniLookupError('No encontrado')
+            return response.json()
+        return lookup
+
+    @staticmethod
+    def _service(fake, threads):
+        # Bulkhead del tamaño del pool de hilos: se mide la caché y el single-flight, no los rechazos
+        provider = Provider('decolecta', max_concurrent=threads)
+        return DniLookupService(url=fake.url, token=fake.token, pool_size=32, provider=provider).lookup
@@ -0,0 +1,79 @@
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from core_bank import statements
+from core_bank.bench import isolated_database, create_accounts, Stopwatch
+from core_bank.models import Transaction, Service, ServicePayment
+
+INSERT_BATCH = 10000
+
+
+def sampled(rows, total, samples):
+    """Deja pasar las filas y anota la memoria viva al 25, 50, 75 y 100 %."""
+    marks = {total * quarter // 4 for quarter in (1, 2, 3, 4)}
+    for n, row in enumerate(rows, 1):
+        if n in marks:
+            samples.append(tracemalloc.get_traced_memory()[0])
+        yield row
+
+
+class Command(BaseCommand):
+    help = "Mide memoria y filas/s de la exportación del estado de cuenta de una cuenta con N movimientos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--formats', default='csv,xlsx,parquet')
+
+    def seed(self, rows):
+        owner_id, other_id = create_accounts(2, prefix='export')
+        service = Service.objects.create(name='Luz (Luz del Sur)')
+        # Se intercalan lotes de cada tipo para que el merge por fecha tenga trabajo real
+        created = 0
+        while created < rows:
+            size = min(INSERT_BATCH, rows - created)
+            sent, received, paid = size - 2 * (size // 3), size // 3, size // 3
+            Transaction.objects.bulk_create([
+                Transaction(sender_id=owner_id, receiver_id=other_id, amount=Decimal('12.50'),
+                            transaction_type='transferencia', description=f'Pago {created + n}')
+                for n in range(sent)
+            ] + [
+                Transaction(sender_id=other_id, receiver_id=owner_id, amount=Decimal('30.00'),
+                            transaction_type='transferencia', description='Reembolso')
+                for _ in range(received)
+            ], batch_size=1000)
+            ServicePayment.objects.bulk_create([
+                ServicePayment(user_id=owner_id, service=service, amount=Decimal('80.10'), invoice_number=f'F-{created + n}')
+                for n in range(paid)
+            ], batch_size=1000)
+            created += size
+        return owner_id
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with isolated_database():
+            with Stopwatch() as clock:
+                owner_id = self.seed(rows)
+            self.stdout.write(f"{rows} movimientos creados en {clock.elapsed:.1f} s")
+
+            for fmt in options['formats'].split(','):
+                write_chunks = statements.FORMATS[fmt][0]
+
+                # Primera pasada sin tracemalloc (que frena bastante) para medir la velocidad
+                with Stopwatch() as clock:
+                    size = sum(len(chunk) for chunk in statements.export(owner_id, fmt))
+
+                # Segunda pasada: memoria viva en cada cuarto del recorrido, debe quedarse plana
+                samples = []
+                tracemalloc.start()
+                for _ in write_chunks(sampled(statements.statement_rows(owner_id), rows, samples)):
+                    pass
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                curve = ' -> '.join(f"{sample / 2**20:.1f}" for sample in samples)
+                self.stdout.write(
+                    f"{fmt:8} {rows / clock.elapsed:10,.0f} filas/s  {size / 2**20:8.1f} MiB generados  "
+                    f"pico {peak / 2**20:.1f} MiB  memoria viva al 25/50/75/100%: {curve} MiB"
+                )
@@ -0,0 +1,116 @@
+import json
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core_bank import catalog
+from core_bank.bench import isolated_database, seed_bank, percentile, Stopwatch
+from core_bank.models import CustomUser
+
+PASSWORD = 'clave-segura-123'
+FLOWS = ('login', 'dashboard', 'transfer', 'services', 'pay_service', 'history', 'chatbot_balance')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga concurrente sobre los flujos del banco (login, dashboard, transferencia, servicios, historial y "
+        "saldo por chatbot) en una base temporal sembrada. Reporta p50/p95/p99, throughput y consultas por "
+        "petición en JSON para comparar entre commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=8, help="Usuarios virtuales, uno por hilo.")
+        parser.add_argument('--iterations', type=int, default=20, help="Recorridos completos por usuario virtual.")
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--transactions', type=int, default=20_000)
+        parser.add_argument('--payments', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Además de imprimirlo, guarda el JSON en este archivo.")
+
+    def handle(self, *args, **options):
+        users = max(options['users'], options['concurrency'] + 1)
+        with isolated_database(), override_settings(ALLOWED_HOSTS=['*']):
+            with Stopwatch() as seeding:
+                ids = seed_bank(users, options['transactions'], options['payments'], password=PASSWORD, seed=options['seed'])
+            usernames = list(CustomUser.objects.filter(pk__in=ids).order_by('id').values_list('username', flat=True))
+            services = [service.pk for service in catalog.get_services()]
+
+            samples = defaultdict(list)  # flujo -> [(segundos, consultas, ok)]
+            lock = threading.Lock()
+
+            def virtual_user(number):
+                rng = random.Random(options['seed'] + number)
+                client = Client()
+                username = usernames[number]
+                local = defaultdict(list)
+
+                def hit(flow, method, url, data=None):
+                    with CaptureQueriesContext(connection) as ctx:
+                        started = time.perf_counter()
+                        response = getattr(client, method)(url, data)
+                        elapsed = time.perf_counter() - started
+                    local[flow].append((elapsed, len(ctx.captured_queries), response.status_code < 400))
+                    return response
+
+                try:
+                    hit('login', 'post', reverse('core_bank:login'), {'username': username, 'password': PASSWORD})
+                    for _ in range(options['iterations']):
+                        hit('dashboard', 'get', reverse('core_bank:dashboard'))
+                        recipient = rng.choice([name for name in usernames[:50] if name != username])
+                        hit('transfer', 'post', reverse('core_bank:transfer'), {'recipient_identifier': recipient, 'amount': '1.00'})
+                        hit('services', 'get', reverse('core_bank:services'))
+                        hit('pay_service', 'post', reverse('core_bank:services'), {'service': rng.choice(services), 'amount': '1.00'})
+                        hit('history', 'get', reverse('core_bank:history'))
+                        hit('chatbot_balance', 'get', reverse('chatbot:get_response'), {'message': '¿Cuál es mi saldo?'})
+                finally:
+                    connection.close()
+                    with lock:
+                        for flow, values in local.items():
+                            samples[flow].extend(values)
+
+            threads = [threading.Thread(target=virtual_user, args=(n,)) for n in range(options['concurrency'])]
+            with Stopwatch() as clock:
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+        report = {
+            'revision': git_revision(),
+            'config': {key: options[key] for key in ('concurrency', 'iterations', 'transactions', 'payments', 'seed')} | {'users': users},
+            'seconds': {'seed': round(seeding.elapsed, 2), 'run': round(clock.elapsed, 2)},
+            'flows': {flow: self.summary(samples[flow], clock.elapsed) for flow in FLOWS},
+            'total': self.summary([value for flow in FLOWS for value in samples[flow]], clock.elapsed),
+        }
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                fh.write(output + '\n')
+
+    def summary(self, values, elapsed):
+        latencies = [seconds for seconds, _, _ in values]
+        return {
+            'requests': len(values),
+            'errors': sum(1 for _, _, ok in values if not ok),
+            'throughput_rps': round(len(values) / elapsed, 1) if elapsed else 0,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'queries_per_request': round(sum(queries for _, queries, _ in values) / len(values), 2) if values else 0,
+        }
@@ -0,0 +1,75 @@
+import random
+import tempfile
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core_bank import fragments, ledger
+from core_bank.bench import isolated_database, seed_bank, percentile
+from core_bank.models import CustomUser
+
+PAGES = ('core_bank:dashboard', 'core_bank:history')
+
+
+def cache_config(backend, directory):
+    if backend == 'none':
+        return {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    config = dict(settings.FRAGMENT_CACHE_BACKENDS[backend])
+    if backend == 'file':
+        config['LOCATION'] = directory
+    return config
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la caché de fragmentos del dashboard y el historial con cada backend: usuarios al azar abren "
+        "ambas páginas y a veces transfieren antes (lo que cambia su versión del ledger). Reporta tasa de "
+        "aciertos, tiempo de construcción por fallo y latencia de las páginas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--transactions', type=int, default=20_000)
+        parser.add_argument('--payments', type=int, default=5_000)
+        parser.add_argument('--visits', type=int, default=1000)
+        parser.add_argument('--write-ratio', type=float, default=0.1, help="Fracción de visitas con una transferencia antes.")
+        parser.add_argument('--backends', default='none,locmem,file', help="none, locmem, file y/o redis (requiere redis).")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with isolated_database(), override_settings(ALLOWED_HOSTS=['*']):
+            ids = seed_bank(options['users'], options['transactions'], options['payments'], seed=options['seed'],
+                            opening_balance=Decimal('100000.00'))
+            for backend in options['backends'].split(','):
+                with tempfile.TemporaryDirectory() as directory, override_settings(
+                    CACHES={**settings.CACHES, fragments.CACHE_ALIAS: cache_config(backend, directory)},
+                ):
+                    self.stdout.write(f"{backend:7} {self.workload(ids, options)}")
+
+    def workload(self, ids, options):
+        rng = random.Random(options['seed'])
+        clients = {}
+        for user in CustomUser.objects.filter(pk__in=ids):
+            clients[user.pk] = Client()
+            clients[user.pk].force_login(user)
+        fragments.reset_stats()
+
+        latencies = []
+        for _ in range(options['visits']):
+            user_id = rng.choice(ids)
+            if rng.random() < options['write_ratio']:
+                ledger.transfer(user_id, rng.choice([pk for pk in ids if pk != user_id]), Decimal('1.00'))
+            for page in PAGES:
+                started = time.perf_counter()
+                clients[user_id].get(reverse(page))
+                latencies.append(time.perf_counter() - started)
+
+        stats = fragments.stats()
+        return (
+            f"aciertos {stats['hit_rate'] * 100:5.1f}%  construcción por fallo {stats['avg_render_ms']:6.2f} ms  |  "
+            f"página p50 {percentile(latencies, 50) * 1000:6.2f} ms  p95 {percentile(latencies, 95) * 1000:6.2f} ms"
+        )
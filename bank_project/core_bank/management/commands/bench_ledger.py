@@ -0,0 +1,87 @@
+import random
+import threading
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+from django.db.models import Sum
+
+from core_bank import ledger
+from core_bank.bench import isolated_database, create_accounts, Stopwatch
+from core_bank.models import CustomUser, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark multi-hilo del ledger: muchas transferencias concurrentes entre "
+        "unas pocas cuentas calientes. Reporta transferencias/seg y verifica los saldos finales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--transfers', type=int, default=2000, help="Transferencias por hilo.")
+        parser.add_argument('--accounts', type=int, default=4, help="Número de cuentas calientes.")
+        parser.add_argument('--amount', type=Decimal, default=Decimal('1.00'))
+        parser.add_argument('--opening-balance', type=Decimal, default=Decimal('500.00'))
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            account_ids = create_accounts(options['accounts'], balance=options['opening_balance'])
+            counters = defaultdict(int)
+            lock = threading.Lock()
+
+            def worker(worker_no):
+                rng = random.Random(options['seed'] + worker_no)
+                local = defaultdict(int)
+                try:
+                    for _ in range(options['transfers']):
+                        sender_id, recipient_id = rng.sample(account_ids, 2)
+                        try:
+                            ledger.transfer(sender_id, recipient_id, options['amount'])
+                            local['ok'] += 1
+                        except ledger.InsufficientFunds:
+                            local['insufficient'] += 1
+                        except OperationalError:
+                            local['errors'] += 1
+                finally:
+                    connection.close()
+                    with lock:
+                        for key, value in local.items():
+                            counters[key] += value
+
+            threads = [threading.Thread(target=worker, args=(n,)) for n in range(options['threads'])]
+            with Stopwatch() as clock:
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+            self.stdout.write(
+                f"{counters['ok']} transferencias en {clock.elapsed:.2f}s "
+                f"({counters['ok'] / clock.elapsed:.0f} transferencias/seg), "
+                f"{counters['insufficient']} rechazadas por saldo, {counters['errors']} errores de base de datos"
+            )
+            self._check_balances(account_ids, options['opening_balance'])
+
+    def _check_balances(self, account_ids, opening_balance):
+        # Cada saldo final debe coincidir con el saldo inicial más lo recibido menos lo enviado
+        sent = dict(Transaction.objects.values_list('sender_id').annotate(total=Sum('amount')))
+        received = dict(Transaction.objects.values_list('receiver_id').annotate(total=Sum('amount')))
+        balances = dict(CustomUser.objects.filter(pk__in=account_ids).values_list('id', 'balance'))
+
+        mismatches = []
+        for account_id in account_ids:
+            expected = opening_balance + received.get(account_id, 0) - sent.get(account_id, 0)
+            if balances[account_id] != expected or balances[account_id] < 0:
+                mismatches.append((account_id, balances[account_id], expected))
+
+        total = sum(balances.values())
+        expected_total = opening_balance * len(account_ids)
+        if mismatches or total != expected_total:
+            for account_id, actual, expected in mismatches:
+                self.stderr.write(f"Cuenta {account_id}: saldo {actual}, esperado {expected}")
+            self.stderr.write(self.style.ERROR(f"Saldos inconsistentes: total {total}, esperado {expected_total}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Saldos correctos: total {total} en {len(account_ids)} cuentas"))
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from types import ModuleType
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, override_settings
+from django.urls import include, path
+
+from core_bank import views
+from core_bank.bench import isolated_database, create_accounts, percentile
+from core_bank.models import CustomUser
+
+PASSWORD = 'clave-segura-123'
+LOGIN_VIEWS = {
+    # Lo que había antes: bajo ASGI la vista sync corre en el único hilo de sync_to_async
+    'sync': views.user_login_view,
+    'async': views.async_user_login_view,
+}
+
+
+def urlconf(login_view):
+    # La ruta de login va primero y tapa la de core_bank.urls; el resto de URLs no cambia
+    module = ModuleType(f'bench_login_storm_urls_{login_view.__name__}')
+    module.urlpatterns = [
+        path('bank/login/', login_view),
+        path('', include('bank_project.urls')),
+    ]
+    return module
+
+
+class Command(BaseCommand):
+    help = (
+        "Ráfaga de logins mezclada con tráfico al dashboard sobre la aplicación ASGI, con el login sync "
+        "de siempre y con el async que hashea en el pool acotado. Mide logins/s, 503 y latencia del dashboard."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=16, help="Clientes haciendo login sin parar.")
+        parser.add_argument('--readers', type=int, default=4, help="Clientes ya logueados que piden el dashboard.")
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--modes', default='sync,async')
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            create_accounts(options['logins'] + options['readers'], password=PASSWORD)
+            usernames = list(CustomUser.objects.order_by('id').values_list('username', flat=True))
+            for mode in options['modes'].split(','):
+                with override_settings(ROOT_URLCONF=urlconf(LOGIN_VIEWS[mode]), ALLOWED_HOSTS=['*']):
+                    self.stdout.write(f"{mode:6} {asyncio.run(self.storm(usernames, options))}")
+
+    async def storm(self, usernames, options):
+        login_users, reader_users = usernames[:options['logins']], usernames[options['logins']:]
+        stop = asyncio.Event()
+        logins, rejected, login_latencies, dashboard_latencies = [], [], [], []
+
+        async def login_loop(username):
+            while not stop.is_set():
+                started = time.perf_counter()
+                response = await AsyncClient().post('/bank/login/', {'username': username, 'password': PASSWORD})
+                if response.status_code == 302:
+                    logins.append(1)
+                    login_latencies.append(time.perf_counter() - started)
+                else:
+                    rejected.append(response.status_code)
+
+        async def dashboard_loop(username):
+            client = AsyncClient()
+            await client.aforce_login(await CustomUser.objects.aget(username=username))
+            while not stop.is_set():
+                started = time.perf_counter()
+                await client.get('/bank/dashboard/')
+                dashboard_latencies.append(time.perf_counter() - started)
+
+        tasks = [asyncio.create_task(login_loop(u)) for u in login_users]
+        tasks += [asyncio.create_task(dashboard_loop(u)) for u in reader_users]
+        started = time.perf_counter()
+        await asyncio.sleep(options['seconds'])
+        stop.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+        return (
+            f"{len(logins) / elapsed:6.1f} logins/s  p99 {percentile(login_latencies, 99) * 1000:7.0f} ms  "
+            f"503: {rejected.count(503)}  |  dashboard {len(dashboard_latencies) / elapsed:6.1f} req/s  "
+            f"p50 {percentile(dashboard_latencies, 50) * 1000:6.0f} ms  p99 {percentile(dashboard_latencies, 99) * 1000:6.0f} ms"
+        )
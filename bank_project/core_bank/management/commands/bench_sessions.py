@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core_bank.bench import isolated_database, Stopwatch
+
+ENGINES = ('django.contrib.sessions.backends.db', 'core_bank.sessions')
+
+
+def touch_session(request):
+    # Lo mismo que hace AuthenticationMiddleware en cada petición: leer el usuario de la sesión
+    request.session.get('_auth_user_id')
+    return HttpResponse()
+
+
+class Command(BaseCommand):
+    help = "Compara lecturas y escrituras de django_session por petición entre el backend db y core_bank.sessions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=40, help="Peticiones por sesión")
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        total = options['sessions'] * options['requests']
+        with isolated_database():
+            for engine in ENGINES:
+                with override_settings(SESSION_ENGINE=engine):
+                    middleware = SessionMiddleware(touch_session)
+                    store_class = middleware.SessionStore
+                    keys = []
+                    for n in range(options['sessions']):
+                        store = store_class()
+                        store['_auth_user_id'] = str(n)
+                        store.create()
+                        keys.append(store.session_key)
+
+                    with CaptureQueriesContext(connection) as ctx, Stopwatch() as clock:
+                        for _ in range(options['requests']):
+                            for key in keys:
+                                request = factory.get('/dashboard/')
+                                request.COOKIES[settings.SESSION_COOKIE_NAME] = key
+                                middleware(request)
+
+                session_sql = [q['sql'] for q in ctx.captured_queries if 'django_session' in q['sql']]
+                writes = sum(1 for sql in session_sql if sql.startswith(('UPDATE', 'INSERT')))
+                self.stdout.write(
+                    f"{engine:38} {total} peticiones: {writes / total:.3f} escrituras y "
+                    f"{(len(session_sql) - writes) / total:.3f} lecturas de sesión por petición, "
+                    f"{total / clock.elapsed:,.0f} peticiones/s"
+                )
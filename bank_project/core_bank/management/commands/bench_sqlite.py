@@ -0,0 +1,118 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, OperationalError
+from django.test import override_settings
+
+from core_bank import ledger
+from core_bank.bench import isolated_database, create_accounts, percentile, Stopwatch
+from core_bank.models import Transaction
+
+MODES = {
+    # Lo que había antes: sqlite3 por defecto (journal DELETE, BEGIN diferido) y sin serializar
+    'default': ({}, False),
+    'tuned': (settings.SQLITE_PRODUCTION_OPTIONS, True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara SQLite por defecto con el modo producción (WAL, pragmas, BEGIN IMMEDIATE y escrituras "
+        "serializadas) con hilos que transfieren y otros que leen el historial a la vez."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--accounts', type=int, default=20)
+        parser.add_argument('--modes', default='default,tuned')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Este benchmark solo tiene sentido con SQLite.")
+        for mode in options['modes'].split(','):
+            self.run_mode(mode, *MODES[mode], options)
+
+    def run_mode(self, mode, db_options, serialize, options):
+        settings_dict = connection.settings_dict
+        previous = settings_dict.get('OPTIONS', {})
+        settings_dict['OPTIONS'] = dict(db_options)
+        connection.close()  # Las opciones se aplican al abrir la conexión
+        try:
+            with override_settings(SQLITE_SERIALIZE_WRITES=serialize), isolated_database():
+                self.stdout.write(f"{mode:8} {self.workload(options)}")
+        finally:
+            settings_dict['OPTIONS'] = previous
+            connection.close()
+
+    def workload(self, options):
+        account_ids = create_accounts(options['accounts'], balance=Decimal('1000000.00'))
+        stop = threading.Event()
+        counters = defaultdict(int)
+        read_latencies, write_latencies = [], []
+        lock = threading.Lock()
+
+        def writer(worker_no):
+            rng = random.Random(worker_no)
+            local, latencies = defaultdict(int), []
+            try:
+                while not stop.is_set():
+                    sender_id, recipient_id = rng.sample(account_ids, 2)
+                    started = time.perf_counter()
+                    try:
+                        ledger.transfer(sender_id, recipient_id, Decimal('1.00'))
+                        local['writes'] += 1
+                        latencies.append(time.perf_counter() - started)
+                    except OperationalError:
+                        local['write_errors'] += 1
+            finally:
+                connection.close()
+                with lock:
+                    write_latencies.extend(latencies)
+                    for key, value in local.items():
+                        counters[key] += value
+
+        def reader(worker_no):
+            rng = random.Random(1000 + worker_no)
+            local, latencies = defaultdict(int), []
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    try:
+                        list(Transaction.objects.filter(sender_id=rng.choice(account_ids))
+                             .order_by('-timestamp').values_list('id', 'amount')[:25])
+                        local['reads'] += 1
+                        latencies.append(time.perf_counter() - started)
+                    except OperationalError:
+                        local['read_errors'] += 1
+            finally:
+                connection.close()
+                with lock:
+                    read_latencies.extend(latencies)
+                    for key, value in local.items():
+                        counters[key] += value
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(options['writers'])]
+        threads += [threading.Thread(target=reader, args=(n,)) for n in range(options['readers'])]
+        with Stopwatch() as clock:
+            for thread in threads:
+                thread.start()
+            time.sleep(options['seconds'])
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        attempts = counters['writes'] + counters['write_errors']
+        error_rate = counters['write_errors'] / attempts if attempts else 0
+        return (
+            f"{counters['writes'] / clock.elapsed:8.0f} transferencias/s  errores {error_rate:6.2%}  "
+            f"p99 {percentile(write_latencies, 99) * 1000:.1f} ms  |  "
+            f"{counters['reads'] / clock.elapsed:8.0f} lecturas/s  errores {counters['read_errors']}  "
+            f"p99 {percentile(read_latencies, 99) * 1000:.1f} ms"
+        )
@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core_bank import ledger
+from core_bank.bench import isolated_database, create_accounts, percentile, Stopwatch
+from core_bank.models import QueuedTransfer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara transferencias síncronas (un commit cada una) con la cola asíncrona y group commit: "
+        "hilos productores envían transferencias y se mide cuánto tardan todas en quedar aplicadas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transfers', type=int, default=3000)
+        parser.add_argument('--producers', type=int, default=4)
+        parser.add_argument('--accounts', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--synchronous', default='FULL', choices=['OFF', 'NORMAL', 'FULL'],
+                            help="PRAGMA synchronous de SQLite; FULL hace fsync en cada commit.")
+        parser.add_argument('--modes', default='sync,queue')
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        previous = settings_dict.get('OPTIONS', {})
+        if connection.vendor == 'sqlite':
+            options_with_sync = dict(previous)
+            options_with_sync['init_command'] = previous.get('init_command', '') + f"PRAGMA synchronous={options['synchronous']};"
+            settings_dict['OPTIONS'] = options_with_sync
+        connection.close()  # Las opciones se aplican al abrir la conexión
+        try:
+            for mode in options['modes'].split(','):
+                with isolated_database():
+                    self.stdout.write(f"{mode:6} {self.workload(mode, options)}")
+        finally:
+            settings_dict['OPTIONS'] = previous
+            connection.close()
+
+    def workload(self, mode, options):
+        account_ids = create_accounts(options['accounts'], balance=Decimal('1000000.00'))
+        per_producer = options['transfers'] // options['producers']
+        latencies = []
+        lock = threading.Lock()
+
+        def producer(worker_no):
+            rng = random.Random(worker_no)
+            local = []
+            try:
+                for _ in range(per_producer):
+                    sender_id, recipient_id = rng.sample(account_ids, 2)
+                    started = time.perf_counter()
+                    if mode == 'sync':
+                        ledger.transfer(sender_id, recipient_id, Decimal('1.00'))
+                    else:
+                        ledger.enqueue_transfer(sender_id, recipient_id, Decimal('1.00'))
+                    local.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+                with lock:
+                    latencies.extend(local)
+
+        producers_done = threading.Event()
+        batches = []
+
+        def worker():
+            try:
+                while True:
+                    items = ledger.settle_queued_transfers(options['batch_size'])
+                    if items:
+                        batches.append(len(items))
+                    elif producers_done.is_set():
+                        return
+                    else:
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=producer, args=(n,)) for n in range(options['producers'])]
+        drainer = threading.Thread(target=worker) if mode == 'queue' else None
+        with Stopwatch() as clock:
+            for thread in threads:
+                thread.start()
+            if drainer:
+                drainer.start()
+            for thread in threads:
+                thread.join()
+            producers_done.set()
+            if drainer:
+                drainer.join()
+
+        total = per_producer * options['producers']
+        line = (
+            f"{total / clock.elapsed:8.0f} transferencias aplicadas/s  "
+            f"respuesta al cliente p50 {percentile(latencies, 50) * 1000:.1f} ms  p99 {percentile(latencies, 99) * 1000:.1f} ms"
+        )
+        if mode == 'queue':
+            completed = QueuedTransfer.objects.filter(status=QueuedTransfer.COMPLETED).count()
+            line += f"  |  {completed} completadas en {len(batches)} commits (lote medio {completed / max(len(batches), 1):.0f})"
+        return line
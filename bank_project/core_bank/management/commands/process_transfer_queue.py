@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core_bank import ledger
+from core_bank.models import QueuedTransfer
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker del modo asíncrono de transferencias (TRANSFER_QUEUE_ENABLED): aplica las transferencias "
+        "encoladas por lotes, muchas por commit, y deja en cada una su estado final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.TRANSFER_QUEUE_BATCH_SIZE)
+        parser.add_argument('--once', action='store_true', help="Vaciar la cola y terminar en vez de quedarse esperando.")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                # Un worker de larga vida: descartar conexiones rotas o vencidas entre lotes
+                close_old_connections()
+                items = ledger.settle_queued_transfers(options['batch_size'])
+                if items:
+                    rejected = sum(1 for item in items if item.status == QueuedTransfer.REJECTED)
+                    self.stdout.write(f"{len(items)} transferencias procesadas ({rejected} rechazadas)")
+                elif options['once']:
+                    return
+                else:
+                    time.sleep(settings.TRANSFER_QUEUE_POLL_INTERVAL)
+        except KeyboardInterrupt:
+            pass
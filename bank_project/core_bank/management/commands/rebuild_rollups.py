@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core_bank import rollups
+from core_bank.bench import Stopwatch
+
+
+class Command(BaseCommand):
+    help = "Reconstruye desde cero los totales de gasto (SpendingRollup) a partir de Transaction y ServicePayment."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Reconstruir solo este usuario (se puede repetir).")
+
+    def handle(self, *args, **options):
+        with Stopwatch() as clock:
+            created = rollups.rebuild(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f"{created} totales reconstruidos en {clock.elapsed:.2f}s"))
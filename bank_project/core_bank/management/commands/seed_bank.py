@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from core_bank.bench import seed_bank, Stopwatch
+from core_bank.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Puebla la base de datos con N clientes y M transferencias/pagos de servicios usando bulk_create "
+        "(sin pasar por CustomUser.save()). Todos los clientes comparten la misma contraseña."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--transactions', type=int, default=100_000)
+        parser.add_argument('--payments', type=int, default=20_000)
+        parser.add_argument('--password', default='clave-segura-123')
+        parser.add_argument('--prefix', default='cliente')
+        parser.add_argument('--days', type=int, default=90, help="Las fechas se reparten en los últimos N días.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with Stopwatch() as clock:
+            ids = seed_bank(
+                options['users'], options['transactions'], options['payments'], password=options['password'],
+                prefix=options['prefix'], days=options['days'], seed=options['seed'],
+            )
+        first, last = (CustomUser.objects.get(pk=pk).username for pk in (ids[0], ids[-1]))
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(ids)} clientes ({first} ... {last}), {options['transactions']} transferencias y {options['payments']} pagos "
+            f"creados en {clock.elapsed:.1f} s (contraseña: {options['password']!r})"
+        ))
@@ -0,0 +1,38 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from core_bank import settlements
+from core_bank.bench import Stopwatch
+
+
+class Command(BaseCommand):
+    help = (
+        "Liquida los pagos de servicios nuevos desde la última corrida: totales por empresa, un registro "
+        "de liquidación por empresa y, con --output-dir, el archivo CSV de cada una."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', help="Carpeta donde escribir un CSV por empresa.")
+
+    def handle(self, *args, **options):
+        with Stopwatch() as clock:
+            run = settlements.settle()
+        if run is None:
+            self.stdout.write("No hay pagos nuevos para liquidar.")
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Liquidación {run.pk}: {run.count} pagos por S/{run.total} en {clock.elapsed * 1000:.0f} ms "
+            f"(hasta {run.through_timestamp:%Y-%m-%d %H:%M:%S}, pago {run.through_payment_id})"
+        ))
+        for batch in run.batches.all():
+            line = f"  {batch.service.name:30} {batch.count:8} pagos  S/{batch.total:>14}"
+            if options['output_dir']:
+                os.makedirs(options['output_dir'], exist_ok=True)
+                path = os.path.join(options['output_dir'], settlements.settlement_filename(batch))
+                with open(path, 'w', encoding='utf-8', newline='') as fh:
+                    for chunk in settlements.settlement_file(batch):
+                        fh.write(chunk)
+                line += f"  -> {path}"
+            self.stdout.write(line)
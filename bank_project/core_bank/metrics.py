@@ -0,0 +1,275 @@
+# core_bank/metrics.py
+"""
+Métricas de rendimiento del proceso, en el formato de texto de Prometheus.
+
+- ``MetricsMiddleware`` mide cada petición por vista: tiempo total y número
+  y tiempo de consultas a la base. Las consultas se cuentan con un
+  execute_wrapper instalado en cada conexión, que suma en las estadísticas
+  de la petición en curso (un ContextVar, así también cuentan las consultas
+  que una vista async hace con sync_to_async).
+- ``outbound(service)`` mide las llamadas a APIs externas (Decolecta,
+  Cohere): latencia y resultado. La tasa de errores sale de los _count con
+  ``outcome="error"``.
+- ``render()`` arma el texto que sirve /metrics.
+- Perfilado por muestreo: con METRICS_PROFILE_SAMPLE_RATE > 0, esa fracción
+  de las peticiones sync corre bajo cProfile (una a la vez) y, si tarda al
+  menos METRICS_PROFILE_SLOW_SECONDS, el perfil se guarda en
+  METRICS_PROFILE_DIR para abrirlo con ``python -m pstats``.
+
+Los histogramas viven en la memoria del proceso: con varios workers,
+Prometheus tiene que consultar cada uno. En las respuestas en streaming el
+tiempo llega hasta que la vista devuelve la respuesta, no hasta el final
+del envío.
+"""
+import cProfile
+import math
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils import timezone
+
+INF = math.inf
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, INF)
+DB_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, INF)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, INF)
+OUTBOUND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, INF)
+
+
+def _format_value(value):
+    if value == INF:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class Histogram:
+    """Histograma con etiquetas; cada serie guarda los conteos por bucket, la suma y el total."""
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            series[bisect_left(self.buckets, value)] += 1  # Primer bucket con límite >= value
+            series[-2] += value
+            series[-1] += 1
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        with self._lock:
+            snapshot = sorted((labels, list(series)) for labels, series in self._series.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, series in snapshot:
+            pairs = ''.join(f'{name}="{_escape(value)}",' for name, value in zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{pairs}le="{_format_value(bound)}"}} {cumulative}')
+            selector = f"{{{pairs.rstrip(',')}}}" if pairs else ''
+            lines.append(f"{self.name}_sum{selector} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{selector} {series[-1]}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    'bank_http_request_duration_seconds', "Tiempo de respuesta por vista.",
+    ('view', 'method', 'status'), DURATION_BUCKETS,
+)
+REQUEST_DB_QUERIES = Histogram(
+    'bank_http_request_db_queries', "Consultas a la base por petición.", ('view',), QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    'bank_http_request_db_seconds', "Tiempo en la base por petición.", ('view',), DB_SECONDS_BUCKETS,
+)
+OUTBOUND_SECONDS = Histogram(
+    'bank_outbound_request_duration_seconds', "Llamadas a APIs externas por servicio y resultado (ok, error, cancelled).",
+    ('service', 'outcome'), OUTBOUND_BUCKETS,
+)
+HISTOGRAMS = (REQUEST_SECONDS, REQUEST_DB_QUERIES, REQUEST_DB_SECONDS, OUTBOUND_SECONDS)
+
+
+def _families():
+    # Contadores que otros módulos ya llevan; se leen al momento de exportar.
+    # Cada familia: (nombre, tipo, ayuda, [(etiquetas, valor), ...])
+    from . import fragments, hashing, resilience
+
+    cache = fragments.stats()
+    providers = resilience.providers()
+    return [
+        ('bank_fragment_cache_hits_total', 'counter', "Aciertos de la caché de fragmentos.", [((), cache['hits'])]),
+        ('bank_fragment_cache_misses_total', 'counter', "Fallos de la caché de fragmentos.", [((), cache['misses'])]),
+        ('bank_fragment_cache_build_seconds_total', 'counter', "Tiempo construyendo fragmentos en los fallos.", [((), cache['render_seconds'])]),
+        ('bank_password_hashing_in_flight', 'gauge', "Contraseñas hasheándose o en cola.", [((), hashing.in_flight())]),
+        ('bank_outbound_circuit_open', 'gauge', "1 si el circuito del proveedor no está cerrado.", [
+            ((('service', p.name),), int(p.breaker.state != p.breaker.CLOSED)) for p in providers
+        ]),
+        ('bank_outbound_rejected_total', 'counter', "Llamadas rechazadas sin intentarlas, por motivo.", [
+            ((('service', p.name), ('reason', reason)), count) for p in providers for reason, count in sorted(p.rejected.items())
+        ]),
+    ]
+
+
+def render():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for name, kind, documentation, samples in _families():
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+        for labels, value in samples:
+            selector = ','.join(f'{label}="{_escape(label_value)}"' for label, label_value in labels)
+            lines.append(f"{name}{{{selector}}} {_format_value(value)}" if selector else f"{name} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    for histogram in HISTOGRAMS:
+        histogram.reset()
+
+
+@contextmanager
+def outbound(service):
+    """Mide una llamada a ``service``; una excepción cuenta como error."""
+    started = time.perf_counter()
+    outcome = 'cancelled'  # GeneratorExit / CancelledError: el cliente se fue a mitad de un stream
+    try:
+        yield
+    except Exception:
+        outcome = 'error'
+        raise
+    else:
+        outcome = 'ok'
+    finally:
+        OUTBOUND_SECONDS.observe(time.perf_counter() - started, service, outcome)
+
+
+# Estadísticas de la petición en curso: {'queries': int, 'db_seconds': float}
+_request_stats = ContextVar('metrics_request_stats', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats['queries'] += 1
+        stats['db_seconds'] += time.perf_counter() - started
+
+
+def _install(connection):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+@receiver(connection_created)
+def _install_on_new_connection(sender, connection, **kwargs):
+    _install(connection)
+
+
+_profile_lock = threading.Lock()
+
+
+def _start_profiler():
+    rate = settings.METRICS_PROFILE_SAMPLE_RATE
+    if rate <= 0 or random.random() >= rate:
+        return None
+    # cProfile no admite dos perfiles activos a la vez: si otra petición ya se está perfilando, se omite
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _stop_profiler(profiler, view, elapsed):
+    profiler.disable()
+    try:
+        if elapsed >= settings.METRICS_PROFILE_SLOW_SECONDS:
+            os.makedirs(settings.METRICS_PROFILE_DIR, exist_ok=True)
+            slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', view)
+            filename = f"{timezone.now():%Y%m%d-%H%M%S-%f}-{slug}-{elapsed * 1000:.0f}ms.prof"
+            profiler.dump_stats(os.path.join(settings.METRICS_PROFILE_DIR, filename))
+    finally:
+        _profile_lock.release()
+
+
+class MetricsMiddleware:
+    """Va primero en MIDDLEWARE para medir también al resto de middlewares."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self):
+        # Conexiones abiertas antes de importar este módulo (p. ej. la de los tests)
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+        stats = {'queries': 0, 'db_seconds': 0.0}
+        return stats, _request_stats.set(stats), time.perf_counter()
+
+    @staticmethod
+    def _view_name(request):
+        match = request.resolver_match
+        return match.view_name if match is not None else 'unmatched'
+
+    def _finish(self, request, response, stats, elapsed):
+        view = self._view_name(request)
+        REQUEST_SECONDS.observe(elapsed, view, request.method, str(response.status_code))
+        REQUEST_DB_QUERIES.observe(stats['queries'], view)
+        REQUEST_DB_SECONDS.observe(stats['db_seconds'], view)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, started = self._start()
+        profiler = _start_profiler()
+        try:
+            response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            if profiler is not None:
+                _stop_profiler(profiler, self._view_name(request), elapsed)
+            _request_stats.reset(token)
+        self._finish(request, response, stats, elapsed)
+        return response
+
+    async def __acall__(self, request):
+        # Sin perfilado: en el event loop cProfile mezclaría todas las peticiones en curso
+        stats, token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stats.reset(token)
+        self._finish(request, response, stats, elapsed)
+        return response
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_bank', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='servicepayment',
+            index=models.Index(fields=['user', '-timestamp'], name='payment_user_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['sender', '-timestamp'], name='tx_sender_timestamp_idx'),
+        ),
+    ]
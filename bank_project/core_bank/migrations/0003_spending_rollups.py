@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:57
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_bank', '0002_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpendingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Mes')),
+                ('transaction_type', models.CharField(choices=[('transferencia', 'Transferencia'), ('pago_servicio', 'Pago de Servicio')], max_length=20, verbose_name='Tipo de Transacción')),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Cantidad')),
+                ('service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core_bank.service', verbose_name='Servicio')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spending_rollups', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'month', 'transaction_type', 'service'), name='rollup_unique_with_service'), models.UniqueConstraint(condition=models.Q(('service__isnull', True)), fields=('user', 'month', 'transaction_type'), name='rollup_unique_without_service')],
+            },
+        ),
+    ]
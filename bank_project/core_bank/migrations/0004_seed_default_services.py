@@ -0,0 +1,33 @@
+from django.db import migrations
+
+# Catálogo inicial que antes se creaba dentro de services_view en la primera visita
+DEFAULT_SERVICES = [
+    "Agua (SEDAPAL)",
+    "Luz (Luz del Sur)",
+    "Internet (Claro/Movistar)",
+    "Teléfono Fijo",
+    "Gas Natural",
+    "Arriendo",
+    "Tarjeta de Crédito (Visa)",
+    "Tarjeta de Crédito (Mastercard)",
+    "Educación (Colegio/Universidad)",
+    "Salud (Seguro/Clínica)",
+]
+
+
+def seed_services(apps, schema_editor):
+    Service = apps.get_model('core_bank', 'Service')
+    # Las bases que ya pasaron por la vista tienen el catálogo: solo se crean los que falten
+    existing = set(Service.objects.values_list('name', flat=True))
+    Service.objects.bulk_create([Service(name=name) for name in DEFAULT_SERVICES if name not in existing])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_bank', '0003_spending_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_services, migrations.RunPython.noop),
+    ]
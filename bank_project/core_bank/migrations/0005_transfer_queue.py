@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:36
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_bank', '0004_seed_default_services'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedTransfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Referencia')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Monto')),
+                ('description', models.CharField(blank=True, max_length=255, null=True, verbose_name='Descripción')),
+                ('status', models.CharField(choices=[('pendiente', 'Pendiente'), ('completada', 'Completada'), ('rechazada', 'Rechazada')], default='pendiente', max_length=10, verbose_name='Estado')),
+                ('error', models.CharField(blank=True, max_length=255, verbose_name='Motivo del rechazo')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Encolada')),
+                ('settled_at', models.DateTimeField(blank=True, null=True, verbose_name='Procesada')),
+                ('receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Destinatario')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queued_transfers', to=settings.AUTH_USER_MODEL, verbose_name='Remitente')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='queued_transfer_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_bank', '0005_transfer_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlementBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Total')),
+                ('count', models.PositiveIntegerField(verbose_name='Pagos')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SettlementRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de la liquidación')),
+                ('from_timestamp', models.DateTimeField(blank=True, null=True, verbose_name='Desde (excluido)')),
+                ('from_payment_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('through_timestamp', models.DateTimeField(verbose_name='Hasta (incluido)')),
+                ('through_payment_id', models.PositiveBigIntegerField()),
+                ('total', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Total')),
+                ('count', models.PositiveIntegerField(verbose_name='Pagos')),
+            ],
+            options={
+                'ordering': ['-through_timestamp', '-through_payment_id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='servicepayment',
+            index=models.Index(fields=['timestamp', 'id'], name='payment_timestamp_id_idx'),
+        ),
+        migrations.AddField(
+            model_name='settlementbatch',
+            name='service',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='settlements', to='core_bank.service', verbose_name='Servicio'),
+        ),
+        migrations.AddField(
+            model_name='settlementbatch',
+            name='run',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='core_bank.settlementrun', verbose_name='Liquidación'),
+        ),
+        migrations.AddConstraint(
+            model_name='settlementbatch',
+            constraint=models.UniqueConstraint(fields=('run', 'service'), name='settlement_batch_unique_service'),
+        ),
+    ]
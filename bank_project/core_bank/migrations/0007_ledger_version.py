@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_bank', '0006_biller_settlements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='ledger_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Versión del ledger'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_bank', '0007_ledger_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='servicepayment',
+            index=models.Index(fields=['service', 'timestamp', 'id'], name='payment_service_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['timestamp', 'id'], name='tx_timestamp_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['transaction_type', 'timestamp', 'id'], name='tx_type_timestamp_idx'),
+        ),
+    ]
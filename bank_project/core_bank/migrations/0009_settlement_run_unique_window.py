@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:44
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_bank', '0008_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='settlementrun',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('from_payment_id', models.Value(0, output_field=models.PositiveBigIntegerField())), name='settlement_run_unique_start'),
+        ),
+        migrations.AddConstraint(
+            model_name='settlementrun',
+            constraint=models.UniqueConstraint(fields=('through_timestamp', 'through_payment_id'), name='settlement_run_unique_end'),
+        ),
+    ]
@@ -1,14 +1,22 @@
 
 # Create your models here.
+import uuid
+
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
 from decimal import Decimal
 
+# Saldo con el que se abre toda cuenta nueva
+OPENING_BALANCE = Decimal('10000.00')
+
 class CustomUser(AbstractUser):
     # DNI como CharField para manejar ceros iniciales y validaciones de longitud.
     # unique=True asegura que no haya DNIs duplicados.
     dni = models.CharField(max_length=8, unique=True, verbose_name="DNI")
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    # Sube en el mismo UPDATE que cada cambio de saldo (ver ledger.py); da el ETag del saldo y el historial
+    ledger_version = models.PositiveBigIntegerField(default=0, editable=False, verbose_name="Versión del ledger")
 
     # Campos de nombres y apellidos (opcionales, ya que AbstractUser ya tiene first_name y last_name)
     # Sin embargo, los incluimos para ser explícitos con el autocompletado del API
@@ -18,7 +26,7 @@ class CustomUser(AbstractUser):
     def save(self, *args, **kwargs):
         # Asigna un saldo inicial de 10,000.00 a nuevos usuarios
         if not self.pk: # Solo si es un nuevo usuario (no tiene PK aún)
-            self.balance = Decimal('10000.00')
+            self.balance = OPENING_BALANCE
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -44,6 +52,13 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-timestamp'] # Ordena las transacciones por fecha descendente
+        indexes = [
+            # Sirve al historial paginado por cursor (ver pagination.py)
+            models.Index(fields=['sender', '-timestamp'], name='tx_sender_timestamp_idx'),
+            # Listado del admin: orden por fecha, jerarquía de fechas y filtro por tipo
+            models.Index(fields=['timestamp', 'id'], name='tx_timestamp_id_idx'),
+            models.Index(fields=['transaction_type', 'timestamp', 'id'], name='tx_type_timestamp_idx'),
+        ]
 
 class Service(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name="Nombre del Servicio")
@@ -64,4 +79,115 @@ class ServicePayment(models.Model):
         return f"Pago de {self.amount} a {self.service.name} por {self.user.username}"
 
     class Meta:
-        ordering = ['-timestamp']
\ No newline at end of file
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['user', '-timestamp'], name='payment_user_timestamp_idx'),
+            # Rango por la marca de agua de las liquidaciones (ver settlements.py); también el listado del admin
+            models.Index(fields=['timestamp', 'id'], name='payment_timestamp_id_idx'),
+            # Filtro por servicio del admin, ya ordenado por fecha
+            models.Index(fields=['service', 'timestamp', 'id'], name='payment_service_timestamp_idx'),
+        ]
+
+class SpendingRollup(models.Model):
+    """
+    Totales de gasto por usuario, mes, tipo de transacción y servicio. Se
+    actualiza en el mismo bloque atómico que cada movimiento (ver rollups.py)
+    y se puede reconstruir con ``manage.py rebuild_rollups``.
+    """
+    user = models.ForeignKey(CustomUser, related_name='spending_rollups', on_delete=models.CASCADE, verbose_name="Usuario")
+    month = models.DateField(verbose_name="Mes") # Primer día del mes, en hora local
+    transaction_type = models.CharField(max_length=20, choices=Transaction.TRANSACTION_TYPES, verbose_name="Tipo de Transacción")
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Servicio")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name="Total")
+    count = models.PositiveIntegerField(default=0, verbose_name="Cantidad")
+
+    def __str__(self):
+        return f"{self.user_id} {self.month:%Y-%m} {self.transaction_type} {self.service_id or '-'}: {self.total}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month', 'transaction_type', 'service'], name='rollup_unique_with_service'),
+            # En SQL los NULL no chocan entre sí: las filas sin servicio necesitan su propia restricción
+            models.UniqueConstraint(
+                fields=['user', 'month', 'transaction_type'],
+                condition=models.Q(service__isnull=True),
+                name='rollup_unique_without_service',
+            ),
+        ]
+
+class QueuedTransfer(models.Model):
+    """
+    Transferencia encolada en el modo asíncrono (TRANSFER_QUEUE_ENABLED). La
+    aplica ``manage.py process_transfer_queue`` junto con muchas otras en una
+    sola transacción (ver ledger.settle_queued_transfers).
+    """
+    PENDING, COMPLETED, REJECTED = 'pendiente', 'completada', 'rechazada'
+    STATUSES = (
+        (PENDING, 'Pendiente'),
+        (COMPLETED, 'Completada'),
+        (REJECTED, 'Rechazada'),
+    )
+
+    reference = models.UUIDField(default=uuid.uuid4, unique=True, editable=False, verbose_name="Referencia")
+    sender = models.ForeignKey(CustomUser, related_name='queued_transfers', on_delete=models.CASCADE, verbose_name="Remitente")
+    receiver = models.ForeignKey(CustomUser, related_name='+', on_delete=models.CASCADE, verbose_name="Destinatario")
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Monto")
+    description = models.CharField(max_length=255, blank=True, null=True, verbose_name="Descripción")
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING, verbose_name="Estado")
+    error = models.CharField(max_length=255, blank=True, verbose_name="Motivo del rechazo")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Encolada")
+    settled_at = models.DateTimeField(null=True, blank=True, verbose_name="Procesada")
+
+    def __str__(self):
+        return f"{self.reference} {self.amount} ({self.status})"
+
+    class Meta:
+        indexes = [
+            # El worker recorre las pendientes por orden de llegada
+            models.Index(fields=['status', 'id'], name='queued_transfer_status_idx'),
+        ]
+
+class SettlementRun(models.Model):
+    """
+    Una corrida de liquidación a las empresas de servicios. Cubre los pagos
+    posteriores a la marca de la corrida anterior y hasta (timestamp, id)
+    ``through_timestamp``/``through_payment_id`` inclusive (ver settlements.py).
+    """
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de la liquidación")
+    from_timestamp = models.DateTimeField(null=True, blank=True, verbose_name="Desde (excluido)")
+    from_payment_id = models.PositiveBigIntegerField(null=True, blank=True)
+    through_timestamp = models.DateTimeField(verbose_name="Hasta (incluido)")
+    through_payment_id = models.PositiveBigIntegerField()
+    total = models.DecimalField(max_digits=14, decimal_places=2, verbose_name="Total")
+    count = models.PositiveIntegerField(verbose_name="Pagos")
+
+    def __str__(self):
+        return f"Liquidación {self.pk} ({self.count} pagos, {self.total})"
+
+    class Meta:
+        ordering = ['-through_timestamp', '-through_payment_id']
+        constraints = [
+            # Dos corridas que leyeron la misma marca no pueden guardarse las dos: la segunda
+            # liquidaría otra vez los mismos pagos. La primera corrida no tiene inicio (NULL),
+            # y como en SQL los NULL no chocan entre sí, se compara como 0
+            models.UniqueConstraint(
+                Coalesce('from_payment_id', models.Value(0, output_field=models.PositiveBigIntegerField())),
+                name='settlement_run_unique_start',
+            ),
+            models.UniqueConstraint(fields=['through_timestamp', 'through_payment_id'], name='settlement_run_unique_end'),
+        ]
+
+class SettlementBatch(models.Model):
+    """Lo que se le debe a una empresa de servicios en una corrida de liquidación."""
+    run = models.ForeignKey(SettlementRun, related_name='batches', on_delete=models.CASCADE, verbose_name="Liquidación")
+    service = models.ForeignKey(Service, related_name='settlements', on_delete=models.PROTECT, verbose_name="Servicio")
+    total = models.DecimalField(max_digits=14, decimal_places=2, verbose_name="Total")
+    count = models.PositiveIntegerField(verbose_name="Pagos")
+
+    def __str__(self):
+        return f"Liquidación {self.run_id} - {self.service.name}: {self.total}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'service'], name='settlement_batch_unique_service'),
+        ]
@@ -0,0 +1,172 @@
+# core_bank/resilience.py
+"""
+Protección de las llamadas a proveedores externos (Decolecta, Cohere), para
+que un proveedor lento o caído no deje a todos los workers esperándolo.
+
+- Plazo: cada llamada tiene un tiempo máximo. Lo pone cada cliente con sus
+  settings (timeouts de requests/httpx, y un plazo total para el stream del
+  chatbot).
+- Bulkhead: como mucho ``max_concurrent`` hilos esperando a un mismo
+  proveedor. El siguiente falla enseguida en vez de ocupar otro worker.
+- Circuit breaker: tras ``threshold`` fallos seguidos el circuito se abre y
+  las llamadas fallan al instante durante ``reset_timeout`` segundos. Luego
+  deja pasar una sola llamada de prueba, que lo cierra si sale bien.
+
+Solo cuentan como fallo los errores del proveedor: red, plazo vencido, 429
+y 5xx. Un 4xx es culpa de la petición y no abre el circuito.
+
+``get_provider(name)`` devuelve el Provider compartido por el proceso,
+configurado con ``<NAME>_MAX_CONCURRENT``, ``<NAME>_BREAKER_THRESHOLD`` y
+``<NAME>_BREAKER_RESET``. El estado es por proceso: con varios workers,
+cada uno abre su circuito por separado.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class ProviderUnavailable(Exception):
+    """La llamada se rechazó sin intentarla."""
+    reason = None
+    message = None
+
+    def __init__(self, provider):
+        super().__init__(self.message.format(provider=provider))
+        self.provider = provider
+
+
+class CircuitOpen(ProviderUnavailable):
+    reason = 'circuit_open'
+    message = "{provider} no está disponible por fallos recientes; se reintentará en unos segundos."
+
+
+class BulkheadFull(ProviderUnavailable):
+    reason = 'bulkhead_full'
+    message = "Hay demasiadas llamadas en curso a {provider}."
+
+
+def is_provider_failure(exc):
+    """Errores sin código HTTP (red, timeout) o con 429/5xx."""
+    status_code = getattr(exc, 'status_code', None)
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.threshold = threshold  # 0 lo desactiva
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False  # Hay una llamada de prueba en curso
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True si la llamada puede intentarse; con el circuito semiabierto pasa solo una."""
+        with self._lock:
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures, self._trial = self.CLOSED, 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.threshold and (self.state == self.HALF_OPEN or self.failures >= self.threshold):
+                self.state, self.opened_at = self.OPEN, self.clock()
+
+    def release(self):
+        """La llamada no terminó ni bien ni mal (p. ej. el cliente se fue): libera la prueba."""
+        with self._lock:
+            self._trial = False
+
+
+class Provider:
+    def __init__(self, name, max_concurrent=4, threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.breaker = CircuitBreaker(threshold, reset_timeout, clock)
+        self.rejected = {CircuitOpen.reason: 0, BulkheadFull.reason: 0}
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+
+    def _reject(self, error_class):
+        with self._lock:
+            self.rejected[error_class.reason] += 1
+        raise error_class(self.name)
+
+    @contextmanager
+    def call(self, bulkhead=True):
+        """
+        Envuelve una llamada al proveedor: la rechaza con CircuitOpen o
+        BulkheadFull sin intentarla, o la deja pasar y anota el resultado en
+        el circuito. El código async pasa ``bulkhead=False``: espera sin
+        ocupar hilos y limita su concurrencia con su propio semáforo.
+        """
+        if not self.breaker.allow():
+            self._reject(CircuitOpen)
+        if bulkhead and not self._slots.acquire(blocking=False):
+            self.breaker.release()
+            self._reject(BulkheadFull)
+        try:
+            yield
+        except Exception as e:
+            if is_provider_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()  # Respondió: el proveedor está vivo
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            if bulkhead:
+                self._slots.release()
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name):
+    """Provider del proceso para ``name`` ('decolecta', 'cohere'), configurado desde settings."""
+    with _providers_lock:
+        provider = _providers.get(name)
+        if provider is None:
+            prefix = name.upper()
+            provider = _providers[name] = Provider(
+                name,
+                max_concurrent=getattr(settings, f'{prefix}_MAX_CONCURRENT'),
+                threshold=getattr(settings, f'{prefix}_BREAKER_THRESHOLD'),
+                reset_timeout=getattr(settings, f'{prefix}_BREAKER_RESET'),
+            )
+        return provider
+
+
+def providers():
+    with _providers_lock:
+        return list(_providers.values())
+
+
+@receiver(setting_changed)
+def _reset_provider(setting, **kwargs):
+    with _providers_lock:
+        _providers.pop(setting.split('_', 1)[0].lower(), None)
@@ -0,0 +1,115 @@
+# core_bank/rollups.py
+"""
+Mantenimiento incremental de SpendingRollup.
+
+``record()`` se llama desde el ledger dentro del mismo bloque atómico que el
+movimiento, así los totales nunca quedan desfasados de las transacciones.
+``rebuild()`` los recalcula desde cero a partir del historial.
+"""
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Case, Count, DateField, DecimalField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import SpendingRollup, Transaction, ServicePayment
+
+
+def month_of(moment=None):
+    """Primer día del mes de ``moment`` (por defecto ahora), en hora local."""
+    return timezone.localdate(moment or timezone.now()).replace(day=1)
+
+
+def record(user_id, transaction_type, amount, service_id=None, count=1, moment=None):
+    """Suma ``amount`` (y ``count`` movimientos) al total del mes correspondiente."""
+    key = {
+        'user_id': user_id,
+        'month': month_of(moment),
+        'transaction_type': transaction_type,
+        'service_id': service_id,
+    }
+    increment = {'total': F('total') + amount, 'count': F('count') + count}
+    if SpendingRollup.objects.filter(**key).update(**increment):
+        return
+    try:
+        # Savepoint: si otro worker creó la fila a la vez, se reintenta como UPDATE
+        with db_transaction.atomic():
+            SpendingRollup.objects.create(total=amount, count=count, **key)
+    except IntegrityError:
+        SpendingRollup.objects.filter(**key).update(**increment)
+
+
+def record_many(transaction_type, totals, moment=None):
+    """
+    Como record() para muchos usuarios a la vez (sin servicio): ``totals``
+    es ``{user_id: (amount, count)}``. Un UPDATE ... CASE para las filas que
+    ya existen y un bulk_create para las nuevas, en vez de una consulta por usuario.
+    """
+    if not totals:
+        return
+    month = month_of(moment)
+    rows = SpendingRollup.objects.filter(month=month, transaction_type=transaction_type, service__isnull=True)
+    existing = set(rows.filter(user_id__in=totals).values_list('user_id', flat=True))
+    if existing:
+        rows.filter(user_id__in=existing).update(
+            total=F('total') + Case(*[When(user_id=pk, then=Value(totals[pk][0])) for pk in existing],
+                                    output_field=DecimalField(max_digits=14, decimal_places=2)),
+            count=F('count') + Case(*[When(user_id=pk, then=Value(totals[pk][1])) for pk in existing],
+                                    output_field=IntegerField()),
+        )
+    missing = [pk for pk in totals if pk not in existing]
+    if not missing:
+        return
+    try:
+        with db_transaction.atomic():
+            SpendingRollup.objects.bulk_create([
+                SpendingRollup(user_id=pk, month=month, transaction_type=transaction_type,
+                               total=totals[pk][0], count=totals[pk][1])
+                for pk in missing
+            ])
+    except IntegrityError:
+        # Otro worker creó alguna a la vez: fila por fila, que record() ya resuelve ese caso
+        for pk in missing:
+            record(pk, transaction_type, totals[pk][0], count=totals[pk][1], moment=moment)
+
+
+def monthly_totals(user, month=None):
+    """Filas del mes del usuario (una consulta), con el servicio ya cargado."""
+    return SpendingRollup.objects.filter(user=user, month=month or month_of()).select_related('service')
+
+
+def total_between(user, transaction_type, first_month, last_month, service=None):
+    rollups = SpendingRollup.objects.filter(
+        user=user, transaction_type=transaction_type, month__gte=first_month, month__lte=last_month,
+    )
+    if service is not None:
+        rollups = rollups.filter(service=service)
+    return rollups.aggregate(total=Sum('total'))['total'] or 0
+
+
+def rebuild(user_ids=None):
+    """Borra y recalcula los totales (de todos los usuarios o solo de ``user_ids``). Devuelve las filas creadas."""
+    transfers = Transaction.objects.filter(transaction_type='transferencia')
+    payments = ServicePayment.objects.all()
+    existing = SpendingRollup.objects.all()
+    if user_ids is not None:
+        transfers = transfers.filter(sender_id__in=user_ids)
+        payments = payments.filter(user_id__in=user_ids)
+        existing = existing.filter(user_id__in=user_ids)
+
+    month = TruncMonth('timestamp', output_field=DateField())
+    rows = [
+        SpendingRollup(user_id=row['sender_id'], month=row['month'], transaction_type='transferencia',
+                       total=row['total'], count=row['count'])
+        for row in transfers.order_by().annotate(month=month).values('sender_id', 'month')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    ]
+    rows += [
+        SpendingRollup(user_id=row['user_id'], month=row['month'], transaction_type='pago_servicio',
+                       service_id=row['service_id'], total=row['total'], count=row['count'])
+        for row in payments.order_by().annotate(month=month).values('user_id', 'service_id', 'month')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    ]
+    with db_transaction.atomic():
+        existing.delete()
+        SpendingRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,117 @@
+# core_bank/routers.py
+"""
+Réplicas de lectura.
+
+- Las escrituras van siempre a ``default`` (la primaria).
+- Las lecturas van a una réplica de READ_REPLICAS solo dentro de las vistas
+  marcadas con ``@read_from_replica``; el resto del código lee de la primaria.
+- Read-your-writes: si una petición escribió, el navegador recibe una cookie
+  que durante REPLICA_PIN_SECONDS hace que sus lecturas vuelvan a la
+  primaria, así el usuario ve su transferencia aunque la réplica vaya atrasada.
+
+Uso: ``DATABASE_ROUTERS = ['core_bank.routers.PrimaryReplicaRouter']`` y
+``ReplicaPinningMiddleware`` en MIDDLEWARE.
+"""
+import functools
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE_NAME = 'primary_pin'
+
+# Estado de la petición en curso: {'pinned': bool, 'wrote': bool, 'replica': alias o None}.
+# Es un dict mutable para que las escrituras hechas en otro hilo (sync_to_async) se vean aquí.
+_request_state = ContextVar('replica_request_state', default=None)
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def read_alias():
+    """Alias desde el que se leerá ahora mismo: una réplica o la primaria."""
+    replicas = settings.READ_REPLICAS
+    if not replicas or not _replica_reads.get():
+        return DEFAULT_DB_ALIAS
+    state = _request_state.get()
+    if state is None:
+        return random.choice(replicas)
+    if state['pinned'] or state['wrote']:
+        return DEFAULT_DB_ALIAS
+    if state['replica'] is None:
+        # Una sola réplica por petición: dos réplicas con distinto atraso darían una página incoherente
+        state['replica'] = random.choice(replicas)
+    return state['replica']
+
+
+def read_from_replica(view):
+    """Decorador para vistas de solo lectura: sus consultas pueden ir a una réplica."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _replica_reads.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'sessions':
+            # Una sesión recién creada (login) todavía no existe en la réplica
+            return DEFAULT_DB_ALIAS
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primaria y réplicas tienen los mismos datos: cualquier relación entre ellas es válida
+        databases = {DEFAULT_DB_ALIAS, *settings.READ_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaPinningMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self, request):
+        state = {'pinned': PIN_COOKIE_NAME in request.COOKIES, 'wrote': False, 'replica': None}
+        return state, _request_state.set(state)
+
+    def _finish(self, state, response):
+        if state['wrote'] and settings.READ_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE_NAME, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax', secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self._finish(state, response)
+
+    async def __acall__(self, request):
+        state, token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self._finish(state, response)
@@ -0,0 +1,82 @@
+# core_bank/sessions.py
+"""
+Motor de sesiones que no escribe en la base de datos en cada petición.
+
+Con SESSION_SAVE_EVERY_REQUEST el backend de Django hace un UPDATE de
+django_session por cada página vista, solo para correr la expiración. Este
+motor mantiene la expiración deslizante, pero únicamente guarda cuando:
+
+- cambiaron los datos de la sesión (login, mensajes, etc.), o
+- la expiración guardada quedó SESSION_WRITE_THRESHOLD segundos o más por
+  detrás de la que tendría la sesión si se guardara ahora.
+
+Es decir, una sesión activa se escribe como mucho una vez por umbral y puede
+caducar hasta SESSION_WRITE_THRESHOLD segundos antes que con el backend
+estándar. La lectura sigue yendo a la base en cada petición: una caché por
+proceso dejaría viva en los demás workers una sesión ya cerrada, y podría
+volver a guardar una copia vieja encima de datos más nuevos.
+
+Uso: ``SESSION_ENGINE = 'core_bank.sessions'``.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+
+class SessionStore(DBStore):
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._stored_expiry = None  # expire_date de la fila en la base de datos
+        self._pending_expiry = None
+
+    # --- lectura ---------------------------------------------------------
+
+    def _get_session_from_db(self):
+        s = super()._get_session_from_db()
+        if s is not None:
+            self._stored_expiry = s.expire_date
+        return s
+
+    async def _aget_session_from_db(self):
+        s = await super()._aget_session_from_db()
+        if s is not None:
+            self._stored_expiry = s.expire_date
+        return s
+
+    # --- escritura -------------------------------------------------------
+
+    def _write_needed(self):
+        """False si la sesión no cambió y su expiración guardada sigue dentro del umbral."""
+        if self._session_key is None or self.modified or self._stored_expiry is None:
+            return True
+        drift = self.get_expiry_date() - self._stored_expiry
+        return drift >= timedelta(seconds=settings.SESSION_WRITE_THRESHOLD)
+
+    def create_model_instance(self, data):
+        obj = super().create_model_instance(data)
+        self._pending_expiry = obj.expire_date
+        return obj
+
+    async def acreate_model_instance(self, data):
+        obj = await super().acreate_model_instance(data)
+        self._pending_expiry = obj.expire_date
+        return obj
+
+    def save(self, must_create=False):
+        if not must_create:
+            self._get_session()  # Carga la sesión (y su expiración guardada) si nadie la leyó
+            if not self._write_needed():
+                return
+        super().save(must_create)
+        if self._pending_expiry is not None:
+            self._stored_expiry, self._pending_expiry = self._pending_expiry, None
+
+    async def asave(self, must_create=False):
+        if not must_create:
+            await self._aget_session()
+            if not self._write_needed():
+                return
+        await super().asave(must_create)
+        if self._pending_expiry is not None:
+            self._stored_expiry, self._pending_expiry = self._pending_expiry, None
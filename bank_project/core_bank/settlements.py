@@ -0,0 +1,127 @@
+# core_bank/settlements.py
+"""
+Liquidación a las empresas de servicios (SEDAPAL, Luz del Sur, ...).
+
+Cada corrida procesa solo los pagos nuevos: los posteriores a la marca de
+agua ``(timestamp, id)`` de la corrida anterior. El rango se recorre con el
+índice ``payment_timestamp_id_idx``, así el costo depende de los pagos
+nuevos y no del historial completo.
+
+- Los totales por servicio salen de una sola consulta agrupada.
+- Se guarda un SettlementRun con la nueva marca y un SettlementBatch por
+  empresa, en la misma transacción: si algo falla, la marca no avanza.
+- El archivo de cada empresa se genera en streaming a partir del rango de
+  la corrida (ver ``settlement_file``).
+
+Un pago se registra con la hora en que empieza su transacción, pero se ve
+recién cuando hace commit. Para no saltarse uno que todavía no terminó, la
+corrida solo llega hasta ``SETTLEMENT_SAFETY_LAG`` segundos atrás.
+
+Dos corridas a la vez no liquidan dos veces lo mismo: la marca se lee
+bloqueando la última corrida (en SQLite, donde no hay SELECT ... FOR UPDATE,
+ya serializa ``serialized_write``) y la base rechaza una segunda corrida
+con el mismo inicio o el mismo final.
+"""
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import ServicePayment, SettlementRun, SettlementBatch
+from .statements import csv_chunks, STATEMENT_CHUNK_SIZE
+from .writes import serialized_write
+
+FILE_HEADER = ('Fecha', 'Factura', 'DNI del cliente', 'Cliente', 'Pago N°', 'Monto')
+
+SettlementLine = namedtuple('SettlementLine', 'timestamp invoice dni customer payment_id amount')
+
+
+def watermark(lock=False):
+    """
+    (timestamp, id) del último pago ya liquidado, o None si nunca se liquidó.
+    Con ``lock`` (dentro de una transacción) bloquea la última corrida hasta
+    el commit, así otra corrida no puede partir de la misma marca.
+    """
+    runs = SettlementRun.objects.select_for_update() if lock else SettlementRun.objects
+    last = runs.values_list('through_timestamp', 'through_payment_id').first()
+    return tuple(last) if last else None
+
+
+def _after(mark):
+    # (timestamp, id) > mark, escrito de forma que use el índice (timestamp, id)
+    timestamp, payment_id = mark
+    return Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=payment_id)
+
+
+def _up_to(mark):
+    timestamp, payment_id = mark
+    return Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lte=payment_id)
+
+
+def run_payments(run):
+    """Pagos cubiertos por ``run``."""
+    payments = ServicePayment.objects.filter(_up_to((run.through_timestamp, run.through_payment_id)))
+    if run.from_timestamp is not None:
+        payments = payments.filter(_after((run.from_timestamp, run.from_payment_id)))
+    return payments
+
+
+@serialized_write
+def settle(now=None):
+    """
+    Liquida los pagos nuevos. Devuelve el SettlementRun creado (con sus
+    batches ya cargados) o None si no había nada que liquidar.
+    """
+    cutoff = (now or timezone.now()) - timedelta(seconds=settings.SETTLEMENT_SAFETY_LAG)
+    with db_transaction.atomic():
+        previous = watermark(lock=True)
+        pending = ServicePayment.objects.filter(timestamp__lte=cutoff)
+        if previous:
+            pending = pending.filter(_after(previous))
+        # La nueva marca: el último pago del rango (una búsqueda por índice)
+        through = pending.order_by('-timestamp', '-id').values_list('timestamp', 'id').first()
+        if through is None:
+            return None
+
+        totals = list(
+            pending.filter(_up_to(through)).order_by().values('service_id')
+            .annotate(total=Sum('amount'), count=Count('id')).order_by('service_id')
+        )
+        run = SettlementRun.objects.create(
+            from_timestamp=previous[0] if previous else None,
+            from_payment_id=previous[1] if previous else None,
+            through_timestamp=through[0],
+            through_payment_id=through[1],
+            total=sum((row['total'] for row in totals), Decimal('0.00')),
+            count=sum(row['count'] for row in totals),
+        )
+        SettlementBatch.objects.bulk_create([
+            SettlementBatch(run=run, service_id=row['service_id'], total=row['total'], count=row['count'])
+            for row in totals
+        ])
+        return SettlementRun.objects.prefetch_related('batches__service').get(pk=run.pk)
+
+
+def settlement_lines(batch, chunk_size=STATEMENT_CHUNK_SIZE):
+    """Los pagos de una empresa en la corrida del ``batch``, en orden y sin cargarlos todos en memoria."""
+    rows = (
+        run_payments(batch.run).filter(service_id=batch.service_id).order_by('timestamp', 'id')
+        .values_list('timestamp', 'invoice_number', 'user__dni', 'user__first_name', 'user__last_name', 'id', 'amount')
+        .iterator(chunk_size=chunk_size)
+    )
+    for timestamp, invoice, dni, first_name, last_name, payment_id, amount in rows:
+        yield SettlementLine(timestamp, invoice or '', dni, f"{first_name} {last_name}".strip(), payment_id, amount)
+
+
+def settlement_file(batch, chunk_size=STATEMENT_CHUNK_SIZE):
+    """CSV de liquidación de una empresa, por bloques."""
+    return csv_chunks(settlement_lines(batch, chunk_size), chunk_size, header=FILE_HEADER)
+
+
+def settlement_filename(batch):
+    slug = ''.join(ch if ch.isalnum() else '_' for ch in batch.service.name).strip('_').lower()
+    return f"liquidacion_{batch.run_id}_{slug}.csv"
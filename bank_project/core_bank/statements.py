@@ -0,0 +1,205 @@
+# core_bank/statements.py
+"""
+Estados de cuenta completos en CSV, XLSX o Parquet, con memoria constante.
+
+Las transferencias enviadas, las recibidas y los pagos de servicios se leen
+con ``values_list().iterator(chunk_size=...)`` (sin instanciar modelos ni
+cargar el historial completo) y se intercalan por fecha con ``heapq.merge``.
+Cada formato consume esas filas de a bloques y va entregando bytes a un
+StreamingHttpResponse. Bajo ASGI los bloques se entregan con
+``async_chunks``: Django consume entero un iterador síncrono antes de
+enviarlo.
+"""
+import csv
+import heapq
+import io
+import tempfile
+from collections import namedtuple
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from .models import Transaction, ServicePayment
+
+# Filas leídas de la base de datos por viaje, y filas por bloque escrito
+STATEMENT_CHUNK_SIZE = 2000
+# Tamaño de los bloques en que se envía un archivo ya generado
+FILE_CHUNK_BYTES = 64 * 1024
+# Filas de datos por hoja de Excel (el límite es 1.048.576, contando la cabecera)
+XLSX_MAX_ROWS = 1_000_000
+
+HEADER = ('Fecha', 'Tipo', 'Detalle', 'Contraparte', 'Referencia', 'Monto')
+
+StatementRow = namedtuple('StatementRow', 'timestamp kind detail counterparty reference amount')
+
+
+def _period(queryset, start=None, end=None, using=None):
+    if using is not None:
+        queryset = queryset.using(using)
+    if start is not None:
+        queryset = queryset.filter(timestamp__date__gte=start)
+    if end is not None:
+        queryset = queryset.filter(timestamp__date__lte=end)
+    return queryset.order_by('timestamp', 'id')
+
+
+def statement_rows(user_id, start=None, end=None, chunk_size=STATEMENT_CHUNK_SIZE, using=None):
+    """
+    Genera las StatementRow de la cuenta en orden cronológico. Los cargos
+    tienen monto negativo y los abonos positivo. Los pagos de servicios salen
+    de ServicePayment (su Transaction 'pago_servicio' se omite para no
+    duplicarlos). ``using`` fija la base de datos de lectura.
+    """
+    sent = _period(Transaction.objects.filter(sender_id=user_id, transaction_type='transferencia'), start, end, using)
+    received = _period(Transaction.objects.filter(receiver_id=user_id), start, end, using)
+    payments = _period(ServicePayment.objects.filter(user_id=user_id), start, end, using)
+
+    sent_rows = (
+        StatementRow(ts, 'Transferencia enviada', description or '', username or '', '', -amount)
+        for ts, amount, description, username in sent.values_list(
+            'timestamp', 'amount', 'description', 'receiver__username',
+        ).iterator(chunk_size=chunk_size)
+    )
+    received_rows = (
+        StatementRow(ts, 'Transferencia recibida', description or '', username, '', amount)
+        for ts, amount, description, username in received.values_list(
+            'timestamp', 'amount', 'description', 'sender__username',
+        ).iterator(chunk_size=chunk_size)
+    )
+    payment_rows = (
+        StatementRow(ts, 'Pago de servicio', service_name, '', invoice_number or '', -amount)
+        for ts, amount, service_name, invoice_number in payments.values_list(
+            'timestamp', 'amount', 'service__name', 'invoice_number',
+        ).iterator(chunk_size=chunk_size)
+    )
+    return heapq.merge(sent_rows, received_rows, payment_rows, key=lambda row: row.timestamp)
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def csv_chunks(rows, chunk_size=STATEMENT_CHUNK_SIZE, header=HEADER):
+    # Sirve para cualquier namedtuple cuyo primer campo sea la fecha (también las liquidaciones)
+    tz = timezone.get_current_timezone()  # Una vez, no por fila: localtime() la busca cada vez
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')  # BOM: Excel abre el CSV como UTF-8 y respeta las tildes
+    writer.writerow(header)
+    for chunk in _chunks(rows, chunk_size):
+        writer.writerows(
+            (f"{row.timestamp.astimezone(tz):%Y-%m-%d %H:%M:%S}", *row[1:]) for row in chunk
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def xlsx_chunks(rows, chunk_size=STATEMENT_CHUNK_SIZE):
+    """
+    openpyxl en modo write-only vuelca cada fila a disco al agregarla. El
+    formato .xlsx es un zip que no se puede emitir a medias, así que el libro
+    se guarda en un archivo temporal y luego se envía por bloques.
+    """
+    from openpyxl import Workbook
+
+    tz = timezone.get_current_timezone()
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows = None, XLSX_MAX_ROWS
+    for row in rows:
+        if sheet_rows == XLSX_MAX_ROWS:
+            title = 'Estado de cuenta' if sheet is None else f'Estado de cuenta {len(workbook.worksheets) + 1}'
+            sheet, sheet_rows = workbook.create_sheet(title), 0
+            sheet.append(HEADER)
+        sheet.append((row.timestamp.astimezone(tz).replace(tzinfo=None), *row[1:]))
+        sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet('Estado de cuenta').append(HEADER)
+
+    with tempfile.TemporaryFile() as tmp:
+        workbook.save(tmp)
+        tmp.seek(0)
+        while data := tmp.read(FILE_CHUNK_BYTES):
+            yield data
+
+
+class _StreamSink(io.RawIOBase):
+    """Archivo de solo escritura que acumula bytes hasta que se vacía con drain()."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        # ParquetWriter usa la posición absoluta para los offsets del footer
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def parquet_chunks(rows, chunk_size=STATEMENT_CHUNK_SIZE):
+    """Un row group de Parquet por bloque de filas, enviado en cuanto se escribe."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('fecha', pa.timestamp('us', tz=timezone.get_current_timezone_name())),
+        ('tipo', pa.string()),
+        ('detalle', pa.string()),
+        ('contraparte', pa.string()),
+        ('referencia', pa.string()),
+        ('monto', pa.decimal128(12, 2)),
+    ])
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for chunk in _chunks(rows, chunk_size):
+        columns = [pa.array(column, type=field.type) for column, field in zip(zip(*chunk), schema)]
+        writer.write_batch(pa.record_batch(columns, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+# formato -> (generador de bloques, content type, extensión)
+FORMATS = {
+    'csv': (csv_chunks, 'text/csv; charset=utf-8', 'csv'),
+    'xlsx': (xlsx_chunks, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': (parquet_chunks, 'application/vnd.apache.parquet', 'parquet'),
+}
+
+
+async def async_chunks(chunks):
+    """
+    Entrega los bloques de un generador síncrono de a uno, cada uno generado
+    en el hilo de sync_to_async. Es siempre el mismo hilo, así que el cursor
+    de la base sigue abierto entre bloques. Si el cliente se va, el generador
+    se cierra y libera los cursores.
+    """
+    next_chunk = sync_to_async(next)
+    done = object()
+    try:
+        while (chunk := await next_chunk(chunks, done)) is not done:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
+
+
+def export(user_id, fmt, start=None, end=None, chunk_size=STATEMENT_CHUNK_SIZE, using=None):
+    """Generador de bytes/texto del estado de cuenta en el formato ``fmt``."""
+    write_chunks = FORMATS[fmt][0]
+    return write_chunks(statement_rows(user_id, start, end, chunk_size, using), chunk_size)
@@ -0,0 +1,29 @@
+# core_bank/testing.py
+"""
+Runner de tests del proyecto (TEST_RUNNER).
+
+Agrega la base ``replica1`` que usan los tests del router de réplicas
+(ReplicaRouterTests). Es una base independiente de la primaria, así se
+puede comprobar de qué base lee cada vista. Solo existe mientras corren
+los tests; si DATABASE_REPLICAS ya define una ``replica1``, se usa esa.
+"""
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+TEST_REPLICA = 'replica1'
+
+
+def add_test_replica():
+    if TEST_REPLICA in settings.DATABASES:
+        return
+    replica = {**settings.DATABASES['default'], 'NAME': settings.BASE_DIR / f'{TEST_REPLICA}.sqlite3', 'TEST': {}}
+    # Con los valores por defecto que Django agrega a cada base; connections lee este mismo diccionario
+    settings.DATABASES[TEST_REPLICA] = connections.configure_settings({'default': {}, TEST_REPLICA: replica})[TEST_REPLICA]
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        # Antes de importar los tests: ReplicaRouterTests se omite si la base no existe
+        add_test_replica()
+        super().setup_test_environment(**kwargs)
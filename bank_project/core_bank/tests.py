@@ -1,3 +1,1402 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import os
+import pstats
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+from unittest import skipUnless
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, OperationalError, connection, transaction as db_transaction
+from django.contrib.auth import user_login_failed
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.models import Session
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import catalog, events, fragments, hashing, ledger, metrics, rollups, sessions, settlements, statements, views
+from .routers import PIN_COOKIE_NAME
+from .dni_lookup import DniLookupService, DniLookupError, DniNotFound, DniServiceUnavailable
+from .fakes import FakeDecolectaServer
+from .resilience import CircuitBreaker, Provider
+from .ttlcache import TTLCache
+from .writes import serialized_write
+from .bench import seed_bank
+from .imports import import_users
+from .pagination import keyset_page, encode_cursor, decode_cursor, InvalidCursor, EstimatedCountPaginator
+from .models import CustomUser, Transaction, Service, ServicePayment, SpendingRollup, QueuedTransfer, SettlementRun
+
+
+class RecordingBroker:
+    """Broker de prueba: guarda lo publicado (ver EVENTS_BROKER)."""
+    def __init__(self):
+        self.published = []
+
+    def publish(self, user_id, event):
+        self.published.append((user_id, event))
+
+
+class FakeRedis:
+    """Pub/sub de Redis en memoria para RedisBroker; hace de cliente sync y async a la vez."""
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+
+    def publish(self, channel, data):
+        for pubsub in list(self.subscribers[channel]):
+            pubsub.loop.call_soon_threadsafe(pubsub.messages.put_nowait, {'type': 'message', 'channel': channel, 'data': data})
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+    async def aclose(self):
+        pass
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.loop = asyncio.get_running_loop()
+        self.messages = asyncio.Queue()
+        self.channels = []
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+        self.redis.subscribers[channel].add(self)
+
+    async def get_message(self, timeout=None):
+        return await self.messages.get()
+
+    async def aclose(self):
+        for channel in self.channels:
+            self.redis.subscribers[channel].discard(self)
+
+
+def make_user(username, dni, **extra):
+    # CustomUser.save() asigna el saldo inicial de 10,000.00
+    return CustomUser.objects.create_user(username=username, dni=dni, password='clave-segura-123', **extra)
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice', '11111111', first_name='Alice')
+        self.bob = make_user('bob', '22222222', first_name='Bob')
+
+    def test_transfer_moves_money_and_records_transaction(self):
+        ledger.transfer(self.alice.id, self.bob.id, Decimal('250.50'), 'Cena')
+
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual(self.alice.balance, Decimal('9749.50'))
+        self.assertEqual(self.bob.balance, Decimal('10250.50'))
+        tx = Transaction.objects.get()
+        self.assertEqual((tx.sender_id, tx.receiver_id, tx.amount), (self.alice.id, self.bob.id, Decimal('250.50')))
+
+    def test_transfer_in_both_directions(self):
+        # Los dos órdenes de bloqueo (remitente con id menor y mayor)
+        ledger.transfer(self.alice.id, self.bob.id, Decimal('100.00'))
+        ledger.transfer(self.bob.id, self.alice.id, Decimal('40.00'))
+
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual(self.alice.balance, Decimal('9940.00'))
+        self.assertEqual(self.bob.balance, Decimal('10060.00'))
+
+    def test_insufficient_funds_leaves_both_balances_untouched(self):
+        for sender, recipient in ((self.alice, self.bob), (self.bob, self.alice)):
+            with self.assertRaises(ledger.InsufficientFunds):
+                ledger.transfer(sender.id, recipient.id, Decimal('10000.01'))
+
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual(self.alice.balance, Decimal('10000.00'))
+        self.assertEqual(self.bob.balance, Decimal('10000.00'))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_transfer_to_self_is_rejected(self):
+        with self.assertRaises(ledger.LedgerError):
+            ledger.transfer(self.alice.id, self.alice.id, Decimal('1.00'))
+
+    def test_pay_service(self):
+        service = Service.objects.create(name="Servicio de prueba")
+        ledger.pay_service(self.alice.id, service, Decimal('80.00'), '123')
+
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.balance, Decimal('9920.00'))
+        self.assertEqual(ServicePayment.objects.get().service, service)
+        self.assertEqual(Transaction.objects.get().transaction_type, 'pago_servicio')
+
+
+class TransferViewTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice', '11111111')
+        self.bob = make_user('bob', '22222222')
+        self.client.force_login(self.alice)
+
+    def test_transfer_by_dni(self):
+        response = self.client.post(reverse('core_bank:transfer'), {
+            'recipient_identifier': '22222222', 'amount': '10.00', 'description': 'Prueba',
+        })
+
+        self.assertRedirects(response, reverse('core_bank:dashboard'))
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.balance, Decimal('10010.00'))
+
+    def test_transfer_does_not_touch_other_columns(self):
+        password = self.alice.password
+        self.client.post(reverse('core_bank:transfer'), {'recipient_identifier': 'bob', 'amount': '10.00'})
+
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.password, password)
+        self.assertEqual(self.alice.balance, Decimal('9990.00'))
+
+    def test_insufficient_funds_shows_error(self):
+        response = self.client.post(reverse('core_bank:transfer'), {'recipient_identifier': 'bob', 'amount': '20000.00'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Saldo insuficiente")
+        self.assertFalse(Transaction.objects.exists())
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice', '11111111')
+        self.bob = make_user('bob', '22222222')
+        Transaction.objects.bulk_create([
+            Transaction(sender=self.alice, receiver=self.bob, amount=Decimal(i + 1), transaction_type='transferencia')
+            for i in range(30)
+        ])
+        # Timestamps repetidos: el id debe desempatar sin saltar ni repetir filas
+        Transaction.objects.filter(amount__lte=10).update(timestamp=timezone.now())
+
+    def test_walks_every_row_once_in_order(self):
+        queryset = Transaction.objects.filter(sender=self.alice)
+        seen, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(queryset, cursor, page_size=7)
+            seen.extend(rows)
+            if cursor is None:
+                break
+
+        expected = list(queryset.order_by('-timestamp', '-id').values_list('id', flat=True))
+        self.assertEqual([t.id for t in seen], expected)
+
+    def test_cursor_round_trip_and_invalid_cursor(self):
+        now = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(now, 42)), (now, 42))
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('no-es-un-cursor')
+
+    def test_history_page_api(self):
+        self.client.force_login(self.alice)
+        url = reverse('core_bank:history_page_api')
+
+        first = self.client.get(url, {'kind': 'transactions'}).json()
+        self.assertEqual(first['count'], 25)
+        second = self.client.get(url, {'kind': 'transactions', 'cursor': first['next_cursor']}).json()
+        self.assertEqual(second['count'], 5)
+        self.assertIsNone(second['next_cursor'])
+
+        self.assertEqual(self.client.get(url, {'kind': 'transactions', 'cursor': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'kind': 'otro'}).status_code, 400)
+
+    def test_history_view_renders_first_page_only(self):
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('core_bank:history'))
+
+        # Las filas llegan ya renderizadas desde la caché de fragmentos
+        self.assertEqual(response.content.decode().count('Completado'), 25)
+        self.assertContains(response, 'Ver más transacciones')
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Presupuesto fijo de consultas por página. Si una vista vuelve a consultar
+    por fila (N+1), el número de consultas crece con los datos y el test falla.
+    """
+    # 2 consultas base por petición autenticada: leer la sesión y cargar el
+    # usuario. La sesión no se reescribe en cada petición (ver sessions.py).
+    BUDGETS = {
+        'core_bank:dashboard': 5,
+        'core_bank:history': 4,
+        'core_bank:history_page_api': 3,
+        'core_bank:transfer': 2,
+        'core_bank:services': 2,
+        'core_bank:get_user_balance_api': 2,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('alice', '11111111')
+        recipients = [make_user(f'cliente{i}', f'3000000{i}', first_name=f'Cliente {i}') for i in range(5)]
+        services = [Service.objects.create(name=f'Servicio {i}') for i in range(5)]
+        Transaction.objects.bulk_create([
+            Transaction(sender=cls.user, receiver=recipients[i % 5], amount=Decimal('10.00'),
+                        transaction_type='transferencia', description=f'Pago {i}')
+            for i in range(40)
+        ])
+        ServicePayment.objects.bulk_create([
+            ServicePayment(user=cls.user, service=services[i % 5], amount=Decimal('25.00'), invoice_number=str(i))
+            for i in range(40)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        catalog.get_services()  # Estado estable: catálogo de servicios ya en memoria
+
+    def test_pages_stay_within_query_budget(self):
+        for url_name, budget in self.BUDGETS.items():
+            with self.subTest(url_name=url_name):
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(reverse(url_name))
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(
+                    len(ctx.captured_queries), budget,
+                    f"{url_name} hizo {len(ctx.captured_queries)} consultas (presupuesto {budget}):\n"
+                    + "\n".join(q['sql'] for q in ctx.captured_queries),
+                )
+
+
+class ConditionalGetTests(TestCase):
+    """ETag por ledger_version: sin movimientos nuevos, 304 con solo leer la sesión y el usuario."""
+    PAGES = ['core_bank:dashboard', 'core_bank:history', 'core_bank:history_page_api', 'core_bank:get_user_balance_api']
+
+    def setUp(self):
+        self.alice = make_user('alice', '11111111')
+        self.bob = make_user('bob', '22222222')
+        self.client.force_login(self.alice)
+
+    def test_unchanged_pages_answer_304_without_history_queries(self):
+        for url_name in self.PAGES:
+            with self.subTest(url_name=url_name):
+                first = self.client.get(reverse(url_name))
+                self.assertEqual(first['Cache-Control'], 'private, no-cache')
+                with self.assertNumQueries(2):  # Solo leer la sesión y cargar el usuario
+                    again = self.client.get(reverse(url_name), HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(again.status_code, 304)
+
+    def test_every_balance_change_moves_the_etag(self):
+        url = reverse('core_bank:get_user_balance_api')
+        etag = self.client.get(url)['ETag']
+        ledger.transfer(self.bob.id, self.alice.id, Decimal('5.00'))  # Recibir también cuenta
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'balance': '10005.00'})
+
+        etag = response['ETag']
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.transfer(self.alice.id, self.bob.id, Decimal('99999.00'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        ledger.batch_transfer(self.alice.id, [(self.bob.id, Decimal('1.00'), None)])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_pending_messages_skip_the_etag(self):
+        response = self.client.post(reverse('core_bank:transfer'), {
+            'recipient_identifier': 'bob', 'amount': '10.00', 'description': '',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('ETag', self.client.get(reverse('core_bank:get_user_balance_api')))  # La API no muestra mensajes
+        self.assertNotIn('ETag', self.client.get(reverse('core_bank:dashboard')))  # Muestra el mensaje de éxito
+        self.assertIn('ETag', self.client.get(reverse('core_bank:dashboard')))
+
+
+class FragmentCacheTests(TestCase):
+    """Filas del dashboard y el historial desde la caché, con la versión del ledger en la clave."""
+    def setUp(self):
+        self.alice = make_user('alice', '11111111')
+        self.bob = make_user('bob', '22222222', first_name='Bob')
+        ledger.transfer(self.alice.id, self.bob.id, Decimal('10.00'), 'Primera')
+        self.client.force_login(self.alice)
+        fragments.reset_stats()
+
+    def test_warm_pages_skip_history_queries(self):
+        # En frío: sesión y usuario + 2 consultas de actividad reciente + resumen del mes; luego sin las 2 de actividad
+        for url_name, cold, warm in [('core_bank:dashboard', 5, 3), ('core_bank:history', 4, 2)]:
+            with self.subTest(url_name=url_name):
+                with self.assertNumQueries(cold):
+                    first = self.client.get(reverse(url_name))
+                with self.assertNumQueries(warm):
+                    second = self.client.get(reverse(url_name))
+                self.assertEqual(first.content, second.content)
+                self.assertContains(second, 'Bob')
+        self.assertEqual(fragments.stats()['hits'], 3)
+        self.assertEqual(fragments.stats()['misses'], 3)
+
+    def test_a_new_movement_changes_the_key(self):
+        url = reverse('core_bank:history_page_api')
+        self.assertEqual(self.client.get(url).json()['count'], 1)
+        ledger.transfer(self.alice.id, self.bob.id, Decimal('7.00'), 'Segunda')
+        page = self.client.get(url).json()
+        self.assertEqual(page['count'], 2)
+        self.assertIn('Segunda', page['html'])
+        self.assertEqual(fragments.stats()['hit_rate'], 0.0)
+
+    def test_invalid_cursor_is_not_cached(self):
+        response = self.client.get(reverse('core_bank:history_page_api'), {'cursor': 'basura'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(fragments.stats()['misses'], 0)
+
+    def test_file_backend(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(CACHES={
+            'fragments': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory},
+        }):
+            first = self.client.get(reverse('core_bank:history'))
+            self.assertEqual(len(os.listdir(directory)), 2)  # Transacciones y pagos
+            self.assertEqual(self.client.get(reverse('core_bank:history')).content, first.content)
+        self.assertEqual(fragments.stats()['hits'], 2)
+
+
+class AdminChangelistTests(TestCase):
+    """Listados del admin para tablas grandes: consultas fijas por página y exportación en streaming."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = make_user('admin', '99999999', is_staff=True, is_superuser=True)
+        cls.alice = make_user('alice', '11111111')
+        cls.bob = make_user('bob', '22222222')
+        cls.service = Service.objects.create(name='Agua Prueba')
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def add_rows(self, count):
+        Transaction.objects.bulk_create([
+            Transaction(sender=self.alice, receiver=self.bob, amount=Decimal('1.00'), transaction_type='transferencia')
+            for _ in range(count)
+        ])
+        ServicePayment.objects.bulk_create([
+            ServicePayment(user=self.alice, service=self.service, amount=Decimal('2.00'), invoice_number=str(n))
+            for n in range(count)
+        ])
+
+    def changelist_queries(self, model):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(f'admin:core_bank_{model}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return ctx.captured_queries
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for model in ('transaction', 'servicepayment'):
+            with self.subTest(model=model):
+                self.add_rows(3)
+                few = self.changelist_queries(model)
+                self.add_rows(30)
+                many = self.changelist_queries(model)
+                self.assertEqual(len(few), len(many))
+                # Ni el COUNT(*) de la tabla entera ni el SELECT DISTINCT de la jerarquía de fechas
+                self.assertFalse([q['sql'] for q in many if 'COUNT(' in q['sql'] or 'DISTINCT' in q['sql']])
+
+    def test_paginator_estimates_unfiltered_and_caps_filtered_counts(self):
+        self.add_rows(12)
+        unfiltered = EstimatedCountPaginator(Transaction.objects.order_by('-id'), 5)
+        self.assertEqual(unfiltered.count, Transaction.objects.order_by('-id').first().id)
+
+        class SmallLimit(EstimatedCountPaginator):
+            COUNT_LIMIT = 10
+        filtered = SmallLimit(Transaction.objects.filter(sender=self.alice).order_by('-id'), 5)
+        self.assertEqual(filtered.count, 10)
+        self.assertEqual(filtered.num_pages, 2)
+
+    def test_filters_by_type_and_service(self):
+        self.add_rows(2)
+        Transaction.objects.create(sender=self.alice, amount=Decimal('3.00'), transaction_type='pago_servicio')
+        response = self.client.get(reverse('admin:core_bank_transaction_changelist'), {'transaction_type__exact': 'pago_servicio'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.client.get(reverse('admin:core_bank_servicepayment_changelist'), {'service__id__exact': self.service.id})
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+    def test_csv_export_streams_the_whole_filter(self):
+        self.add_rows(3)
+        response = self.client.post(reverse('admin:core_bank_transaction_changelist'), {
+            'action': 'export', 'select_across': '1', 'index': '0',
+            '_selected_action': [Transaction.objects.first().pk],
+        })
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(rows[0], ['Fecha', 'Tipo', 'Remitente', 'Destinatario', 'Monto', 'Descripción'])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][1:5], ['transferencia', 'alice', 'bob', '1.00'])
+
+    def change_user(self, user, **changes):
+        data = {
+            'username': user.username, 'email': user.email, 'first_name': user.first_name, 'last_name': user.last_name,
+            'is_active': 'on', 'dni': user.dni, 'balance': str(user.balance), 'initial-balance': str(user.balance),
+            'date_joined_0': timezone.localtime(user.date_joined).strftime('%Y-%m-%d'),
+            'date_joined_1': timezone.localtime(user.date_joined).strftime('%H:%M:%S'),
+            **changes,
+        }
+        response = self.client.post(reverse('admin:core_bank_customuser_change', args=[user.pk]), data)
+        self.assertEqual(response.status_code, 302, getattr(response, 'context', None) and response.context['adminform'].form.errors)
+
+    def test_user_form_does_not_overwrite_a_concurrent_credit(self):
+        opened = CustomUser.objects.get(pk=self.alice.pk)  # Lo que muestra el formulario al abrirse
+        form = self.client.get(reverse('admin:core_bank_customuser_change', args=[opened.pk]))
+        self.assertContains(form, 'name="initial-balance" value="10000.00"')
+        ledger.credit(self.alice.id, Decimal('5.00'))
+        self.change_user(opened, email='alice@example.com')
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.email, 'alice@example.com')
+        self.assertEqual(self.alice.balance, opened.balance + Decimal('5.00'))
+        self.assertEqual(self.alice.ledger_version, opened.ledger_version + 1)
+
+    def test_manual_balance_change_bumps_the_ledger_version(self):
+        opened = CustomUser.objects.get(pk=self.alice.pk)
+        ledger.credit(self.alice.id, Decimal('5.00'))
+        self.change_user(opened, balance='123.45')
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.balance, Decimal('123.45'))
+        self.assertEqual(self.alice.ledger_version, opened.ledger_version + 2)
+
+
+class MetricsTests(TestCase):
+    """Tiempo y consultas por vista, llamadas a Decolecta y el endpoint /metrics."""
+    def setUp(self):
+        self.alice = make_user('alice', '11111111')
+        self.client.force_login(self.alice)
+        metrics.reset()
+
+    def test_request_queries_are_counted_per_view(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('core_bank:dashboard'))
+        text = metrics.render()
+        self.assertIn('bank_http_request_duration_seconds_count{view="core_bank:dashboard",method="GET",status="200"} 1', text)
+        self.assertIn(f'bank_http_request_db_queries_sum{{view="core_bank:dashboard"}} {float(len(queries))}', text)
+        self.assertIn('bank_http_request_db_queries_bucket{view="core_bank:dashboard",le="+Inf"} 1', text)
+
+    def test_outbound_calls_record_their_outcome(self):
+        fake = FakeDecolectaServer(people=DniLookupTests.PEOPLE).start()
+        self.addCleanup(fake.stop)
+        DniLookupService(url=fake.url, token=fake.token).lookup('44444444')
+        with self.assertRaises(DniLookupError):
+            DniLookupService(url=fake.url, token='token-incorrecto').lookup('44444444')
+        text = metrics.render()
+        self.assertIn('bank_outbound_request_duration_seconds_count{service="decolecta",outcome="ok"} 1', text)
+        self.assertIn('bank_outbound_request_duration_seconds_count{service="decolecta",outcome="error"} 1', text)
+
+    def test_endpoint_requires_the_token(self):
+        url = reverse('metrics')
+        with override_settings(METRICS_TOKEN='secreto'):
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('# TYPE bank_http_request_duration_seconds histogram', response.content.decode())
+        with override_settings(METRICS_TOKEN=None, DEBUG=False):
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_slow_requests_are_profiled_to_disk(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            METRICS_PROFILE_SAMPLE_RATE=1, METRICS_PROFILE_SLOW_SECONDS=0, METRICS_PROFILE_DIR=directory,
+        ):
+            self.client.get(reverse('core_bank:history'))
+            [filename] = os.listdir(directory)
+            self.assertIn('core_bank_history', filename)
+            pstats.Stats(os.path.join(directory, filename))  # Se puede abrir con pstats
+
+
+class BatchTransferTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice', '11111111')
+        self.bob = make_user('bob', '22222222')
+        self.carol = make_user('carol', '33333333')
+        self.client.force_login(self.alice)
+        self.url = reverse('core_bank:batch_transfer_api')
+
+    def test_json_batch_applies_valid_lines_and_reports_errors(self):
+        payload = {'transfers': [
+            {'recipient': '22222222', 'amount': '100.00', 'description': 'Sueldo'},
+            {'recipient': 'carol', 'amount': '50.50'},
+            {'recipient': 'bob', 'amount': '25'},
+            {'recipient': 'nadie', 'amount': '10.00'},
+            {'recipient': 'carol', 'amount': '-5'},
+            {'recipient': 'alice', 'amount': '1.00'},
+        ]}
+        # 2 base (ver QueryBudgetTests) + 2 consultas IN + savepoint, débito, crédito, bulk_create y release
+        # + el total del mes (UPDATE que no encuentra fila, y savepoint/INSERT/release al crearla)
+        with self.assertNumQueries(2 + 2 + 5 + 4):
+            response = self.client.post(self.url, payload, content_type='application/json')
+
+        data = response.json()
+        self.assertEqual((data['applied'], data['failed'], data['total']), (3, 3, '175.50'))
+        self.assertEqual([r['status'] for r in data['results']], ['ok', 'ok', 'ok', 'error', 'error', 'error'])
+        for user, balance in ((self.alice, '9824.50'), (self.bob, '10125.00'), (self.carol, '10050.50')):
+            user.refresh_from_db()
+            self.assertEqual(user.balance, Decimal(balance))
+        self.assertEqual(Transaction.objects.count(), 3)
+
+    def test_csv_upload(self):
+        upload = SimpleUploadedFile('planilla.csv', b'destinatario,monto,descripcion\nbob,10.00,Uno\n33333333,20.00,Dos\n')
+        data = self.client.post(self.url, {'file': upload}).json()
+
+        self.assertEqual(data['applied'], 2)
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.balance, Decimal('10010.00'))
+
+    def test_total_over_balance_applies_nothing(self):
+        response = self.client.post(self.url, 'bob,6000.00\ncarol,6000.00\n', content_type='text/csv')
+
+        self.assertEqual(response.status_code, 400)
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.balance, Decimal('10000.00'))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_malformed_json(self):
+        response = self.client.post(self.url, '{"transfers": 3}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(TRANSFER_QUEUE_ENABLED=True)
+class TransferQueueTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice', '11111111', first_name='Alice')
+        self.bob = make_user('bob', '22222222', first_name='Bob')
+        self.client.force_login(self.alice)
+
+    def test_post_enqueues_and_status_follows_settlement(self):
+        response = self.client.post(reverse('core_bank:transfer'), {'recipient_identifier': 'bob', 'amount': '100.00'})
+        queued = QueuedTransfer.objects.get()
+        self.assertRedirects(response, reverse('core_bank:transfer_status', args=[queued.reference]))
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.balance, Decimal('10000.00'))  # Todavía no se aplicó
+
+        api = reverse('core_bank:transfer_status_api', args=[queued.reference])
+        self.assertEqual(self.client.get(api).json()['status'], 'pendiente')
+        self.assertContains(self.client.get(response.url), 'Transferencia en proceso')
+
+        ledger.settle_queued_transfers()
+
+        self.assertEqual(self.client.get(api).json()['status'], 'completada')
+        self.assertRedirects(self.client.get(response.url), reverse('core_bank:dashboard'))
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.balance, Decimal('10100.00'))
+        self.assertEqual(rollups.total_between(self.alice, 'transferencia', rollups.month_of(), rollups.month_of()), Decimal('100.00'))
+
+    def test_missing_accounts_are_rejected_with_their_own_message(self):
+        missing = CustomUser.objects.order_by('-pk').values_list('pk', flat=True).first() + 1
+        QueuedTransfer.objects.bulk_create([
+            QueuedTransfer(sender_id=missing, receiver_id=self.bob.id, amount=Decimal('1.00')),
+            QueuedTransfer(sender_id=self.alice.id, receiver_id=missing, amount=Decimal('1.00')),
+        ])
+
+        items = ledger.settle_queued_transfers()
+
+        self.assertEqual([(item.status, item.error) for item in items], [
+            ('rechazada', "La cuenta de origen no existe."),
+            ('rechazada', "La cuenta de destino no existe."),
+        ])
+        QueuedTransfer.objects.all().delete()  # Las claves foráneas se comprueban al cerrar el test
+
+    def test_group_commit_validates_each_transfer_in_order(self):
+        for sender, receiver, amount in ((self.alice, self.bob, '6000.00'), (self.alice, self.bob, '6000.00'),
+                                         (self.bob, self.alice, '3000.00'), (self.alice, self.bob, '6000.00')):
+            ledger.enqueue_transfer(sender.id, receiver.id, Decimal(amount))
+
+        # Todo el lote en un número fijo de consultas: cola y saldos, un UPDATE de saldos, un INSERT de
+        # transacciones, los totales del mes (con su savepoint) y un UPDATE por resultado, más el savepoint externo
+        with self.assertNumQueries(12):
+            items = ledger.settle_queued_transfers()
+
+        self.assertEqual([item.status for item in items], ['completada', 'rechazada', 'completada', 'completada'])
+        self.assertEqual(items[1].error, "Saldo insuficiente para realizar esta transferencia.")
+        for user, balance in ((self.alice, '1000.00'), (self.bob, '19000.00')):
+            user.refresh_from_db()
+            self.assertEqual(user.balance, Decimal(balance))
+        self.assertEqual(Transaction.objects.count(), 3)
+        self.assertEqual(ledger.settle_queued_transfers(), [])
+
+    def test_net_zero_batch_still_bumps_the_ledger_version(self):
+        ledger.enqueue_transfer(self.alice.id, self.bob.id, Decimal('10.00'))
+        ledger.enqueue_transfer(self.bob.id, self.alice.id, Decimal('10.00'))
+        ledger.settle_queued_transfers()
+
+        self.assertEqual(Transaction.objects.count(), 2)
+        for user in (self.alice, self.bob):
+            user.refresh_from_db()
+            self.assertEqual(user.balance, Decimal('10000.00'))
+            self.assertEqual(user.ledger_version, 1)
+
+    def test_status_of_another_users_transfer_is_hidden(self):
+        queued = ledger.enqueue_transfer(self.bob.id, self.alice.id, Decimal('1.00'))
+        self.assertEqual(self.client.get(reverse('core_bank:transfer_status_api', args=[queued.reference])).status_code, 404)
+
+
+class DniLookupTests(SimpleTestCase):
+    PEOPLE = {'44444444': ('JUAN', 'PEREZ', 'GOMEZ')}
+
+    def setUp(self):
+        self.fake = FakeDecolectaServer(people=self.PEOPLE).start()
+        self.addCleanup(self.fake.stop)
+
+    def make_service(self, **kwargs):
+        return DniLookupService(url=self.fake.url, token=self.fake.token, **kwargs)
+
+    def test_lookup_is_cached(self):
+        service = self.make_service()
+        expected = {'nombres': 'JUAN', 'apellidoPaterno': 'PEREZ', 'apellidoMaterno': 'GOMEZ'}
+
+        self.assertEqual(service.lookup('44444444'), expected)
+        self.assertEqual(service.lookup('44444444'), expected)
+        self.assertEqual(self.fake.calls, 1)
+
+    def test_not_found_is_cached_negatively(self):
+        service = self.make_service()
+        for _ in range(3):
+            with self.assertRaises(DniNotFound):
+                service.lookup('55555555')
+        self.assertEqual(self.fake.calls, 1)
+
+    def test_concurrent_lookups_share_one_upstream_call(self):
+        self.fake.latency = 0.2
+        service = self.make_service()
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(service.lookup, ['44444444'] * 8))
+
+        self.assertEqual(self.fake.calls, 1)
+        self.assertTrue(all(r['nombres'] == 'JUAN' for r in results))
+
+    def test_unexpected_error_reaches_every_waiting_lookup(self):
+        class Broken(DniLookupService):
+            def _request(self, dni):
+                time.sleep(0.2)  # Para que las demás consultas alcancen a sumarse a esta
+                raise RuntimeError("fallo inesperado")
+
+        service = Broken(url=self.fake.url, token=self.fake.token)
+        with ThreadPoolExecutor(4) as pool:
+            futures = [pool.submit(service.lookup, '44444444') for _ in range(4)]
+        errors = sorted(type(future.exception()).__name__ for future in futures)
+
+        self.assertEqual(errors, ['DniLookupError'] * 3 + ['RuntimeError'])
+        self.assertEqual(service._inflight, {})
+
+    def test_errors_are_not_cached(self):
+        service = DniLookupService(url=self.fake.url, token='token-incorrecto')
+        for _ in range(2):
+            with self.assertRaises(DniLookupError) as ctx:
+                service.lookup('44444444')
+            self.assertEqual(ctx.exception.status_code, 401)
+        self.assertEqual(self.fake.calls, 2)
+
+    def test_read_timeout(self):
+        self.fake.latency = 0.5
+        with self.assertRaises(DniLookupError):
+            self.make_service(read_timeout=0.05).lookup('44444444')
+
+    def test_eviction(self):
+        cache = TTLCache(max_entries=2)
+        for key in 'abc':
+            cache.set(key, key)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c'), 'c')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+
+class ResilienceTests(SimpleTestCase):
+    """Circuit breaker y bulkhead frente a un Decolecta caído o lento."""
+    def setUp(self):
+        self.fake = FakeDecolectaServer(people=DniLookupTests.PEOPLE).start()
+        self.addCleanup(self.fake.stop)
+        self.now = 0.0
+
+    def make_service(self, **kwargs):
+        provider = Provider('decolecta', clock=lambda: self.now, **kwargs)
+        return DniLookupService(url=self.fake.url, token=self.fake.token, provider=provider)
+
+    def test_breaker_lets_a_single_trial_through_after_the_reset_timeout(self):
+        breaker = CircuitBreaker(threshold=2, reset_timeout=10, clock=lambda: self.now)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        self.now = 10
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # Solo una prueba a la vez
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())  # La prueba falló: otros 10 segundos
+
+        self.now = 20
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_open_circuit_fails_fast_without_calling_the_provider(self):
+        self.fake.error_status = 503
+        service = self.make_service(threshold=3, reset_timeout=30)
+        for _ in range(3):
+            with self.assertRaises(DniLookupError) as ctx:
+                service.lookup('44444444')
+            self.assertEqual(ctx.exception.status_code, 503)
+        with self.assertRaises(DniServiceUnavailable):
+            service.lookup('44444444')
+        self.assertEqual(self.fake.calls, 3)
+
+        self.fake.error_status = None
+        self.now = 30
+        self.assertEqual(service.lookup('44444444')['nombres'], 'JUAN')
+        self.assertEqual(service.provider.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_client_errors_do_not_open_the_circuit(self):
+        service = DniLookupService(url=self.fake.url, token='token-incorrecto', provider=Provider('decolecta', threshold=1))
+        for _ in range(2):
+            with self.assertRaises(DniLookupError) as ctx:
+                service.lookup('44444444')
+            self.assertEqual(ctx.exception.status_code, 401)
+        self.assertEqual(self.fake.calls, 2)
+
+    def test_slow_provider_only_holds_its_bulkhead(self):
+        self.fake.latency = 0.5
+        service = self.make_service(max_concurrent=1)
+
+        def lookup(dni):
+            try:
+                return service.lookup(dni)['nombres']
+            except DniServiceUnavailable:
+                return 'rechazada'
+
+        with ThreadPoolExecutor(4) as workers:  # Como los hilos de un servidor WSGI
+            lookups = [workers.submit(lookup, '44444444')]
+            while not self.fake.calls:  # Que la primera ocupe el único cupo
+                time.sleep(0.01)
+            lookups += [workers.submit(lookup, dni) for dni in ('44444444', '10000001', '10000002')]
+            done, pending = wait(lookups, timeout=0.3)
+            # Las consultas de más fallaron enseguida; solo un hilo sigue esperando a Decolecta
+            self.assertEqual(sorted(future.result() for future in done), ['rechazada', 'rechazada'])
+            self.assertEqual(len(pending), 2)  # La misma consulta dos veces: una sola llamada (single-flight)
+
+            # Una página del banco que llega ahora encuentra workers libres
+            queued_at = time.perf_counter()
+            started_at = workers.submit(time.perf_counter).result()
+            self.assertLess(started_at - queued_at, 0.1)
+            self.assertEqual([future.result() for future in pending], ['JUAN', 'JUAN'])
+        self.assertEqual(self.fake.calls, 1)
+
+
+class DniInfoViewTests(TestCase):
+    def setUp(self):
+        self.fake = FakeDecolectaServer(people=DniLookupTests.PEOPLE).start()
+        self.addCleanup(self.fake.stop)
+        settings_override = self.settings(DECOLECTA_API_URL=self.fake.url, DECOLECTA_API_TOKEN=self.fake.token)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_found_and_not_found(self):
+        url = reverse('core_bank:get_dni_info')
+        response = self.client.post(url, {'dni': '44444444'})
+        self.assertEqual(response.json(), {
+            'success': True, 'nombres': 'JUAN', 'apellidoPaterno': 'PEREZ', 'apellidoMaterno': 'GOMEZ',
+        })
+        self.assertEqual(self.client.post(url, {'dni': '55555555'}).status_code, 404)
+        self.assertEqual(self.client.post(url, {'dni': '123'}).status_code, 400)
+
+    def test_unavailable_provider_answers_503(self):
+        self.fake.error_status = 503
+        url = reverse('core_bank:get_dni_info')
+        with self.settings(DECOLECTA_BREAKER_THRESHOLD=1):
+            self.assertEqual(self.client.post(url, {'dni': '44444444'}).status_code, 500)
+            self.assertEqual(self.client.post(url, {'dni': '44444444'}).status_code, 503)
+            self.assertIn('bank_outbound_rejected_total{service="decolecta",reason="circuit_open"} 1', metrics.render())
+        self.assertEqual(self.fake.calls, 1)
+
+
+class SpendingRollupTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice', '11111111')
+        self.bob = make_user('bob', '22222222')
+        self.luz = Service.objects.get(name='Luz (Luz del Sur)')
+        self.agua = Service.objects.get(name='Agua (SEDAPAL)')
+
+    def snapshot(self):
+        return sorted(SpendingRollup.objects.values_list('user_id', 'month', 'transaction_type', 'service_id', 'total', 'count'))
+
+    def test_ledger_keeps_rollups_up_to_date(self):
+        ledger.transfer(self.alice.id, self.bob.id, Decimal('100.00'))
+        ledger.transfer(self.alice.id, self.bob.id, Decimal('50.00'))
+        ledger.batch_transfer(self.bob.id, [(self.alice.id, Decimal('5.00'), None), (self.alice.id, Decimal('7.00'), None)])
+        ledger.pay_service(self.alice.id, self.luz, Decimal('80.00'))
+        ledger.pay_service(self.alice.id, self.agua, Decimal('20.00'))
+        ledger.pay_service(self.alice.id, self.luz, Decimal('10.00'))
+
+        month = rollups.month_of()
+        self.assertEqual(rollups.total_between(self.alice, 'transferencia', month, month), Decimal('150.00'))
+        self.assertEqual(rollups.total_between(self.bob, 'transferencia', month, month), Decimal('12.00'))
+        self.assertEqual(rollups.total_between(self.alice, 'pago_servicio', month, month, service=self.luz), Decimal('90.00'))
+        self.assertEqual(SpendingRollup.objects.get(user=self.alice, service=self.luz).count, 2)
+
+        # La reconstrucción desde cero debe dar exactamente lo mismo
+        incremental = self.snapshot()
+        self.assertEqual(rollups.rebuild(), len(incremental))
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_failed_debit_does_not_touch_rollups(self):
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.transfer(self.alice.id, self.bob.id, Decimal('20000.00'))
+        self.assertFalse(SpendingRollup.objects.exists())
+
+    def test_dashboard_month_summary(self):
+        ledger.transfer(self.alice.id, self.bob.id, Decimal('100.00'))
+        ledger.pay_service(self.alice.id, self.luz, Decimal('80.00'))
+        self.client.force_login(self.alice)
+
+        summary = self.client.get(reverse('core_bank:dashboard')).context['month_summary']
+
+        self.assertEqual((summary['transfers'], summary['services']), (Decimal('100.00'), Decimal('80.00')))
+        self.assertEqual([r.service for r in summary['by_service']], [self.luz])
+
+
+class SeedBankTests(TestCase):
+    def test_seeded_history_matches_balances(self):
+        make_user('alice', '00000007')
+        ids = seed_bank(20, transactions=300, payments=40, password='clave-segura-123', opening_balance=Decimal('1000.00'))
+
+        users = CustomUser.objects.filter(pk__in=ids)
+        self.assertEqual(users.count(), 20)
+        self.assertEqual(users.order_by('id').first().dni, '00000008')  # Sigue a los DNIs existentes
+        self.assertTrue(users.first().check_password('clave-segura-123'))
+        self.assertEqual(Transaction.objects.filter(transaction_type='transferencia').count(), 300)
+        self.assertEqual(ServicePayment.objects.count(), 40)
+        self.assertEqual(Transaction.objects.filter(transaction_type='pago_servicio').count(), 40)
+
+        # Las transferencias solo mueven dinero: el total baja exactamente lo pagado en servicios
+        total = sum(users.values_list('balance', flat=True))
+        paid = sum(ServicePayment.objects.values_list('amount', flat=True))
+        self.assertEqual(total, Decimal('20000.00') - paid)
+        self.assertEqual(sum(SpendingRollup.objects.filter(transaction_type='pago_servicio').values_list('total', flat=True)), paid)
+
+        # Historial con fechas pasadas, sin desactivar auto_now_add del modelo (lo comparten todos los hilos)
+        self.assertLess(Transaction.objects.order_by('timestamp').first().timestamp, timezone.now() - timedelta(days=1))
+        self.assertEqual(
+            sorted(ServicePayment.objects.values_list('timestamp', flat=True)),
+            sorted(Transaction.objects.filter(transaction_type='pago_servicio').values_list('timestamp', flat=True)),
+        )
+        self.assertTrue(Transaction._meta.get_field('timestamp').auto_now_add)
+
+    def test_no_account_goes_negative_at_any_point(self):
+        # Saldo inicial justo: sin elegir quién puede pagar, algunas cuentas quedarían en negativo
+        ids = seed_bank(5, transactions=150, payments=5, opening_balance=Decimal('100.00'))
+
+        running = dict.fromkeys(ids, Decimal('100.00'))
+        for sender, receiver, amount in Transaction.objects.order_by('timestamp', 'id').values_list('sender', 'receiver', 'amount'):
+            running[sender] -= amount
+            if receiver is not None:
+                running[receiver] += amount
+            self.assertGreaterEqual(running[sender], 0)
+        self.assertEqual(running, dict(CustomUser.objects.filter(pk__in=ids).values_list('pk', 'balance')))
+
+
+class ImportUsersTests(TestCase):
+    CSV = (
+        "username,dni,first_name,last_name,email,password\n"
+        "carla,33333333,Carla,Quispe,carla@example.com,clave-segura-123\n"
+        "dario,11111111,Dario,Rojas,,clave-segura-123\n"      # DNI de alice
+        "ALICE,44444444,Otra,Alice,,clave-segura-123\n"        # Usuario repetido (sin distinguir mayúsculas)
+        "elena,3333333X,Elena,Soto,,clave-segura-123\n"
+        "fabio,55555555,Fabio,Paz,,\n"
+        "gina,55555555,Gina,Paz,,clave-segura-123\n"          # DNI repetido dentro del archivo
+    )
+
+    def test_imports_valid_rows_in_batches(self):
+        make_user('alice', '11111111')
+
+        # Un hasher rápido para el test; igual pasa por los procesos del pool
+        with self.settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            result = import_users(io.StringIO(self.CSV), batch_size=1, workers=2)
+            self.assertTrue(CustomUser.objects.get(username='carla').check_password('clave-segura-123'))
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual([(r.line, r.reason) for r in result.rejected], [
+            (3, "Este DNI ya está registrado."),
+            (4, "Este nombre de usuario ya existe."),
+            (5, "El DNI debe tener 8 dígitos."),
+            (7, "Este DNI ya está registrado."),
+        ])
+        carla = CustomUser.objects.get(username='carla')
+        self.assertEqual((carla.dni, carla.email, carla.balance), ('33333333', 'carla@example.com', Decimal('10000.00')))
+        self.assertFalse(CustomUser.objects.get(username='fabio').has_usable_password())
+
+    def test_rows_failing_field_or_password_validation_are_rejected(self):
+        csv_text = (
+            "username,dni,first_name,last_name,email,password\n"
+            "hugo con espacio,66666666,Hugo,Luna,,clave-segura-123\n"
+            "ines,77777777,Ines,Luna,no-es-correo,clave-segura-123\n"
+            "jose,88888888,Jose,Rios,,123\n"
+            f"{'k' * 151},99999999,Karen,Rios,,clave-segura-123\n"
+            "luis,12121212,Luis,Rios,luis@example.com,clave-segura-123\n"
+        )
+        with self.settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            result = import_users(io.StringIO(csv_text), workers=1)
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual([r.line for r in result.rejected], [2, 3, 4, 5])
+        self.assertTrue(all(r.reason for r in result.rejected))
+        self.assertEqual(list(CustomUser.objects.values_list('username', flat=True)), ['luis'])
+
+    def test_missing_required_column(self):
+        with self.assertRaises(ValueError):
+            import_users(io.StringIO("username,email\ncarla,carla@example.com\n"), workers=1)
+
+
+class AsyncAuthViewTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice', '11111111', first_name='Alice')
+
+    def post(self, view, data):
+        request = AsyncRequestFactory().post('/', data)
+        request.session = sessions.SessionStore()
+        request._messages = FallbackStorage(request)
+        request.user = AnonymousUser()
+        return request, view(request)
+
+    async def test_login_hashes_off_the_event_loop(self):
+        request, response = self.post(views.async_user_login_view, {'username': 'alice', 'password': 'clave-segura-123'})
+        response = await response
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(request.session['_auth_user_id'], str(self.alice.pk))
+
+    async def test_wrong_password_shows_the_form_error(self):
+        request, response = self.post(views.async_user_login_view, {'username': 'alice', 'password': 'otra-clave'})
+        response = await response
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([str(m) for m in request._messages], ["Por favor, corrige los errores en el formulario."])
+        self.assertNotIn('_auth_user_id', request.session)
+
+    async def test_failed_login_sends_user_login_failed(self):
+        failures = []
+
+        def on_failure(sender, credentials, request, **kwargs):
+            failures.append((credentials, request))
+        user_login_failed.connect(on_failure)
+        self.addCleanup(user_login_failed.disconnect, on_failure)
+
+        request, response = self.post(views.async_user_login_view, {'username': 'alice', 'password': 'otra-clave'})
+        await response
+
+        self.assertEqual(failures, [({'username': 'alice', 'password': '********************'}, request)])
+
+    async def test_inactive_users_follow_the_configured_backend(self):
+        await CustomUser.objects.filter(pk=self.alice.pk).aupdate(is_active=False)
+
+        self.assertIsNone(await hashing.aauthenticate(None, 'alice', 'clave-segura-123'))
+        with self.settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.AllowAllUsersModelBackend']):
+            user = await hashing.aauthenticate(None, 'alice', 'clave-segura-123')
+        self.assertEqual((user.pk, user.backend), (self.alice.pk, 'django.contrib.auth.backends.AllowAllUsersModelBackend'))
+
+    async def test_a_submit_that_fails_returns_its_slot(self):
+        with self.settings(PASSWORD_HASHING_WORKERS=1):
+            hashing._get_executor().shutdown()
+            with self.assertRaises(RuntimeError):
+                await hashing.run(make_password, 'clave-segura-123')
+        self.assertEqual(hashing.in_flight(), 0)
+
+    async def test_register_creates_account_with_opening_balance(self):
+        data = {
+            'username': 'carla', 'email': 'carla@example.com', 'dni': '33333333', 'first_name': 'Carla',
+            'last_name': 'Quispe', 'password1': 'clave-segura-123', 'password2': 'clave-segura-123',
+        }
+        request, response = self.post(views.async_register_view, data)
+        response = await response
+
+        self.assertEqual(response.status_code, 302)
+        carla = await CustomUser.objects.aget(username='carla')
+        self.assertEqual(carla.balance, Decimal('10000.00'))
+        self.assertEqual(request.session['_auth_user_id'], str(carla.pk))
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_MAX_QUEUE=0)
+    async def test_full_queue_is_rejected_with_503(self):
+        release = threading.Event()
+        busy = asyncio.ensure_future(hashing.run(release.wait))
+        await asyncio.sleep(0)  # Deja que ocupe el único hilo del pool
+        try:
+            request, response = self.post(views.async_user_login_view, {'username': 'alice', 'password': 'clave-segura-123'})
+            response = await response
+        finally:
+            release.set()
+            await busy
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertNotIn('_auth_user_id', request.session)
+        self.assertEqual(hashing.in_flight(), 0)
+
+
+class SettlementTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice', '11111111', first_name='Alice', last_name='Quispe')
+        self.luz = Service.objects.get(name='Luz (Luz del Sur)')
+        self.agua = Service.objects.get(name='Agua (SEDAPAL)')
+
+    def later(self):
+        # Pasado el margen de seguridad, los pagos recién hechos ya se pueden liquidar
+        return timezone.now() + timedelta(seconds=61)
+
+    def test_each_run_settles_only_new_payments(self):
+        ledger.pay_service(self.alice.id, self.luz, Decimal('80.00'), 'F-1')
+        ledger.pay_service(self.alice.id, self.luz, Decimal('20.00'), 'F-2')
+        ledger.pay_service(self.alice.id, self.agua, Decimal('15.50'), 'F-3')
+
+        self.assertIsNone(settlements.settle())  # Todavía dentro del margen de seguridad
+        first = settlements.settle(now=self.later())
+        self.assertEqual((first.count, first.total), (3, Decimal('115.50')))
+        self.assertEqual(
+            sorted((b.service.name, b.total, b.count) for b in first.batches.all()),
+            [('Agua (SEDAPAL)', Decimal('15.50'), 1), ('Luz (Luz del Sur)', Decimal('100.00'), 2)],
+        )
+        self.assertIsNone(settlements.settle(now=self.later()))
+
+        last = ledger.pay_service(self.alice.id, self.agua, Decimal('5.00'), 'F-4')
+        second = settlements.settle(now=self.later())
+        self.assertEqual((second.count, second.total), (1, Decimal('5.00')))
+        self.assertEqual((second.from_timestamp, second.from_payment_id), (first.through_timestamp, first.through_payment_id))
+        self.assertEqual(second.through_payment_id, last.id)
+        self.assertEqual(list(settlements.run_payments(second)), [last])
+
+    def test_a_second_run_from_the_same_watermark_is_refused(self):
+        ledger.pay_service(self.alice.id, self.luz, Decimal('80.00'), 'F-1')
+        first = settlements.settle(now=self.later())
+        ledger.pay_service(self.alice.id, self.luz, Decimal('20.00'), 'F-2')
+        second = settlements.settle(now=self.later())
+
+        # Lo que guardaría una corrida concurrente que leyó la misma marca que otra
+        for run in (first, second):
+            with self.subTest(from_payment_id=run.from_payment_id), self.assertRaises(IntegrityError), db_transaction.atomic():
+                SettlementRun.objects.create(
+                    from_timestamp=run.from_timestamp, from_payment_id=run.from_payment_id,
+                    through_timestamp=second.through_timestamp + timedelta(seconds=1), through_payment_id=second.through_payment_id + 1,
+                    total=Decimal('0.00'), count=0,
+                )
+        self.assertEqual(SettlementRun.objects.count(), 2)
+
+    def test_staff_download_streams_the_biller_file(self):
+        ledger.pay_service(self.alice.id, self.luz, Decimal('80.00'), 'F-1')
+        batch = settlements.settle(now=self.later()).batches.get()
+        url = reverse('core_bank:settlement_file', args=[batch.pk])
+
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(url).status_code, 302)  # Solo personal del banco
+
+        self.client.force_login(make_user('staff', '99999999', is_staff=True))
+        response = self.client.get(url)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(rows[0], list(settlements.FILE_HEADER))
+        self.assertEqual(rows[1][1:], ['F-1', '11111111', 'Alice Quispe', str(batch.run.through_payment_id), '80.00'])
+        self.assertIn('liquidacion_', response['Content-Disposition'])
+
+
+class ActivityEventsTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice', '11111111', first_name='Alice', last_name='Quispe')
+        self.bob = make_user('bob', '22222222', first_name='Bob', last_name='Rojas')
+
+    @override_settings(EVENTS_BROKER='core_bank.tests.RecordingBroker')
+    def test_ledger_publishes_to_both_accounts_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ledger.transfer(self.alice.id, self.bob.id, Decimal('25.00'), 'Almuerzo')
+            self.assertEqual(events.get_broker().published, [])  # Nada antes del commit
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(ledger.InsufficientFunds):
+            ledger.transfer(self.alice.id, self.bob.id, Decimal('50000.00'))
+
+        published = events.get_broker().published
+        self.assertEqual([(user_id, e['direction'], e['counterparty_id']) for user_id, e in published],
+                         [(self.alice.id, 'out', self.bob.id), (self.bob.id, 'in', self.alice.id)])
+        self.assertEqual(published[1][1]['amount'], '25.00')
+
+    async def test_in_process_broker_delivers_across_threads(self):
+        broker = events.InProcessBroker()
+        async with broker.subscribe(self.alice.id) as subscription:
+            # Como el ledger: publica desde otro hilo
+            await asyncio.to_thread(broker.publish, self.alice.id, {'n': 1})
+            broker.publish(self.bob.id, {'n': 2})
+            self.assertEqual(await asyncio.wait_for(subscription.get(), 1), {'n': 1})
+            self.assertTrue(subscription.queue.empty())
+        self.assertEqual(broker.subscribers(self.alice.id), 0)
+
+    async def test_redis_broker_relays_through_the_account_channel(self):
+        redis = FakeRedis()
+        broker = events.RedisBroker(client=redis, async_client=lambda: redis)
+        channel = broker.channel(self.alice.id)
+        async with broker.subscribe(self.alice.id) as subscription:
+            self.assertEqual(len(redis.subscribers[channel]), 1)
+            await asyncio.to_thread(broker.publish, self.alice.id, {'n': 1})
+            broker.publish(self.bob.id, {'n': 2})
+            self.assertEqual(await asyncio.wait_for(subscription.get(), 1), {'n': 1})
+            self.assertTrue(subscription.pubsub.messages.empty())
+        self.assertEqual(redis.subscribers[channel], set())
+
+    async def test_stream_pushes_balance_and_movements(self):
+        await self.async_client.aforce_login(self.alice)
+        response = await self.async_client.get(reverse('core_bank:activity_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        self.assertEqual(await anext(chunks), b'event: balance\ndata: {"balance": "10000.00"}\n\n')
+
+        await CustomUser.objects.filter(pk=self.alice.pk).aupdate(balance=Decimal('10025.00'))
+        events.get_broker().publish(self.alice.id, events.movement_event(
+            'in', 'transferencia', Decimal('25.00'), timezone.now(), counterparty_id=self.bob.id))
+        movement = await asyncio.wait_for(anext(chunks), 1)
+        self.assertIn(b'"detail": "De: Bob Rojas (bob)"', movement)
+        self.assertIn(b'"balance": "10025.00"', await anext(chunks))
+
+        await chunks.aclose()
+
+    def test_stream_needs_asgi(self):
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(reverse('core_bank:activity_stream')).status_code, 501)
+
+
+class StatementExportTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice', '11111111')
+        self.bob = make_user('bob', '22222222')
+        luz = Service.objects.get(name='Luz (Luz del Sur)')
+        ledger.transfer(self.alice.id, self.bob.id, Decimal('100.00'), 'Cena')
+        ledger.transfer(self.bob.id, self.alice.id, Decimal('40.00'))
+        ledger.pay_service(self.alice.id, luz, Decimal('80.00'), 'F-001')
+        self.client.force_login(self.alice)
+
+    def export(self, fmt, **params):
+        response = self.client.get(reverse('core_bank:statement_export'), {'format': fmt, **params})
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_merges_all_movements_in_order(self):
+        response, body = self.export('csv')
+
+        self.assertFalse(response.is_async)  # En WSGI se itera en el hilo del worker
+        self.assertIn('attachment; filename="estado_de_cuenta_alice_', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(body.decode('utf-8-sig'))))
+        self.assertEqual(rows[0], ['Fecha', 'Tipo', 'Detalle', 'Contraparte', 'Referencia', 'Monto'])
+        # El pago de servicio aparece una sola vez (su Transaction 'pago_servicio' se omite)
+        self.assertEqual([row[1:] for row in rows[1:]], [
+            ['Transferencia enviada', 'Cena', 'bob', '', '-100.00'],
+            ['Transferencia recibida', '', 'bob', '', '40.00'],
+            ['Pago de servicio', 'Luz (Luz del Sur)', '', 'F-001', '-80.00'],
+        ])
+
+    def test_xlsx_and_parquet(self):
+        import pyarrow.parquet as pq
+        from openpyxl import load_workbook
+
+        _, body = self.export('xlsx')
+        sheet = load_workbook(io.BytesIO(body), read_only=True).active
+        self.assertEqual([row[-1] for row in sheet.iter_rows(min_row=2, values_only=True)], [-100, 40, -80])
+
+        _, body = self.export('parquet')
+        table = pq.read_table(io.BytesIO(body))
+        self.assertEqual(table.column('monto').to_pylist(), [Decimal('-100.00'), Decimal('40.00'), Decimal('-80.00')])
+
+    async def test_asgi_export_is_sent_chunk_by_chunk(self):
+        await self.async_client.aforce_login(self.alice)
+        response = await self.async_client.get(reverse('core_bank:statement_export'), {'format': 'csv'})
+        self.assertTrue(response.is_async)  # Un iterador síncrono se consumiría entero antes de enviarse
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(body.decode('utf-8-sig').splitlines()), 4)
+
+    async def test_async_chunks_generates_one_chunk_at_a_time(self):
+        produced = []
+
+        def chunks():
+            for number in range(3):
+                produced.append(number)
+                yield str(number)
+
+        stream = statements.async_chunks(chunks())
+        self.assertEqual(await anext(stream), '0')
+        self.assertEqual(produced, [0])
+        await stream.aclose()  # El cliente se fue: el generador se cierra sin producir el resto
+        self.assertEqual(produced, [0])
+
+    def test_date_range_and_validation(self):
+        today = timezone.localdate()
+        _, body = self.export('csv', start=today.isoformat(), end=today.isoformat())
+        self.assertEqual(len(body.decode('utf-8-sig').splitlines()), 4)
+
+        tomorrow = (today + timedelta(days=1)).isoformat()
+        _, body = self.export('csv', start=tomorrow)
+        self.assertEqual(len(body.decode('utf-8-sig').splitlines()), 1)
+
+        url = reverse('core_bank:statement_export')
+        self.assertEqual(self.client.get(url, {'format': 'pdf'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': '2024-02-30'}).status_code, 400)
+
+
+class ServiceCatalogTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alice', '11111111')
+        self.client.force_login(self.user)
+        self.luz = Service.objects.get(name='Luz (Luz del Sur)')
+        # Los TestCase revierten los servicios que crearon sin emitir señales
+        catalog.invalidate()
+
+    def service_queries(self, ctx):
+        return [q['sql'] for q in ctx.captured_queries if 'FROM "core_bank_service"' in q['sql']]
+
+    def test_default_services_come_from_the_migration(self):
+        self.assertEqual(len(catalog.get_services()), 10)
+
+    def test_payment_renders_and_validates_without_catalog_queries(self):
+        catalog.get_services()
+        with CaptureQueriesContext(connection) as ctx:
+            page = self.client.get(reverse('core_bank:services'))
+            response = self.client.post(reverse('core_bank:services'), {'service': self.luz.pk, 'amount': '15.00'})
+
+        self.assertContains(page, 'Luz (Luz del Sur)')
+        self.assertRedirects(response, reverse('core_bank:dashboard'), fetch_redirect_response=False)
+        self.assertEqual(self.service_queries(ctx), [])
+        self.assertEqual(ServicePayment.objects.get().service, self.luz)
+
+    def test_unknown_service_is_rejected(self):
+        response = self.client.post(reverse('core_bank:services'), {'service': '999999', 'amount': '15.00'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('service', response.context['form'].errors)
+        self.assertFalse(ServicePayment.objects.exists())
+
+    def test_save_and_delete_invalidate_the_catalog(self):
+        catalog.get_services()
+        gas = Service.objects.create(name='Gas Licuado')
+        self.assertEqual(catalog.get_service(gas.pk).name, 'Gas Licuado')
+
+        gas.delete()
+        self.assertIsNone(catalog.get_service(gas.pk))
+        self.assertNotIn('Gas Licuado', self.client.get(reverse('core_bank:services')).content.decode())
+
+
+class SessionEngineTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alice', '11111111')
+        self.client.force_login(self.user)
+        self.url = reverse('core_bank:get_user_balance_api')
+
+    def session_writes(self, ctx):
+        return [q['sql'] for q in ctx.captured_queries
+                if 'django_session' in q['sql'] and q['sql'].startswith(('UPDATE', 'INSERT'))]
+
+    def test_repeated_requests_do_not_write_the_session_table(self):
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(5):
+                self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        self.assertEqual(self.session_writes(ctx), [])
+
+    def test_logout_in_another_worker_is_seen_on_the_next_request(self):
+        self.client.get(self.url)
+        # Otro proceso borra la sesión; este no debe seguir sirviéndola desde memoria
+        Session.objects.filter(session_key=self.client.session.session_key).delete()
+
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_expiry_is_pushed_once_it_falls_behind_the_threshold(self):
+        key = self.client.session.session_key
+        stale = timezone.now() + timedelta(seconds=1200 - 120)
+        Session.objects.filter(session_key=key).update(expire_date=stale)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+            self.client.get(self.url)
+
+        self.assertEqual(len(self.session_writes(ctx)), 1)
+        self.assertGreater(Session.objects.get(session_key=key).expire_date, stale + timedelta(seconds=100))
+
+    def test_logout_is_not_served_from_the_local_cache(self):
+        self.client.get(self.url)
+        self.client.get(reverse('core_bank:logout'))
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 302)
+
+
+class SerializedWriteTests(SimpleTestCase):
+    def flaky(self, *errors):
+        calls = []
+
+        @serialized_write
+        def write():
+            calls.append(1)
+            if len(calls) <= len(errors):
+                raise errors[len(calls) - 1]
+            return 'ok'
+        return write, calls
+
+    def test_lock_errors_are_retried(self):
+        write, calls = self.flaky(OperationalError('database is locked'), OperationalError('database is locked'))
+
+        with self.settings(SQLITE_WRITE_RETRY_BACKOFF=0):
+            self.assertEqual(write(), 'ok')
+        self.assertEqual(len(calls), 3)
+
+    def test_retries_are_bounded_and_other_errors_are_not_retried(self):
+        write, calls = self.flaky(*[OperationalError('database is locked')] * 10)
+        with self.settings(SQLITE_WRITE_RETRIES=2, SQLITE_WRITE_RETRY_BACKOFF=0), self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 3)
+
+        write, calls = self.flaky(OperationalError('no such table: core_bank_customuser'))
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
+
+
+class SqliteProductionModeTests(TestCase):
+    def test_connection_pragmas(self):
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ('busy_timeout', 'synchronous', 'cache_size'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+
+        self.assertEqual(pragmas, {'busy_timeout': 5000, 'synchronous': 1, 'cache_size': -20000})
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+@skipUnless('replica1' in settings.DATABASES, "Requiere la base replica1 (ver core_bank/testing.py).")
+@override_settings(READ_REPLICAS=['replica1'])
+class ReplicaRouterTests(TestCase):
+    # replica1 es una base SQLite independiente: lo que no se copie a mano no existe ahí
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        self.alice = make_user('alice', '11111111')
+        self.bob = make_user('bob', '22222222')
+        for user in (self.alice, self.bob):
+            user.save(using='replica1', force_insert=True)
+        Transaction.objects.using('replica1').create(
+            sender_id=self.alice.id, receiver_id=self.bob.id, amount=Decimal('1.00'),
+            transaction_type='transferencia', description='Solo en la réplica',
+        )
+        self.client.force_login(self.alice)
+
+    def test_read_only_views_read_from_the_replica(self):
+        self.assertContains(self.client.get(reverse('core_bank:history')), 'Solo en la réplica')
+        dashboard = self.client.get(reverse('core_bank:dashboard'))
+        self.assertEqual([t.description for t in dashboard.context['recent_transactions']], ['Solo en la réplica'])
+
+    def test_own_writes_pin_reads_to_the_primary(self):
+        response = self.client.post(reverse('core_bank:transfer'), {'recipient_identifier': 'bob', 'amount': '50.00', 'description': 'Desde la primaria'})
+
+        self.assertEqual(response.cookies[PIN_COOKIE_NAME]['max-age'], 5)
+        history = self.client.get(reverse('core_bank:history'))
+        self.assertContains(history, 'Desde la primaria')
+        self.assertNotContains(history, 'Solo en la réplica')
+
+    def test_without_replicas_everything_reads_from_the_primary(self):
+        with self.settings(READ_REPLICAS=[]):
+            response = self.client.post(reverse('core_bank:transfer'), {'recipient_identifier': 'bob', 'amount': '5.00'})
+            history = self.client.get(reverse('core_bank:history'))
+
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+        self.assertNotContains(history, 'Solo en la réplica')
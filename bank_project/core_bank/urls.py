@@ -1,15 +1,29 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
 
+# Bajo ASGI el login y el registro no bloquean: hashean en el pool de core_bank/hashing.py
+if settings.ASYNC_AUTH_VIEWS:
+    login_view, register_view = views.async_user_login_view, views.async_register_view
+else:
+    login_view, register_view = views.user_login_view, views.register_view
+
 urlpatterns = [
-    path('login/', views.user_login_view, name='login'), # Ruta para login
-    path('register/', views.register_view, name='register'),
+    path('login/', login_view, name='login'), # Ruta para login
+    path('register/', register_view, name='register'),
     path('logout/', views.user_logout_view, name='logout'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('events/', views.activity_stream, name='activity_stream'),
     path('transfer/', views.transfer_view, name='transfer'),
+    path('transfer/<uuid:reference>/', views.transfer_status_view, name='transfer_status'),
+    path('api/transfer/batch/', views.batch_transfer_api, name='batch_transfer_api'),
+    path('api/transfer/<uuid:reference>/', views.transfer_status_api, name='transfer_status_api'),
     path('services/', views.services_view, name='services'),
     path('history/', views.history_view, name='history'),
+    path('history/page/', views.history_page_api, name='history_page_api'),
+    path('statement/', views.statement_export, name='statement_export'),
+    path('settlements/<int:batch_id>/file/', views.settlement_file_view, name='settlement_file'),
     path('get_dni_info/', views.get_dni_info, name='get_dni_info'),
     
     # NUEVA RUTA: Endpoint API para el saldo del usuario
@@ -1,22 +1,33 @@
-from django.shortcuts import render, redirect
-from django.contrib.auth import login, logout, authenticate
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.auth import login, logout, authenticate, alogin
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from django.db import transaction as db_transaction
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, Http404
+from django.core.handlers.asgi import ASGIRequest
+from django.template.loader import render_to_string
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 from django.contrib import messages
-import requests
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.conf import settings
+from asgiref.sync import sync_to_async
+import asyncio
+import json
 import os
+import secrets
 from dotenv import load_dotenv
 from decimal import Decimal
 
-from .models import CustomUser, Transaction, Service, ServicePayment
-from .forms import CustomUserCreationForm, UserLoginForm, TransferForm, ServicePaymentForm
+from .models import CustomUser, Transaction, ServicePayment, QueuedTransfer, SettlementBatch
+from . import catalog, ledger, dni_lookup, events, fragments, hashing, metrics, rollups, settlements, statements
+from .pagination import keyset_page, InvalidCursor
+from .routers import read_alias, read_from_replica
+from .batch import BatchFormatError, parse_csv as parse_batch_csv, parse_json as parse_batch_json, run_batch
+from .forms import CustomUserCreationForm, UserLoginForm, AsyncUserLoginForm, TransferForm, ServicePaymentForm
 
 load_dotenv()
 
-DECOLECTA_API_TOKEN = os.getenv("DECOLECTA_API_TOKEN")
-
 def register_view(request):
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST)
@@ -53,22 +64,195 @@ def user_login_view(request):
         form = UserLoginForm()
     return render(request, 'registration/login.html', {'form': form})
 
+# Versiones async de registro y login para el punto de entrada ASGI (ver
+# bank_project/asgi.py): el hash de la contraseña va al pool acotado de
+# hashing.py y, si está saturado, se responde 503 al momento.
+OVERLOADED_MESSAGE = "Estamos recibiendo muchos inicios de sesión. Intenta de nuevo en unos segundos."
+
+async def _arender(request, template, context, status=200):
+    # render() puede leer request.user (consulta a la base) desde la plantilla
+    response = await sync_to_async(render)(request, template, context, status=status)
+    if status == 503:
+        response['Retry-After'] = '1'
+    return response
+
+async def async_register_view(request):
+    if request.method == 'POST':
+        form = CustomUserCreationForm(request.POST)
+        # La validación consulta la base (DNI y usuario repetidos), pero no hashea nada
+        if await sync_to_async(form.is_valid)():
+            try:
+                # save(commit=False) solo arma el usuario y hashea la contraseña, sin tocar la base
+                user = await hashing.run(form.save, False)
+            except hashing.HashingOverloaded:
+                messages.error(request, OVERLOADED_MESSAGE)
+                return await _arender(request, 'core_bank/register.html', {'form': form}, status=503)
+            await user.asave()
+            await alogin(request, user)
+            messages.success(request, "¡Registro exitoso! Te hemos asignado un saldo inicial de S/10,000.00.")
+            return redirect('core_bank:dashboard')
+        else:
+            if not os.getenv("DEBUG", "True").lower() == "true":
+                print(f"Intento de registro fallido: {form.errors}")
+    else:
+        form = CustomUserCreationForm()
+    return await _arender(request, 'core_bank/register.html', {'form': form})
+
+async def async_user_login_view(request):
+    if request.method == 'POST':
+        form = AsyncUserLoginForm(request, data=request.POST)
+        if form.is_valid():
+            username = form.cleaned_data.get('username')
+            try:
+                user = await hashing.aauthenticate(request, username, form.cleaned_data.get('password'))
+            except hashing.HashingOverloaded:
+                messages.error(request, OVERLOADED_MESSAGE)
+                return await _arender(request, 'registration/login.html', {'form': form}, status=503)
+            if user is not None:
+                await alogin(request, user)
+                messages.success(request, f"¡Bienvenido de nuevo, {user.first_name}!")
+                return redirect('core_bank:dashboard')
+            form.add_error(None, form.get_invalid_login_error())
+            if not os.getenv("DEBUG", "True").lower() == "true":
+                print(f"Intento de login fallido para el usuario: {username}")
+        messages.error(request, "Por favor, corrige los errores en el formulario.")
+    else:
+        form = AsyncUserLoginForm()
+    return await _arender(request, 'registration/login.html', {'form': form})
+
 @login_required
 def user_logout_view(request):
     logout(request)
     messages.info(request, "Has cerrado sesión exitosamente.")
     return redirect('core_bank:login')
 
+HISTORY_KINDS = {
+    'transactions': ('core_bank/_transaction_rows.html', 'transactions'),
+    'payments': ('core_bank/_payment_rows.html', 'payments'),
+}
+
+def _history_queryset(user, kind):
+    # select_related + only: una sola consulta con JOIN y solo las columnas que
+    # pintan las plantillas, en vez de una consulta extra por fila.
+    if kind == 'transactions':
+        return Transaction.objects.filter(sender=user).select_related('receiver').only(
+            'amount', 'transaction_type', 'timestamp', 'description',
+            'receiver', 'receiver__username', 'receiver__first_name', 'receiver__last_name',
+        )
+    return ServicePayment.objects.filter(user=user).select_related('service').only(
+        'amount', 'timestamp', 'invoice_number', 'service', 'service__name',
+    )
+
+# Las filas renderizadas se guardan en la caché de fragmentos con la versión del
+# ledger en la clave (ver fragments.py): en un acierto no hay consulta ni render.
+def _history_fragment(user, kind, cursor=None):
+    def build():
+        rows, next_cursor = keyset_page(_history_queryset(user, kind), cursor)
+        template_name, context_name = HISTORY_KINDS[kind]
+        return fragments.Fragment(render_to_string(template_name, {context_name: rows}), len(rows), next_cursor)
+    return fragments.get_or_render(user, kind, cursor, build)
+
+def _recent_activity_fragment(user):
+    recent_transactions = list(_history_queryset(user, 'transactions').order_by('-timestamp')[:5])
+    recent_payments = list(_history_queryset(user, 'payments').order_by('-timestamp')[:5])
+    html = render_to_string('core_bank/_recent_activity_rows.html', {
+        'recent_transactions': recent_transactions,
+        'recent_payments': recent_payments,
+    })
+    return fragments.Fragment(html, len(recent_transactions) + len(recent_payments), None)
+
+# GET condicional: ledger_version cambia con cada movimiento del usuario, así
+# que mientras no cambie, el saldo y el historial tampoco. ``request.user`` ya
+# viene de la base con la sesión, de modo que un 304 se responde sin ejecutar
+# ninguna consulta del historial ni renderizar nada. no-cache hace que el
+# navegador revalide siempre con If-None-Match en vez de usar su copia a ciegas.
+ledger_cache_control = cache_control(private=True, no_cache=True)
+
+def _ledger_etag(request, *args, **kwargs):
+    return f"{request.user.pk}-{request.user.ledger_version}"
+
+def _page_etag(request, *args, **kwargs):
+    # Si hay mensajes pendientes (p. ej. el de bienvenida) la página sí cambia
+    if len(messages.get_messages(request)):
+        return None
+    return _ledger_etag(request)
+
+def _dashboard_etag(request, *args, **kwargs):
+    etag = _page_etag(request)
+    # El resumen del mes cambia al empezar otro mes aunque no haya movimientos
+    return etag and f"{etag}-{timezone.localdate():%Y%m}"
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _describe(movement):
+    """Completa el evento del ledger con lo que muestra el dashboard."""
+    movement = dict(movement)  # El broker en proceso entrega el mismo dict a todas las pestañas
+    if movement['service_id'] is not None:
+        service = await sync_to_async(catalog.get_service)(movement['service_id'])
+        movement['detail'] = f"Servicio: {service.name if service else ''}"
+    else:
+        other = await CustomUser.objects.filter(pk=movement['counterparty_id']).values(
+            'username', 'first_name', 'last_name').afirst() or {'username': '', 'first_name': '', 'last_name': ''}
+        prefix = 'A' if movement['direction'] == 'out' else 'De'
+        movement['detail'] = f"{prefix}: {other['first_name']} {other['last_name']} ({other['username']})"
+    return movement
+
+async def activity_stream(request):
+    """
+    Server-sent events con el saldo y los movimientos nuevos del usuario,
+    para que el dashboard se actualice sin recargar. Solo bajo ASGI: en
+    WSGI cada conexión abierta ocuparía un worker entero.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Los avisos en vivo requieren el servidor ASGI.'}, status=501)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'No autenticado.'}, status=401)
+
+    async def balance():
+        return str(await CustomUser.objects.filter(pk=user.pk).values_list('balance', flat=True).aget())
+
+    async def stream():
+        async with events.get_broker().subscribe(user.pk) as subscription:
+            # Suscrito antes de leer el saldo: nada de lo que pase después se pierde
+            yield "retry: 3000\n\n"
+            yield _sse('balance', {'balance': await balance()})
+            while True:
+                try:
+                    movement = await asyncio.wait_for(subscription.get(), timeout=settings.EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse('movement', await _describe(movement))
+                yield _sse('balance', {'balance': await balance()})
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: no acumular el stream
+    return response
+
+
+@read_from_replica
 @login_required
+@ledger_cache_control
+@condition(etag_func=_dashboard_etag)
 def dashboard_view(request):
     user = request.user
-    recent_transactions = Transaction.objects.filter(sender=user).order_by('-timestamp')[:5]
-    recent_payments = ServicePayment.objects.filter(user=user).order_by('-timestamp')[:5]
+    recent_activity = fragments.get_or_render(user, 'recent', None, lambda: _recent_activity_fragment(user))
+
+    # Resumen del mes desde los totales precalculados: una consulta sin importar el historial
+    month_rollups = list(rollups.monthly_totals(user))
+    month_summary = {
+        'transfers': sum(r.total for r in month_rollups if r.transaction_type == 'transferencia'),
+        'services': sum(r.total for r in month_rollups if r.transaction_type == 'pago_servicio'),
+        'by_service': sorted((r for r in month_rollups if r.service_id), key=lambda r: r.total, reverse=True),
+    }
 
     return render(request, 'core_bank/dashboard.html', {
         'user': user,
-        'recent_transactions': recent_transactions,
-        'recent_payments': recent_payments,
+        'recent_activity': recent_activity,
+        'month_summary': month_summary,
     })
 
 @login_required
@@ -84,40 +268,37 @@ def transfer_view(request):
             description = form.cleaned_data['description']
 
             try:
-                with db_transaction.atomic():
-                    recipient = None
-                    if recipient_identifier.isdigit() and len(recipient_identifier) == 8:
-                        recipient = CustomUser.objects.filter(dni=recipient_identifier).first()
-                    if not recipient:
-                        recipient = CustomUser.objects.filter(username=recipient_identifier).first()
-
-                    if not recipient:
-                        messages.error(request, "Destinatario no encontrado. Verifica el DNI o nombre de usuario.")
-                        return render(request, 'core_bank/transfer.html', {'form': form})
-
-                    if user.id == recipient.id:
-                        messages.error(request, "No puedes transferirte a ti mismo.")
-                        return render(request, 'core_bank/transfer.html', {'form': form})
-
-                    if user.balance < amount:
-                        messages.error(request, "Saldo insuficiente para realizar esta transferencia.")
-                        return render(request, 'core_bank/transfer.html', {'form': form})
-
-                    user.balance -= amount
-                    recipient.balance += amount
-                    user.save()
-                    recipient.save()
-
-                    Transaction.objects.create(
-                        sender=user,
-                        receiver=recipient,
-                        amount=amount,
-                        transaction_type='transferencia',
-                        description=description
-                    )
-                    messages.success(request, f"¡Transferencia de S/{amount} a {recipient.first_name} {recipient.last_name} ({recipient.username}) realizada con éxito!")
-                    return redirect('core_bank:dashboard')
+                recipient = None
+                recipient_fields = ('id', 'username', 'first_name', 'last_name')
+                if recipient_identifier.isdigit() and len(recipient_identifier) == 8:
+                    recipient = CustomUser.objects.only(*recipient_fields).filter(dni=recipient_identifier).first()
+                if not recipient:
+                    recipient = CustomUser.objects.only(*recipient_fields).filter(username=recipient_identifier).first()
+
+                if not recipient:
+                    messages.error(request, "Destinatario no encontrado. Verifica el DNI o nombre de usuario.")
+                    return render(request, 'core_bank/transfer.html', {'form': form})
+
+                if user.id == recipient.id:
+                    messages.error(request, "No puedes transferirte a ti mismo.")
+                    return render(request, 'core_bank/transfer.html', {'form': form})
+
+                if settings.TRANSFER_QUEUE_ENABLED:
+                    # Modo asíncrono: se encola y el worker la aplica junto con otras en un solo commit
+                    queued = ledger.enqueue_transfer(user.id, recipient.id, amount, description)
+                    messages.info(request, f"Tu transferencia de S/{amount} a {recipient.first_name} {recipient.last_name} ({recipient.username}) está en proceso.")
+                    return redirect('core_bank:transfer_status', reference=queued.reference)
+
+                # El débito y el crédito se hacen en la base de datos (ver ledger.py),
+                # sin leer ni reescribir la fila completa del usuario.
+                ledger.transfer(user.id, recipient.id, amount, description)
+
+                messages.success(request, f"¡Transferencia de S/{amount} a {recipient.first_name} {recipient.last_name} ({recipient.username}) realizada con éxito!")
+                return redirect('core_bank:dashboard')
 
+            except ledger.InsufficientFunds:
+                messages.error(request, "Saldo insuficiente para realizar esta transferencia.")
+                return render(request, 'core_bank/transfer.html', {'form': form})
             except Exception as e:
                 messages.error(request, f"Ocurrió un error al procesar la transferencia: {e}")
                 if not os.getenv("DEBUG", "True").lower() == "true":
@@ -125,26 +306,78 @@ def transfer_view(request):
 
     return render(request, 'core_bank/transfer.html', {'form': form})
 
+def _queued_transfer(request, reference):
+    try:
+        return QueuedTransfer.objects.select_related('receiver').only(
+            'reference', 'amount', 'status', 'error', 'receiver__username', 'receiver__first_name', 'receiver__last_name',
+        ).get(reference=reference, sender=request.user)
+    except QueuedTransfer.DoesNotExist:
+        raise Http404("Transferencia no encontrada.")
+
+@login_required
+def transfer_status_view(request, reference):
+    """
+    Página de espera del modo asíncrono: se recarga sola mientras la
+    transferencia está pendiente y, al procesarse, redirige con el resultado.
+    """
+    queued = _queued_transfer(request, reference)
+    if queued.status == QueuedTransfer.COMPLETED:
+        messages.success(request, f"¡Transferencia de S/{queued.amount} a {queued.receiver.first_name} {queued.receiver.last_name} ({queued.receiver.username}) realizada con éxito!")
+        return redirect('core_bank:dashboard')
+    if queued.status == QueuedTransfer.REJECTED:
+        messages.error(request, queued.error)
+        return redirect('core_bank:transfer')
+    return render(request, 'core_bank/transfer_status.html', {'queued': queued})
+
+@login_required
+def transfer_status_api(request, reference):
+    queued = _queued_transfer(request, reference)
+    return JsonResponse({
+        'reference': str(queued.reference),
+        'status': queued.status,
+        'amount': str(queued.amount),
+        'error': queued.error or None,
+    })
+
+@login_required
+@require_POST
+def batch_transfer_api(request):
+    """
+    Transferencias por lote. Acepta un archivo ``file`` (CSV o JSON), o el
+    cuerpo de la petición en CSV (text/csv) o JSON (application/json).
+    Devuelve un reporte por línea.
+    """
+    upload = request.FILES.get('file')
+    try:
+        if upload:
+            text = upload.read().decode('utf-8-sig')
+            lines = parse_batch_json(text) if upload.name.lower().endswith('.json') else parse_batch_csv(text)
+        elif request.content_type == 'application/json':
+            lines = parse_batch_json(request.body.decode('utf-8'))
+        else:
+            lines = parse_batch_csv(request.body.decode('utf-8-sig'))
+        report, total = run_batch(request.user, lines)
+    except UnicodeDecodeError:
+        return JsonResponse({'error': 'El archivo debe estar codificado en UTF-8.'}, status=400)
+    except BatchFormatError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ledger.InsufficientFunds:
+        return JsonResponse({'error': 'Saldo insuficiente para el total del lote. No se realizó ninguna transferencia.'}, status=400)
+
+    applied = sum(1 for result in report if result['status'] == 'ok')
+    return JsonResponse({
+        'applied': applied,
+        'failed': len(report) - applied,
+        'total': str(total),
+        'results': report,
+    })
+
 @login_required
 def services_view(request):
-    services = Service.objects.all()
+    # Catálogo en memoria (ver catalog.py); los servicios por defecto los crea la migración 0004
+    services = catalog.get_services()
     form = ServicePaymentForm()
 
-    if not services.exists():
-        Service.objects.bulk_create([
-            Service(name="Agua (SEDAPAL)"),
-            Service(name="Luz (Luz del Sur)"),
-            Service(name="Internet (Claro/Movistar)"),
-            Service(name="Teléfono Fijo"),
-            Service(name="Gas Natural"),
-            Service(name="Arriendo"),
-            Service(name="Tarjeta de Crédito (Visa)"),
-            Service(name="Tarjeta de Crédito (Mastercard)"),
-            Service(name="Educación (Colegio/Universidad)"),
-            Service(name="Salud (Seguro/Clínica)"),
-        ])
-        services = Service.objects.all()
-
     if request.method == 'POST':
         form = ServicePaymentForm(request.POST)
         if form.is_valid():
@@ -154,31 +387,14 @@ def services_view(request):
             user = request.user
 
             try:
-                with db_transaction.atomic():
-                    if user.balance < amount:
-                        messages.error(request, "Saldo insuficiente para pagar este servicio.")
-                        return render(request, 'core_bank/services.html', {'form': form, 'services': services})
-
-                    user.balance -= amount
-                    user.save()
-
-                    ServicePayment.objects.create(
-                        user=user,
-                        service=service,
-                        amount=amount,
-                        invoice_number=invoice_number
-                    )
-                    Transaction.objects.create(
-                        sender=user,
-                        receiver=None,
-                        amount=amount,
-                        transaction_type='pago_servicio',
-                        description=f"Pago de {service.name} (Factura: {invoice_number or 'N/A'})"
-                    )
-
-                    messages.success(request, f"¡Pago de S/{amount} para {service.name} realizado con éxito!")
-                    return redirect('core_bank:dashboard')
+                ledger.pay_service(user.id, service, amount, invoice_number)
 
+                messages.success(request, f"¡Pago de S/{amount} para {service.name} realizado con éxito!")
+                return redirect('core_bank:dashboard')
+
+            except ledger.InsufficientFunds:
+                messages.error(request, "Saldo insuficiente para pagar este servicio.")
+                return render(request, 'core_bank/services.html', {'form': form, 'services': services})
             except Exception as e:
                 messages.error(request, f"Ocurrió un error al procesar el pago: {e}")
                 if not os.getenv("DEBUG", "True").lower() == "true":
@@ -187,24 +403,84 @@ def services_view(request):
     return render(request, 'core_bank/services.html', {'form': form, 'services': services})
 
 
+def _history_page(user, kind, cursor):
+    try:
+        return _history_fragment(user, kind, cursor)
+    except InvalidCursor:
+        # Un cursor manipulado o caducado simplemente vuelve a la primera página
+        return _history_fragment(user, kind)
+
+@read_from_replica
 @login_required
+@ledger_cache_control
+@condition(etag_func=_page_etag)
 def history_view(request):
     user = request.user
-    transactions = Transaction.objects.filter(sender=user).order_by('-timestamp')
-    payments = ServicePayment.objects.filter(user=user).order_by('-timestamp')
-
-    def mask_identifier(identifier):
-        if identifier and len(identifier) > 4:
-            return identifier[:3] + '***' + identifier[-4:]
-        return identifier
-
     context = {
-        'transactions': transactions,
-        'payments': payments,
-        'mask_identifier': mask_identifier,
+        'transactions': _history_page(user, 'transactions', request.GET.get('tx_cursor')),
+        'payments': _history_page(user, 'payments', request.GET.get('pay_cursor')),
     }
     return render(request, 'core_bank/history.html', context)
 
+@read_from_replica
+@login_required
+@ledger_cache_control
+@condition(etag_func=_ledger_etag)
+def history_page_api(request):
+    """
+    Devuelve la siguiente página del historial para el scroll infinito.
+    Parámetros: ``kind`` (transactions | payments) y ``cursor``.
+    """
+    kind = request.GET.get('kind', 'transactions')
+    if kind not in HISTORY_KINDS:
+        return JsonResponse({'error': 'Tipo de historial inválido.'}, status=400)
+
+    try:
+        page = _history_fragment(request.user, kind, request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'error': 'Cursor inválido.'}, status=400)
+    return JsonResponse(page._asdict())
+
+@read_from_replica
+@login_required
+def statement_export(request):
+    """
+    Estado de cuenta completo como descarga. Parámetros: ``format`` (csv |
+    xlsx | parquet) y, opcionalmente, ``start`` y ``end`` (AAAA-MM-DD).
+    Se genera mientras se envía, sin cargar el historial en memoria.
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in statements.FORMATS:
+        return JsonResponse({'error': 'Formato no soportado. Usa csv, xlsx o parquet.'}, status=400)
+
+    dates = {}
+    for name in ('start', 'end'):
+        value = request.GET.get(name)
+        try:
+            dates[name] = parse_date(value) if value else None
+        except ValueError:  # Formato correcto pero fecha imposible, p. ej. 2024-02-30
+            dates[name] = None
+        if value and dates[name] is None:
+            return JsonResponse({'error': 'Fecha inválida. Usa el formato AAAA-MM-DD.'}, status=400)
+
+    _, content_type, extension = statements.FORMATS[fmt]
+    # El archivo se genera después de que la vista retorna: la base de lectura se fija ahora
+    rows = statements.export(request.user.id, fmt, dates['start'], dates['end'], using=read_alias())
+    if isinstance(request, ASGIRequest):
+        rows = statements.async_chunks(rows)  # Bajo ASGI un iterador síncrono se enviaría recién completo
+    response = StreamingHttpResponse(rows, content_type=content_type)
+    filename = f"estado_de_cuenta_{request.user.username}_{timezone.localdate():%Y%m%d}.{extension}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@staff_member_required
+def settlement_file_view(request, batch_id):
+    """Archivo de liquidación de una empresa de servicios, generado mientras se envía."""
+    batch = get_object_or_404(SettlementBatch.objects.select_related('run', 'service'), pk=batch_id)
+    response = StreamingHttpResponse(settlements.settlement_file(batch), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{settlements.settlement_filename(batch)}"'
+    return response
+
 @require_POST
 def get_dni_info(request):
     dni = request.POST.get('dni')
@@ -214,46 +490,34 @@ def get_dni_info(request):
     if CustomUser.objects.filter(dni=dni).exists():
         return JsonResponse({'error': 'Este DNI ya está registrado.'}, status=409)
 
-    url = "https://api.decolecta.com/v1/reniec/dni" 
-    headers = {
-        'Authorization': f'Bearer {DECOLECTA_API_TOKEN}', 
-        'Content-Type': 'application/json' 
-    }
-    params = { 
-        'numero': dni
-    }
-    
-    if DECOLECTA_API_TOKEN is None:
+    token = settings.DECOLECTA_API_TOKEN
+    if token is None:
         print("ERROR: DECOLECTA_API_TOKEN no está configurado en las variables de entorno.")
         return JsonResponse({'error': 'El token de la API no está configurado en el servidor.'}, status=500)
-    elif not DECOLECTA_API_TOKEN.strip():
+    elif not token.strip():
         print("ADVERTENCIA: DECOLECTA_API_TOKEN está vacío.")
         return JsonResponse({'error': 'El token de la API está vacío en el servidor.'}, status=500)
 
     try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status() 
-
-        data = response.json()
-        if data.get('first_name'): 
-            return JsonResponse({
-                'success': True, 
-                'nombres': data.get('first_name'), 
-                'apellidoPaterno': data.get('first_last_name'), 
-                'apellidoMaterno': data.get('second_last_name') 
-            })
-        else:
-            error_message = data.get('message', 'No se encontró información para el DNI o la respuesta fue inválida.')
-            return JsonResponse({'error': error_message}, status=404)
-    except requests.exceptions.RequestException as e:
+        # Sesión con pool, timeouts, caché y coalescencia de peticiones (ver dni_lookup.py)
+        info = dni_lookup.get_service().lookup(dni)
+        return JsonResponse({'success': True, **info})
+    except dni_lookup.DniNotFound as e:
+        return JsonResponse({'error': str(e)}, status=404)
+    except dni_lookup.DniServiceUnavailable:
+        return JsonResponse({'error': 'El servicio de DNI no está disponible en este momento. Inténtalo en unos minutos.'}, status=503)
+    except dni_lookup.DniLookupError as e:
         if not os.getenv("DEBUG", "True").lower() == "true":
             print(f"Error al consultar API de DNI (Decolecta): {e}") 
-        if hasattr(e, 'response') and e.response.status_code == 401:
+        if e.status_code == 401:
             return JsonResponse({'error': 'Error de autenticación con la API de DNI. Verifica tu token.'}, status=401)
         return JsonResponse({'error': f'Error al conectar con el servicio de DNI: {e}'}, status=500)
 
 
+@read_from_replica
 @login_required
+@ledger_cache_control
+@condition(etag_func=_ledger_etag)
 def get_user_balance_api(request):
     """
     API Endpoint para obtener el saldo del usuario autenticado.
@@ -267,4 +531,19 @@ def get_user_balance_api(request):
     except Exception as e:
         if not os.getenv("DEBUG", "True").lower() == "true":
             print(f"Error al obtener saldo del usuario: {e}")
-        return JsonResponse({'error': 'No se pudo obtener el saldo del usuario.'}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': 'No se pudo obtener el saldo del usuario.'}, status=500)
+
+def metrics_view(request):
+    """
+    Métricas de este proceso en el formato de texto de Prometheus. Se pide
+    con ``Authorization: Bearer <METRICS_TOKEN>``; sin token configurado solo
+    responde en desarrollo (DEBUG).
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not secrets.compare_digest(credentials.encode(), token.encode()):
+            return JsonResponse({'error': 'No autorizado.'}, status=403)
+    elif not settings.DEBUG:
+        return JsonResponse({'error': 'METRICS_TOKEN no está configurado en el servidor.'}, status=403)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
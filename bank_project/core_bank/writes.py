@@ -0,0 +1,50 @@
+# core_bank/writes.py
+"""
+Camino de escritura serializado para SQLite.
+
+SQLite admite un solo escritor a la vez. En vez de que varios hilos del mismo
+proceso compitan por el lock de la base de datos (y alguno termine con
+"database is locked"), las operaciones de dinero pasan de a una por un lock
+del proceso. Si aun así la base está ocupada (por otro proceso), la
+operación completa se reintenta unas pocas veces con espera exponencial.
+"""
+import functools
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+_write_lock = threading.Lock()
+
+
+def is_lock_error(exc):
+    message = str(exc).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def serialized_write(func):
+    """
+    Decorador para funciones que abren su propio ``atomic()`` y escriben. Se
+    pueden reintentar sin riesgo porque un intento fallido se revierte entero.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if connection.vendor != 'sqlite' or not settings.SQLITE_SERIALIZE_WRITES:
+            return func(*args, **kwargs)
+        if connection.in_atomic_block:
+            # Dentro de una transacción externa: el lock de la base ya lo tiene
+            # quien la abrió y un reintento no podría deshacer lo anterior.
+            return func(*args, **kwargs)
+
+        retries = settings.SQLITE_WRITE_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                with _write_lock:
+                    return func(*args, **kwargs)
+            except OperationalError as exc:
+                if attempt == retries or not is_lock_error(exc):
+                    raise
+            time.sleep(settings.SQLITE_WRITE_RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+    return wrapper